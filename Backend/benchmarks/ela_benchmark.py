@@ -0,0 +1,140 @@
+"""Compare the tiled ELA engine with the original global-mean implementation.
+
+Generates a synthetic document scan (default 5472x3648, ~20 MP) with a
+re-compressed pasted region, then times both implementations. It also
+runs the genuine fixture certificates (PNG and JPEG q80/q95) through
+analyze_for_edits and exits 1 if any of them gets a forged verdict.
+
+    python benchmarks/ela_benchmark.py [--width 5472 --height 3648 --repeat 3 --genuine-seeds 3]
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+from PIL import Image, ImageChops, ImageDraw, ImageEnhance
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fixtures import certificate_for  # noqa: E402
+from src.pixel_mismatch import analyze_for_edits  # noqa: E402
+
+GENUINE_FORMATS = [("png", ".png", []), ("jpeg-q80", ".jpg", [cv2.IMWRITE_JPEG_QUALITY, 80]),
+                   ("jpeg-q95", ".jpg", [cv2.IMWRITE_JPEG_QUALITY, 95])]
+
+
+def legacy_analyze_for_edits(image_path, resave_quality=90, enhancement_factor=15.0):
+    """The pre-tiling implementation, kept verbatim for comparison."""
+    original_image = Image.open(image_path).convert('RGB')
+    buffer = io.BytesIO()
+    original_image.save(buffer, 'JPEG', quality=resave_quality)
+    buffer.seek(0)
+    resaved_image = Image.open(buffer)
+    ela_image = ImageChops.difference(original_image, resaved_image)
+    enhancer = ImageEnhance.Brightness(ela_image)
+    enhancer.enhance(enhancement_factor)
+    return float(np.array(ela_image).mean())
+
+
+def make_scan(path, width, height, seed=0):
+    """Paper-like page with text lines compressed at q=85, a pasted never-compressed block, saved at q=98."""
+    rng = np.random.default_rng(seed)
+    paper = (rng.normal(238, 4, (height, width, 3))).clip(0, 255).astype(np.uint8)
+    image = Image.fromarray(paper)
+    draw = ImageDraw.Draw(image)
+    line_height = max(12, height // 60)
+    for y in range(height // 10, height - height // 10, line_height * 2):
+        x = width // 10
+        while x < width - width // 10:
+            word = int(rng.integers(line_height, line_height * 6))
+            draw.rectangle([x, y, x + word, y + line_height // 2], fill=(30, 30, 40))
+            x += word + line_height
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=85)
+    scan = Image.open(io.BytesIO(buffer.getvalue())).convert('RGB')
+
+    # A "corrected name" pasted from a differently compressed source
+    patch = Image.fromarray((rng.normal(238, 4, (height // 12, width // 5, 3))).clip(0, 255).astype(np.uint8))
+    ImageDraw.Draw(patch).rectangle([10, 10, patch.width - 10, patch.height // 2], fill=(20, 20, 30))
+    box = (width // 3, height // 3)
+    scan.paste(patch, box)
+    scan.save(path, 'JPEG', quality=98)
+    return box, patch.size
+
+
+def genuine_false_positives(tmp, seeds):
+    """Verdicts on untouched fixture certificates; returns the ones reported as forged."""
+    flagged = []
+    print(f"{'genuine':<24}{'verdict':<30}{'mean':>6}  regions")
+    for seed in range(seeds):
+        certificate = certificate_for("a4-150dpi", seed)
+        for label, ext, params in GENUINE_FORMATS:
+            path = os.path.join(tmp, f"genuine-{seed}{ext}")
+            cv2.imwrite(path, certificate.image, params)
+            result = analyze_for_edits(path)
+            name = f"seed {seed} {label}"
+            print(f"{name:<24}{result['verdict']:<30}{result['average_error_level']:>6}  "
+                  f"{len(result['suspicious_regions'])}")
+            if result["verdict"] != "LIKELY ORIGINAL":
+                flagged.append(name)
+    return flagged
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--width", type=int, default=5472)
+    ap.add_argument("--height", type=int, default=3648)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--preview-side", type=int, default=1600)
+    ap.add_argument("--genuine-seeds", type=int, default=3, help="fixture certificates for the false-positive check")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "scan.jpg")
+        box, size = make_scan(path, args.width, args.height)
+        print(f"Image: {args.width}x{args.height} ({args.width * args.height / 1e6:.1f} MP), "
+              f"pasted region at {box} size {size}")
+
+        legacy_s, legacy_mean = timed(lambda: legacy_analyze_for_edits(path), args.repeat)
+        legacy_multi_s, _ = timed(lambda: [legacy_analyze_for_edits(path, q) for q in (90, 75, 95)], args.repeat)
+        tiled_s, tiled = timed(lambda: analyze_for_edits(path), args.repeat)
+        multi_s, _ = timed(lambda: analyze_for_edits(path, qualities=[75, 95]), args.repeat)
+        preview_s, preview = timed(lambda: analyze_for_edits(path, preview_max_side=args.preview_side),
+                                   args.repeat)
+        false_positives = genuine_false_positives(tmp, args.genuine_seeds)
+
+    rows = [
+        ("legacy (global mean)", legacy_s, legacy_s, f"mean={legacy_mean:.2f}, regions=n/a"),
+        ("tiled", tiled_s, legacy_s,
+         f"mean={tiled['average_error_level']}, regions={len(tiled['suspicious_regions'])}"),
+        ("legacy, 3 qualities", legacy_multi_s, legacy_multi_s, "three separate runs"),
+        ("tiled, 3 qualities", multi_s, legacy_multi_s, "one decode"),
+        (f"preview ({args.preview_side}px)", preview_s, legacy_s,
+         f"mean={preview['average_error_level']}, heatmap only"),
+    ]
+    print(f"{'mode':<24}{'best s':>9}{'speedup':>9}  notes")
+    for name, seconds, baseline, notes in rows:
+        print(f"{name:<24}{seconds:>9.3f}{baseline / seconds:>8.1f}x  {notes}")
+    if tiled["suspicious_regions"]:
+        print("Top region:", tiled["suspicious_regions"][0])
+    if false_positives:
+        print(f"FALSE POSITIVES on genuine certificates: {', '.join(false_positives)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
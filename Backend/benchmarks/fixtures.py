@@ -0,0 +1,152 @@
+"""Synthetic certificate scans for the benchmarks.
+
+Each certificate has real printed text (so OCR has work to do), a photo
+block and two handwritten-looking signatures at known positions. The known
+boxes let the crop stages run without the detection models. Generation is
+seeded, so every run times the same pixels.
+"""
+import cv2
+import numpy as np
+
+# name -> (width, height)
+RESOLUTIONS = {
+    "a4-150dpi": (1240, 1754),
+    "a4-300dpi": (2480, 3508),
+    "phone-12mp": (4000, 3000),
+}
+
+_NAMES = ["Aarav Sharma", "Priya Nair", "Rohan Mehta", "Ananya Iyer", "Vikram Singh", "Meera Joshi"]
+_INSTITUTES = ["National Institute of Technology", "State University of Engineering",
+               "Institute of Applied Sciences"]
+_DEGREES = [("Bachelor of Technology", "Computer Science"), ("Master of Science", "Physics"),
+            ("Bachelor of Arts", "Economics")]
+
+
+class Certificate:
+    def __init__(self, name, image, fields, photo_box, signature_boxes):
+        self.name = name
+        self.image = image
+        self.fields = fields
+        self.photo_box = photo_box
+        # Same shape as CertificateParser.detect_signatures output
+        self.signature_detections = list(enumerate(signature_boxes))
+        self.text = "\n".join(_text_lines(fields))
+        self.jpeg_bytes = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 92])[1].tobytes()
+
+    @property
+    def width(self):
+        return self.image.shape[1]
+
+    @property
+    def height(self):
+        return self.image.shape[0]
+
+    def photo_crop(self):
+        x1, y1, x2, y2 = self.photo_box
+        return self.image[y1:y2, x1:x2]
+
+    def signature_crops(self):
+        return [self.image[y1:y2, x1:x2] for _, (x1, y1, x2, y2) in self.signature_detections]
+
+
+def _text_lines(fields):
+    return [
+        "CERTIFICATE OF COMPLETION",
+        "This is to certify that",
+        fields["student_name"],
+        f"has been awarded the degree of {fields['degree']}",
+        f"in {fields['major']}",
+        f"by {fields['institute_name']}",
+        f"Date of issue: {fields['date_of_issue']}",
+        f"Certificate ID: {fields['certificate_id']}",
+    ]
+
+
+def _draw_photo(image, box, rng):
+    x1, y1, x2, y2 = box
+    w, h = x2 - x1, y2 - y1
+    image[y1:y2, x1:x2] = (200, 190, 185)
+    center = (x1 + w // 2, y1 + int(h * 0.45))
+    skin = tuple(int(c) for c in (rng.integers(110, 170), rng.integers(140, 190), rng.integers(180, 230)))
+    cv2.ellipse(image, (center[0], y2 - 1), (int(w * 0.45), int(h * 0.32)), 0, 180, 360, (60, 60, 90), -1)
+    cv2.ellipse(image, center, (int(w * 0.28), int(h * 0.32)), 0, 0, 360, skin, -1)
+    cv2.ellipse(image, (center[0], center[1] - int(h * 0.2)), (int(w * 0.3), int(h * 0.16)), 0, 180, 360,
+                (30, 30, 40), -1)
+    for dx in (-1, 1):
+        cv2.circle(image, (center[0] + dx * int(w * 0.1), center[1] - int(h * 0.03)), max(2, w // 40),
+                   (40, 30, 30), -1)
+    cv2.ellipse(image, (center[0], center[1] + int(h * 0.14)), (int(w * 0.08), int(h * 0.03)), 0, 0, 180,
+                (60, 40, 120), max(1, w // 80))
+    cv2.rectangle(image, (x1, y1), (x2 - 1, y2 - 1), (90, 90, 90), max(1, w // 100))
+
+
+def _draw_signature(image, box, rng):
+    x1, y1, x2, y2 = box
+    w, h = x2 - x1, y2 - y1
+    # A smooth random stroke: a random walk, low-pass filtered
+    steps = 400
+    xs = np.linspace(x1 + w * 0.05, x2 - w * 0.05, steps)
+    ys = np.cumsum(rng.normal(0, 1, steps))
+    ys = np.convolve(ys - ys.mean(), np.ones(15) / 15, mode="same")
+    ys = y1 + h / 2 + ys / (np.abs(ys).max() + 1e-6) * h * 0.35
+    ys += np.sin(np.linspace(0, rng.uniform(12, 24), steps)) * h * 0.12
+    points = np.stack([xs, ys], axis=1).astype(np.int32)
+    cv2.polylines(image, [points], False, (90, 40, 20), max(2, w // 120), lineType=cv2.LINE_AA)
+
+
+def make_certificate(width, height, seed=0, name=None, photo=True):
+    """Render one synthetic certificate as a BGR array with its ground truth.
+
+    With photo=False the photo block is left blank and `photo_box` is None.
+    """
+    rng = np.random.default_rng(seed)
+    student = _NAMES[seed % len(_NAMES)]
+    degree, major = _DEGREES[seed % len(_DEGREES)]
+    fields = {
+        "student_name": student,
+        "institute_name": _INSTITUTES[seed % len(_INSTITUTES)],
+        "degree": degree,
+        "major": major,
+        "date_of_issue": f"{rng.integers(1, 29):02d}/{rng.integers(1, 13):02d}/20{rng.integers(15, 25)}",
+        "certificate_id": f"CERT-{rng.integers(100000, 999999)}",
+    }
+
+    image = rng.normal(242, 3, (height, width, 3)).clip(0, 255).astype(np.uint8)
+    unit = min(width, height)
+    margin = unit // 25
+    cv2.rectangle(image, (margin, margin), (width - margin, height - margin), (60, 50, 120), max(2, unit // 150))
+
+    # Body text stays left of the photo column
+    text_left, text_right = int(width * 0.1), int(width * 0.7)
+    thickness = max(1, unit // 600)
+    y = int(height * 0.14)
+    for i, line in enumerate(_text_lines(fields)):
+        line_scale = unit / 1300 * (1.5 if i in (0, 2) else 1.0)
+        (tw, th), _ = cv2.getTextSize(line, cv2.FONT_HERSHEY_DUPLEX, line_scale, thickness)
+        if i == 0:
+            x = (width - tw) // 2
+            y_next = int(height * 0.24)
+        else:
+            x = text_left + max(0, (text_right - text_left - tw) // 2) if i < 6 else text_left
+            y_next = y + int(th * 2.6)
+        cv2.putText(image, line, (x, y), cv2.FONT_HERSHEY_DUPLEX, line_scale, (25, 25, 35), thickness, cv2.LINE_AA)
+        y = y_next
+
+    photo_box = (int(width * 0.74), int(height * 0.22), int(width * 0.9), int(height * 0.22) + int(width * 0.2))
+    if photo:
+        _draw_photo(image, photo_box, rng)
+    else:
+        photo_box = None
+
+    signature_boxes = []
+    for left in (0.1, 0.62):
+        box = (int(width * left), int(height * 0.8), int(width * (left + 0.26)), int(height * 0.8) + unit // 9)
+        _draw_signature(image, box, rng)
+        signature_boxes.append(box)
+
+    return Certificate(name or f"{width}x{height}", image, fields, photo_box, signature_boxes)
+
+
+def certificate_for(resolution, seed=0):
+    width, height = RESOLUTIONS[resolution]
+    return make_certificate(width, height, seed=seed, name=resolution)
@@ -0,0 +1,459 @@
+"""HTTP load test of the FastAPI app, with local stand-ins for the LLM and the ledger.
+
+Starts `uvicorn main:app` (or targets --url). The HF endpoint and the
+ledger RPC are replaced by the stub servers in stubs.py. The test then
+ramps closed-loop concurrency through a mix of multipart requests:
+
+    parse   POST /parse-certificate/
+    store   POST /certificate/store-blockchain
+    verify  POST /certificate/verify-comprehensive   (photos, signatures and the scan)
+
+Each step reports throughput, latency percentiles, error rates and the
+peak RSS of every server process. The report ends with the saturation
+curve (throughput against p95 latency). A probe polls /health/live during
+the whole run. /health/live does no work, so its latency rising under load
+means an event loop is being blocked.
+
+    python benchmarks/load_test.py --workers 2 --ramp 1,2,4,8,16 --step-seconds 30
+    python benchmarks/load_test.py --mix parse=1 --sizes a4-300dpi=1 --llm-latency-ms 800
+
+Every upload carries a few unique trailing bytes, so the content-hash
+caches never answer. Caches and near-duplicate reuse are also off in the
+server unless --keep-caches is given.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import cv2
+import httpx
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from fixtures import RESOLUTIONS, certificate_for  # noqa: E402
+from stubs import LedgerStub, LLMStub  # noqa: E402
+
+
+def parse_weights(text, allowed=None):
+    weights = {}
+    for part in filter(None, text.split(",")):
+        name, _, weight = part.partition("=")
+        if allowed is not None and name not in allowed:
+            raise argparse.ArgumentTypeError(f"unknown entry {name!r}; expected one of {', '.join(allowed)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def percentiles(values):
+    if not values:
+        return None
+    ms = np.asarray(values) * 1000
+    return {"p50": round(float(np.percentile(ms, 50)), 1), "p95": round(float(np.percentile(ms, 95)), 1),
+            "p99": round(float(np.percentile(ms, 99)), 1), "max": round(float(ms.max()), 1)}
+
+
+# ---------------- Uploads ---------------- #
+class UploadPool:
+    """Pre-rendered uploads per resolution; each request gets unique bytes."""
+
+    def __init__(self, sizes, variants=4):
+        self.sizes = sizes
+        self.scans, self.photos, self.signatures = {}, {}, {}
+        for resolution in sizes:
+            certs = [certificate_for(resolution, seed) for seed in range(variants)]
+            self.scans[resolution] = [c.jpeg_bytes for c in certs]
+            self.photos[resolution] = [cv2.imencode(".png", c.photo_crop())[1].tobytes() for c in certs]
+            self.signatures[resolution] = [cv2.imencode(".png", s)[1].tobytes()
+                                           for c in certs for s in c.signature_crops()]
+
+    def resolution(self, rng):
+        return rng.choices(list(self.sizes), weights=list(self.sizes.values()))[0]
+
+    @staticmethod
+    def unique(data, rng):
+        # Decoders stop at the end-of-image marker; the tail only changes the content hash
+        return data + rng.randbytes(16)
+
+    def scan(self, rng, resolution):
+        return self.unique(rng.choice(self.scans[resolution]), rng)
+
+
+class RequestMix:
+    def __init__(self, pool, weights, verify_files):
+        self.pool = pool
+        self.weights = weights
+        self.verify_files = verify_files
+        # Hashes returned by store requests; verify looks them up (a hit) half of the time
+        self.stored_hashes = []
+
+    def build(self, rng):
+        kind = rng.choices(list(self.weights), weights=list(self.weights.values()))[0]
+        resolution = self.pool.resolution(rng)
+        if kind == "parse":
+            return kind, resolution, "/parse-certificate/", {
+                "files": {"file": ("certificate.jpg", self.pool.scan(rng, resolution), "image/jpeg")}}
+        if kind == "store":
+            return kind, resolution, "/certificate/store-blockchain", {
+                "files": {"file": ("certificate.jpg", self.pool.scan(rng, resolution), "image/jpeg")},
+                "data": {"account_address": "0x" + rng.randbytes(20).hex(), "allow_near_duplicate": "true"}}
+
+        certificate_hash = (rng.choice(self.stored_hashes) if self.stored_hashes and rng.random() < 0.5
+                            else rng.randbytes(32).hex())
+        files = {}
+        if "photos" in self.verify_files:
+            photos = self.pool.photos[resolution]
+            files["photo1"] = ("photo1.png", self.pool.unique(rng.choice(photos), rng), "image/png")
+            files["photo2"] = ("photo2.png", self.pool.unique(rng.choice(photos), rng), "image/png")
+        if "signatures" in self.verify_files:
+            signatures = self.pool.signatures[resolution]
+            files["signature1"] = ("sig1.png", self.pool.unique(rng.choice(signatures), rng), "image/png")
+            files["signature2"] = ("sig2.png", self.pool.unique(rng.choice(signatures), rng), "image/png")
+        if "certificate" in self.verify_files:
+            files["certificate_file"] = ("certificate.jpg", self.pool.scan(rng, resolution), "image/jpeg")
+        return kind, resolution, "/certificate/verify-comprehensive", {
+            "files": files, "data": {"certificate_hash": certificate_hash}}
+
+    def observe(self, kind, response):
+        if kind == "store" and response.status_code == 200:
+            try:
+                certificate_hash = (response.json() or {}).get("certificate_hash")
+            except ValueError:
+                return
+            if isinstance(certificate_hash, str):
+                self.stored_hashes.append(certificate_hash.removeprefix("0x"))
+
+
+# ---------------- Server ---------------- #
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_tree(root_pid):
+    """root_pid and all of its descendants, from /proc."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    pids, stack = [], [root_pid]
+    while stack:
+        pid = stack.pop()
+        pids.append(pid)
+        stack.extend(children.get(pid, []))
+    return pids
+
+
+def rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def process_label(pid):
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            args = [a.decode(errors="replace") for a in f.read().split(b"\0") if a]
+    except OSError:
+        return str(pid)
+    label = " ".join(args[1:4]) if args else ""
+    return f"{pid} {label[:60]}"
+
+
+class MemorySampler:
+    """Samples the RSS of the server's process tree; `take()` returns the per-process peaks since the last call."""
+
+    def __init__(self, root_pid, interval=0.5):
+        self.root_pid = root_pid
+        self.interval = interval
+        self._peaks = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        for pid in process_tree(self.root_pid):
+            rss = rss_mb(pid)
+            if rss is not None:
+                with self._lock:
+                    self._peaks[pid] = max(self._peaks.get(pid, 0.0), rss)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def take(self):
+        self.sample()
+        with self._lock:
+            peaks, self._peaks = self._peaks, {}
+        return {process_label(pid): round(mb, 1) for pid, mb in sorted(peaks.items())}
+
+    def stop(self):
+        self._stop.set()
+
+
+def start_server(args, llm_stub, ledger_stub, log_path):
+    env = dict(os.environ)
+    env.update({
+        "HF_LLM_BASE_URL": llm_stub.url,
+        "HF_API_TOKEN": env.get("HF_API_TOKEN", "load-test"),
+        "BLOCKCHAIN_RPC_URL": ledger_stub.url,
+        "PYTHONUNBUFFERED": "1",
+    })
+    if not args.keep_caches:
+        env.update({"PARSE_CACHE_ENABLED": "false", "NEAR_DUP_ENABLED": "false"})
+    for item in args.server_env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    cmd = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.port),
+           "--workers", str(args.workers), "--no-access-log", "--log-level", "warning"]
+    log = open(log_path, "w")
+    return subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_until_ready(base_url, server, timeout):
+    deadline = time.monotonic() + timeout
+    with httpx.Client(base_url=base_url, timeout=5) as client:
+        for path in ("/health/live", "/health/ready"):
+            while True:
+                if server is not None and server.poll() is not None:
+                    raise RuntimeError(f"server exited with code {server.returncode}")
+                try:
+                    if client.get(path).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"{path} not healthy after {timeout}s")
+                time.sleep(0.5)
+
+
+# ---------------- Load ---------------- #
+async def virtual_user(client, mix, rng, stop_at, records):
+    while time.monotonic() < stop_at:
+        kind, resolution, path, request = mix.build(rng)
+        start = time.monotonic()
+        try:
+            response = await client.post(path, **request)
+            status, error = response.status_code, None
+            mix.observe(kind, response)
+        except httpx.HTTPError as e:
+            status, error = None, type(e).__name__
+        records.append({"kind": kind, "resolution": resolution, "start": start,
+                        "seconds": time.monotonic() - start, "status": status, "error": error})
+
+
+async def probe(client, interval, stop_at, samples):
+    while time.monotonic() < stop_at:
+        start = time.monotonic()
+        try:
+            await client.get("/health/live")
+            samples.append((start, time.monotonic() - start))
+        except httpx.HTTPError:
+            samples.append((start, None))
+        await asyncio.sleep(interval)
+
+
+def summarize(records, concurrency, window, probes):
+    ok = [r for r in records if r["status"] is not None and r["status"] < 400]
+    statuses = {}
+    for r in records:
+        key = str(r["status"]) if r["status"] is not None else r["error"]
+        statuses[key] = statuses.get(key, 0) + 1
+    by_kind = {}
+    for kind in sorted({r["kind"] for r in records}):
+        rows = [r for r in records if r["kind"] == kind]
+        good = [r for r in rows if r["status"] is not None and r["status"] < 400]
+        by_kind[kind] = {"requests": len(rows), "throughput_rps": round(len(good) / window, 3),
+                         "error_rate": round(1 - len(good) / len(rows), 4) if rows else None,
+                         "latency_ms": percentiles([r["seconds"] for r in good])}
+    probe_latencies = [s for _, s in probes if s is not None]
+    return {
+        "concurrency": concurrency,
+        "measured_seconds": round(window, 1),
+        "requests": len(records),
+        "throughput_rps": round(len(ok) / window, 3),
+        "error_rate": round(1 - len(ok) / len(records), 4) if records else None,
+        "status_counts": statuses,
+        "latency_ms": percentiles([r["seconds"] for r in ok]),
+        "by_kind": by_kind,
+        "event_loop_probe_ms": percentiles(probe_latencies),
+        "probe_failures": sum(1 for _, s in probes if s is None),
+    }
+
+
+async def run_step(base_url, mix, concurrency, args, seed):
+    limits = httpx.Limits(max_connections=concurrency + 2, max_keepalive_connections=concurrency + 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.request_timeout, limits=limits) as client:
+        started = time.monotonic()
+        stop_at = started + args.step_seconds
+        records, probes = [], []
+        users = [virtual_user(client, mix, random.Random(seed * 1000 + i), stop_at, records)
+                 for i in range(concurrency)]
+        await asyncio.gather(probe(client, args.probe_interval, stop_at, probes), *users)
+        ended = time.monotonic()
+    # The first seconds of every step are the ramp-up of the previous level settling
+    measured_from = started + args.warmup_seconds
+    measured = [r for r in records if r["start"] >= measured_from]
+    window = max(1e-6, ended - measured_from)
+    return summarize(measured, concurrency, window, [p for p in probes if p[0] >= measured_from])
+
+
+def saturation(steps, slo_p95_ms):
+    """Peak throughput, and the first concurrency where p95 breaks the SLO."""
+    usable = [s for s in steps if s["latency_ms"]]
+    if not usable:
+        return None
+    best = max(usable, key=lambda s: s["throughput_rps"])
+    breach = next((s for s in usable if s["latency_ms"]["p95"] > slo_p95_ms), None)
+    return {
+        "peak_throughput_rps": best["throughput_rps"],
+        "peak_at_concurrency": best["concurrency"],
+        "slo_p95_ms": slo_p95_ms,
+        "slo_breached_at_concurrency": breach["concurrency"] if breach else None,
+        "curve": [{"concurrency": s["concurrency"], "throughput_rps": s["throughput_rps"],
+                   "p95_ms": s["latency_ms"]["p95"], "error_rate": s["error_rate"]} for s in usable],
+    }
+
+
+def print_step(step, memory):
+    lat = step["latency_ms"] or {"p50": float("nan"), "p95": float("nan"), "p99": float("nan")}
+    probe_ms = (step["event_loop_probe_ms"] or {}).get("p99", float("nan"))
+    total_mb = sum(memory.values()) if memory else float("nan")
+    print(f"{step['concurrency']:>5}{step['throughput_rps']:>10.2f}{lat['p50']:>10.0f}{lat['p95']:>10.0f}"
+          f"{lat['p99']:>10.0f}{(step['error_rate'] or 0):>9.1%}{probe_ms:>11.1f}{total_mb:>10.0f}", flush=True)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", help="target a running server instead of starting one (its stubs are up to you)")
+    ap.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    ap.add_argument("--port", type=int, default=0, help="server port (default: a free one)")
+    ap.add_argument("--mix", default="parse=5,store=2,verify=3",
+                    type=lambda t: parse_weights(t, ("parse", "store", "verify")))
+    ap.add_argument("--sizes", default="a4-150dpi=6,a4-300dpi=3,phone-12mp=1",
+                    type=lambda t: parse_weights(t, RESOLUTIONS), help="upload resolution distribution")
+    ap.add_argument("--verify-files", default="photos,signatures,certificate",
+                    help="files sent with verify requests: photos, signatures, certificate")
+    ap.add_argument("--ramp", default="1,2,4,8,16", help="closed-loop concurrency per step")
+    ap.add_argument("--step-seconds", type=float, default=30.0)
+    ap.add_argument("--warmup-seconds", type=float, default=5.0, help="excluded from each step's statistics")
+    ap.add_argument("--request-timeout", type=float, default=120.0)
+    ap.add_argument("--probe-interval", type=float, default=0.2)
+    ap.add_argument("--llm-latency-ms", type=float, default=800.0)
+    ap.add_argument("--ledger-latency-ms", type=float, default=50.0)
+    ap.add_argument("--slo-p95-ms", type=float, default=5000.0)
+    ap.add_argument("--stop-error-rate", type=float, default=0.5, help="end the ramp once errors exceed this")
+    ap.add_argument("--startup-timeout", type=float, default=300.0)
+    ap.add_argument("--server-env", action="append", default=[], metavar="KEY=VALUE")
+    ap.add_argument("--keep-caches", action="store_true", help="leave the parse cache and near-duplicate reuse on")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--output", help="report path; default benchmarks/results/load-<timestamp>.json")
+    args = ap.parse_args()
+    ramp = [int(c) for c in args.ramp.split(",") if c]
+    if args.warmup_seconds >= args.step_seconds:
+        ap.error("--warmup-seconds must be shorter than --step-seconds")
+
+    print("Rendering uploads...", file=sys.stderr)
+    pool = UploadPool(args.sizes)
+    mix = RequestMix(pool, args.mix, set(args.verify_files.split(",")))
+
+    tmp = tempfile.mkdtemp(prefix="authenex-load-")
+    server = sampler = None
+    steps = []
+    with LLMStub(certificate_for("a4-150dpi").fields, latency_ms=args.llm_latency_ms) as llm_stub, \
+            LedgerStub(latency_ms=args.ledger_latency_ms) as ledger_stub:
+        try:
+            if args.url:
+                base_url = args.url.rstrip("/")
+            else:
+                args.port = args.port or free_port()
+                base_url = f"http://127.0.0.1:{args.port}"
+                log_path = os.path.join(tmp, "server.log")
+                server = start_server(args, llm_stub, ledger_stub, log_path)
+                print(f"Started uvicorn ({args.workers} worker(s)) on {base_url}; log: {log_path}", file=sys.stderr)
+            wait_until_ready(base_url, server, args.startup_timeout)
+            if server is not None:
+                sampler = MemorySampler(server.pid).start()
+                idle_memory = sampler.take()
+
+            print(f"{'conc':>5}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}"
+                  f"{'probe p99':>11}{'RSS MB':>10}")
+            for i, concurrency in enumerate(ramp):
+                step = asyncio.run(run_step(base_url, mix, concurrency, args, args.seed + i))
+                step["server_rss_mb"] = sampler.take() if sampler else None
+                steps.append(step)
+                print_step(step, step["server_rss_mb"])
+                if step["error_rate"] is not None and step["error_rate"] > args.stop_error_rate:
+                    print(f"Error rate {step['error_rate']:.0%} above {args.stop_error_rate:.0%}; stopping the ramp",
+                          file=sys.stderr)
+                    break
+        finally:
+            if sampler is not None:
+                sampler.stop()
+            if server is not None:
+                server.terminate()
+                try:
+                    server.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+        stub_requests = {"llm": llm_stub.requests, "ledger": ledger_stub.requests}
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "target": args.url or "local uvicorn",
+            "workers": None if args.url else args.workers,
+            "cpu_count": os.cpu_count(),
+            "mix": args.mix, "sizes": args.sizes, "verify_files": args.verify_files, "ramp": ramp,
+            "step_seconds": args.step_seconds, "warmup_seconds": args.warmup_seconds,
+            "llm_latency_ms": args.llm_latency_ms, "ledger_latency_ms": args.ledger_latency_ms,
+            "keep_caches": args.keep_caches, "server_env": args.server_env,
+            "stub_requests": stub_requests,
+            "idle_server_rss_mb": idle_memory if sampler else None,
+        },
+        "steps": steps,
+        "saturation": saturation(steps, args.slo_p95_ms),
+    }
+    path = args.output or os.path.join(BENCH_DIR, "results", datetime.now().strftime("load-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    if report["saturation"]:
+        sat = report["saturation"]
+        breach = sat["slo_breached_at_concurrency"]
+        print(f"\nPeak {sat['peak_throughput_rps']} req/s at concurrency {sat['peak_at_concurrency']}; "
+              + (f"p95 above {args.slo_p95_ms:.0f} ms from concurrency {breach}" if breach is not None
+                 else f"p95 within {args.slo_p95_ms:.0f} ms at every step"))
+    print(f"Report written to {path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""Accuracy parity and latency/memory of the ONNX backends against the native models.
+
+Every backend (INFERENCE_BACKEND=native, onnx, onnx-int8) loads the models
+through the model registry in its own interpreter, so load time and RSS
+are its own. It then runs the same fixture inputs:
+
+    sign_verifier  siamese distances for signature pairs, batch-1 verify latency, embedding throughput
+    sign_parser    signature boxes on certificate scans, per-image detection latency
+
+The ONNX outputs are compared with the native ones: the largest distance
+difference, agreement of the match decision at the verifier threshold,
+embedding cosine similarity, and box IoU / count agreement for detection.
+The script exits 1 when a backend misses --max-distance-delta,
+--min-agreement or --min-box-iou.
+
+    PYTHONPATH=Backend python -m src.onnx_backend export --int8     # once, from the repo root
+    python Backend/benchmarks/onnx_parity.py
+    python Backend/benchmarks/onnx_parity.py --models sign_verifier --backends native,onnx-int8 --pairs 64
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+os.environ.pop("MODEL_SERVER_SOCKET", None)
+
+from fixtures import certificate_for  # noqa: E402
+from run_benchmarks import current_rss_mb, peak_rss_mb  # noqa: E402
+
+THRESHOLD = 0.5
+DETECTION_RESOLUTIONS = ["a4-150dpi", "a4-300dpi", "phone-12mp"]
+
+
+def latency_stats(seconds):
+    ms = np.asarray(seconds) * 1000
+    return {"p50": round(float(np.percentile(ms, 50)), 3), "p95": round(float(np.percentile(ms, 95)), 3),
+            "mean": round(float(ms.mean()), 3)}
+
+
+def timed_runs(fn, iterations, warmup=3):
+    for _ in range(warmup):
+        fn()
+    seconds = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - start)
+    return latency_stats(seconds)
+
+
+# ---------------- Worker (one backend, one model) ---------------- #
+def signature_inputs(pairs):
+    """Preprocessed signature crops and index pairs: same-certificate and cross-certificate."""
+    from src.sign_verifier import SignatureVerifier
+    preprocess = SignatureVerifier(model=object()).preprocess_signature
+    crops = []
+    for seed in range(max(1, pairs // 2)):
+        crops += [preprocess(c) for c in certificate_for("a4-150dpi", seed).signature_crops()]
+    index_pairs = [(i, i + 1) for i in range(0, len(crops) - 1, 2)]
+    index_pairs += [(i, (i + 3) % len(crops)) for i in range(len(crops))]
+    return np.stack(crops), index_pairs[:pairs]
+
+
+def run_sign_verifier(args):
+    from src.model_registry import get_registry
+    images, index_pairs = signature_inputs(args.pairs)
+    model = get_registry().get("sign_verifier").model
+    distances = [float(model.predict([images[a:a + 1], images[b:b + 1]], verbose=0)[0][0])
+                 for a, b in index_pairs]
+
+    from src.sign_verifier import SignatureVerifier
+    tower = SignatureVerifier(model=model).embedding_model
+    embeddings = np.asarray(tower.predict(images, batch_size=64, verbose=0), dtype=np.float32)
+
+    a, b = index_pairs[0]
+    verify = timed_runs(lambda: model.predict([images[a:a + 1], images[b:b + 1]], verbose=0), args.iterations)
+    batch = images[np.arange(32) % len(images)]
+    embed = timed_runs(lambda: tower.predict(batch, batch_size=32, verbose=0), max(3, args.iterations // 5))
+    return {
+        "outputs": {"distances": distances, "embeddings": embeddings.tolist()},
+        "latency_ms": {"verify_pair": verify, "embed_batch32": embed},
+    }
+
+
+def run_sign_parser(args):
+    from src.certificate_parser import signature_boxes
+    from src.model_registry import get_registry
+    images = [certificate_for(resolution, seed).image
+              for resolution in DETECTION_RESOLUTIONS for seed in range(args.scans)]
+    with get_registry().get("sign_parser") as model:
+        boxes = [[list(box) for _, box in signature_boxes(model(image, verbose=False))] for image in images]
+        image = images[0]
+        detect = timed_runs(lambda: model(image, verbose=False), args.iterations)
+    return {"outputs": {"boxes": boxes}, "latency_ms": {"detect_a4_150dpi": detect}}
+
+
+RUNNERS = {"sign_verifier": run_sign_verifier, "sign_parser": run_sign_parser}
+
+
+def worker(args):
+    from src.model_registry import get_registry
+    from src.onnx_backend import loaded_backends
+    rss_start = current_rss_mb()
+    start = time.perf_counter()
+    get_registry().get(args.model)
+    load_seconds = time.perf_counter() - start
+    rss_loaded = current_rss_mb()
+    loaded = loaded_backends().get(args.model)
+    if loaded != os.environ["INFERENCE_BACKEND"]:
+        raise SystemExit(f"{args.model} loaded with the {loaded} backend; export the ONNX files first")
+    result = RUNNERS[args.model](args)
+    rss_end = current_rss_mb()
+    result.update({
+        "load_seconds": round(load_seconds, 3),
+        "rss_model_mb": round(rss_loaded - rss_start, 1),
+        "rss_mb": round(rss_end, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    })
+    json.dump(result, sys.stdout)
+
+
+def run_backend(model, backend, args):
+    cmd = [sys.executable, os.path.abspath(__file__), "--worker", model, "--pairs", str(args.pairs),
+           "--scans", str(args.scans), "--iterations", str(args.iterations)]
+    env = dict(os.environ, INFERENCE_BACKEND=backend)
+    proc = subprocess.run(cmd, capture_output=True, text=True, env=env, cwd=REPO_DIR)
+    if proc.returncode != 0:
+        return {"status": "skipped", "reason": (proc.stderr.strip().splitlines() or ["worker failed"])[-1]}
+    return {"status": "ok", **json.loads(proc.stdout.strip().splitlines()[-1])}
+
+
+# ---------------- Comparison ---------------- #
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union else 0.0
+
+
+def compare_sign_verifier(reference, candidate):
+    ref, cand = np.asarray(reference["distances"]), np.asarray(candidate["distances"])
+    ref_emb, cand_emb = np.asarray(reference["embeddings"]), np.asarray(candidate["embeddings"])
+    cosine = (ref_emb * cand_emb).sum(axis=1) / (
+        np.linalg.norm(ref_emb, axis=1) * np.linalg.norm(cand_emb, axis=1) + 1e-12)
+    return {
+        "max_distance_delta": round(float(np.abs(ref - cand).max()), 5),
+        "mean_distance_delta": round(float(np.abs(ref - cand).mean()), 5),
+        "decision_agreement": round(float(((ref < THRESHOLD) == (cand < THRESHOLD)).mean()), 4),
+        "min_embedding_cosine": round(float(cosine.min()), 5),
+    }
+
+
+def compare_sign_parser(reference, candidate):
+    ious, count_matches = [], 0
+    for ref_boxes, cand_boxes in zip(reference["boxes"], candidate["boxes"]):
+        count_matches += len(ref_boxes) == len(cand_boxes)
+        ious += [max((iou(box, other) for other in cand_boxes), default=0.0) for box in ref_boxes]
+    return {
+        "count_agreement": round(count_matches / len(reference["boxes"]), 4),
+        "mean_box_iou": round(float(np.mean(ious)), 4) if ious else None,
+        "min_box_iou": round(float(np.min(ious)), 4) if ious else None,
+    }
+
+
+def check(model, parity, args):
+    failures = []
+    if model == "sign_verifier":
+        if parity["max_distance_delta"] > args.max_distance_delta:
+            failures.append(f"distance delta {parity['max_distance_delta']} > {args.max_distance_delta}")
+        if parity["decision_agreement"] < args.min_agreement:
+            failures.append(f"decision agreement {parity['decision_agreement']} < {args.min_agreement}")
+    else:
+        if parity["count_agreement"] < args.min_agreement:
+            failures.append(f"box count agreement {parity['count_agreement']} < {args.min_agreement}")
+        if parity["min_box_iou"] is not None and parity["min_box_iou"] < args.min_box_iou:
+            failures.append(f"box IoU {parity['min_box_iou']} < {args.min_box_iou}")
+    return failures
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--models", default="sign_verifier,sign_parser")
+    ap.add_argument("--backends", default="native,onnx,onnx-int8", help="the first one is the reference")
+    ap.add_argument("--pairs", type=int, default=32, help="signature pairs compared")
+    ap.add_argument("--scans", type=int, default=3, help="certificate scans per resolution for detection")
+    ap.add_argument("--iterations", type=int, default=50)
+    ap.add_argument("--max-distance-delta", type=float, default=0.05)
+    ap.add_argument("--min-agreement", type=float, default=0.98)
+    ap.add_argument("--min-box-iou", type=float, default=0.9)
+    ap.add_argument("--output", help="report path; default benchmarks/results/onnx-<timestamp>.json")
+    ap.add_argument("--worker", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.worker:
+        args.model = args.worker
+        os.chdir(REPO_DIR)
+        worker(args)
+        return
+
+    backends = args.backends.split(",")
+    report = {"meta": {"timestamp": datetime.now().isoformat(timespec="seconds"), "cpu_count": os.cpu_count(),
+                       "backends": backends, "pairs": args.pairs, "scans": args.scans,
+                       "iterations": args.iterations,
+                       "threads": os.getenv("ONNX_INTRA_OP_THREADS")},
+              "models": {}}
+    failures = []
+    for model in args.models.split(","):
+        runs = {backend: run_backend(model, backend, args) for backend in backends}
+        reference = runs[backends[0]]
+        entry = {}
+        print(f"\n{model}")
+        for backend, run in runs.items():
+            if run["status"] != "ok":
+                print(f"  {backend:<10} skipped: {run['reason']}")
+                entry[backend] = run
+                continue
+            outputs = run.pop("outputs")
+            if backend == backends[0]:
+                reference_outputs = outputs
+            elif reference["status"] == "ok":
+                compare = compare_sign_verifier if model == "sign_verifier" else compare_sign_parser
+                run["parity"] = compare(reference_outputs, outputs)
+                problems = check(model, run["parity"], args)
+                run["parity"]["passed"] = not problems
+                failures += [f"{model}/{backend}: {p}" for p in problems]
+                if reference.get("rss_model_mb") is not None:
+                    run["rss_model_delta_mb"] = round(run["rss_model_mb"] - reference["rss_model_mb"], 1)
+            entry[backend] = run
+            latency = ", ".join(f"{k} p50 {v['p50']:.1f} ms" for k, v in run["latency_ms"].items())
+            print(f"  {backend:<10} load {run['load_seconds']:.2f}s, model RSS {run['rss_model_mb']:.0f} MB, "
+                  f"{latency}" + (f"\n             parity {run['parity']}" if "parity" in run else ""))
+        report["models"][model] = entry
+
+    report["failures"] = failures
+    path = args.output or os.path.join(BENCH_DIR, "results", datetime.now().strftime("onnx-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {path}", file=sys.stderr)
+    for failure in failures:
+        print(f"PARITY FAILURE {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
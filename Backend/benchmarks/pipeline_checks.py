@@ -0,0 +1,131 @@
+"""Correctness checks for pipeline behaviour on synthetic certificates.
+
+Unlike the benchmarks, these assert results instead of timing them. Each
+check passes, fails, or is skipped when its package, binary or model weights
+are missing (same rules as run_benchmarks.py). The script exits 1 on any
+failure.
+
+    python benchmarks/pipeline_checks.py
+    python benchmarks/pipeline_checks.py --checks photoless_ocr,face_batch_mixed_sizes
+"""
+import argparse
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+os.environ.setdefault("PARSE_CACHE_ENABLED", "false")
+os.environ.setdefault("NEAR_DUP_ENABLED", "false")
+os.environ.setdefault("SAVE_CROPS", "false")
+os.environ.pop("MODEL_SERVER_SOCKET", None)
+
+from fixtures import RESOLUTIONS, make_certificate  # noqa: E402
+
+
+class Skip(Exception):
+    """The check cannot run in this environment."""
+
+
+class Failed(Exception):
+    """The check ran and the behaviour is wrong."""
+
+
+CHECKS = {}
+
+
+def check(fn):
+    CHECKS[fn.__name__] = fn
+    return fn
+
+
+def certificate_parser(tmp):
+    try:
+        from src.certificate_parser import CertificateParser
+    except ImportError as e:
+        raise Skip(f"certificate parser unavailable: {e}")
+    return CertificateParser(os.path.join(tmp, "signatures"), os.path.join(tmp, "photos"), save_crops=False)
+
+
+@check
+def photoless_ocr(tmp):
+    """No face box on a certificate without a photo, so ROI OCR masks nothing beyond the signatures."""
+    parser = certificate_parser(tmp)
+    if not (shutil.which("tesseract") or importlib.util.find_spec("tesserocr")):
+        raise Skip("tesseract is not installed")
+    missing = [p for p in parser.face_detector_paths if not os.path.exists(p)]
+    if missing:
+        raise Skip(f"face detector weights not found: {', '.join(missing)}")
+
+    for resolution in ("a4-150dpi", "a4-300dpi"):
+        for seed in range(3):
+            cert = make_certificate(*RESOLUTIONS[resolution], seed=seed, photo=False)
+            face_box = parser.detect_face(cert.image)
+            if face_box is not None:
+                raise Failed(f"{resolution} seed {seed}: face box {face_box} on a certificate without a photo")
+            signatures = [box for _, box in cert.signature_detections]
+            # Same exclusions as CertificateParser._parse_certificate
+            text = parser.extract_text_from_regions(cert.image, signatures + ([face_box] if face_box else []))
+            if text != parser.extract_text_from_regions(cert.image, signatures):
+                raise Failed(f"{resolution} seed {seed}: OCR text changed by the face exclusion")
+    return "6 photo-less certificates: no face box, OCR unchanged"
+
+
+@check
+def face_batch_mixed_sizes(tmp):
+    """Photo crops of different sizes share one embedding batch and match their unbatched embeddings."""
+    if importlib.util.find_spec("keras_facenet") is None:
+        raise Skip("keras_facenet is not installed")
+    os.environ["FACE_BATCH_WINDOW_MS"] = "50"
+    from src.photo_verifier import face_batcher, get_embedding
+
+    crops = [make_certificate(*RESOLUTIONS[resolution], seed=seed).photo_crop()
+             for resolution in RESOLUTIONS for seed in range(2)]
+    sizes = {crop.shape[:2] for crop in crops}
+    if len(sizes) < 2:
+        raise Failed(f"fixtures gave one crop size only: {sizes}")
+    # Submitted together, so the batcher stacks every size into the same forward pass
+    with ThreadPoolExecutor(max_workers=len(crops)) as pool:
+        batched = list(pool.map(lambda crop: get_embedding(crop, skip_detection=True), crops))
+    if face_batcher() is None:
+        raise Failed("face batcher is disabled")
+    os.environ["FACE_BATCH_WINDOW_MS"] = "0"
+    for crop, embedding in zip(crops, batched):
+        alone = get_embedding(crop, skip_detection=True)
+        cosine = float(embedding @ alone / (np.linalg.norm(embedding) * np.linalg.norm(alone)))
+        if cosine < 0.999:
+            raise Failed(f"{crop.shape[:2]} crop: batched embedding differs (cosine {cosine:.4f})")
+    return f"{len(crops)} crops in {len(sizes)} sizes embedded in one batch"
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--checks", default=",".join(CHECKS))
+    args = ap.parse_args()
+
+    failures = 0
+    tmp = tempfile.mkdtemp(prefix="authenex-checks-")
+    try:
+        for name in args.checks.split(","):
+            try:
+                status, detail = "ok", CHECKS[name](tmp)
+            except Skip as e:
+                status, detail = "skipped", str(e)
+            except Failed as e:
+                status, detail = "FAILED", str(e)
+                failures += 1
+            print(f"{name:<24}{status:<9}{detail}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,518 @@
+"""Offline benchmark suite for the inference stages.
+
+Times every stage on synthetic certificates (fixtures.py) at several
+resolutions, individually and end to end. Local stand-ins replace the LLM
+endpoint and the ledger (stubs.py). The JSON report has throughput,
+p50/p95/p99 latency and RSS for each stage, so runs can be compared over
+time.
+
+    python benchmarks/run_benchmarks.py                      # all stages, default resolutions
+    python benchmarks/run_benchmarks.py --cases analyze_for_edits,crop_photo --iterations 50
+    python benchmarks/run_benchmarks.py --isolate            # one process per stage: per-stage peak RSS
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/baseline.json --max-regression 0.2
+
+Stages whose package, binary or model weights are missing (tesseract,
+YOLO, the face SSD, FaceNet, the signature model) are reported as skipped,
+with the reason. Without the detection models, parse_certificate and
+end_to_end use the fixture's known boxes instead of YOLO and the face SSD;
+the report records which one was used. FaceNet runs with skip_detection,
+because MTCNN finds no face in a drawn portrait.
+"""
+import argparse
+import base64
+import importlib.util
+import itertools
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+# Measure the pipeline, not the caches in front of it
+os.environ.setdefault("PARSE_CACHE_ENABLED", "false")
+os.environ.setdefault("NEAR_DUP_ENABLED", "false")
+os.environ.setdefault("SAVE_CROPS", "false")
+# Template rules would answer before the LLM stub is reached
+os.environ.setdefault("TEMPLATE_EXTRACTION_ENABLED", "false")
+os.environ.pop("MODEL_SERVER_SOCKET", None)
+
+from fixtures import RESOLUTIONS, certificate_for  # noqa: E402
+from stubs import LedgerClient, LedgerStub, LLMStub  # noqa: E402
+
+DEFAULT_RESOLUTIONS = ["a4-150dpi", "a4-300dpi"]
+RECORDED_ENV = ["OCR_MODE", "OCR_ENGINE", "OCR_WORKERS", "OCR_TARGET_DPI", "FACE_BATCH_WINDOW_MS",
+                "FACE_BATCH_MAX", "TEMPLATE_EXTRACTION_ENABLED", "LLM_MAX_CONCURRENCY", "LLM_BATCH_SIZE",
+                "TF_NUM_INTRAOP_THREADS", "OMP_NUM_THREADS"]
+
+
+class Skip(Exception):
+    """The stage cannot run in this environment."""
+
+
+# ---------------- Memory ---------------- #
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+# ---------------- Environment ---------------- #
+class Bench:
+    """Lazily built shared state: stubs, parser, verifier and fixture files."""
+
+    def __init__(self, llm_latency_ms, ledger_latency_ms):
+        self.tmp = tempfile.mkdtemp(prefix="authenex-bench-")
+        self.llm_stub = None
+        self.ledger_stub = None
+        self.llm_latency_ms = llm_latency_ms
+        self.ledger_latency_ms = ledger_latency_ms
+        self._ledger = None
+        self._parser = None
+        self._verifier = None
+        self._certificates = {}
+
+    def certificate(self, resolution, seed=0):
+        key = (resolution, seed)
+        if key not in self._certificates:
+            self._certificates[key] = certificate_for(resolution, seed)
+        return self._certificates[key]
+
+    def jpeg_path(self, cert, seed=0):
+        path = os.path.join(self.tmp, f"{cert.name}-{seed}.jpg")
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(cert.jpeg_bytes)
+        return path
+
+    def start_llm_stub(self, fields):
+        if self.llm_stub is None:
+            self.llm_stub = LLMStub(fields, latency_ms=self.llm_latency_ms).start()
+            # Read when the parser builds its pooled client
+            os.environ["HF_LLM_BASE_URL"] = self.llm_stub.url
+            os.environ.setdefault("HF_API_TOKEN", "benchmark")
+        return self.llm_stub
+
+    @property
+    def ledger(self):
+        if self._ledger is None:
+            self.ledger_stub = LedgerStub(latency_ms=self.ledger_latency_ms).start()
+            self._ledger = LedgerClient(self.ledger_stub.url)
+        return self._ledger
+
+    @property
+    def parser(self):
+        if self._parser is None:
+            self.start_llm_stub(self.certificate(DEFAULT_RESOLUTIONS[0]).fields)
+            try:
+                from src.certificate_parser import CertificateParser
+            except ImportError as e:
+                raise Skip(f"certificate parser unavailable: {e}")
+            self._parser = CertificateParser(os.path.join(self.tmp, "signatures"),
+                                             os.path.join(self.tmp, "photos"), save_crops=False)
+        return self._parser
+
+    def require_ocr(self):
+        if not (shutil.which("tesseract") or importlib.util.find_spec("tesserocr")):
+            raise Skip("tesseract is not installed")
+
+    def detection_models_available(self):
+        parser = self.parser
+        paths = [parser.sign_parser_model_path, *parser.face_detector_paths]
+        return importlib.util.find_spec("ultralytics") is not None and all(map(os.path.exists, paths))
+
+    def stand_in_detection(self, cert):
+        """Use the fixture's boxes when YOLO or the face SSD is not available; returns the mode used."""
+        parser = self.parser
+        if self.detection_models_available():
+            parser.__dict__.pop("detect_signatures", None)
+            parser.__dict__.pop("detect_face", None)
+            return "models"
+        parser.detect_signatures = lambda image: list(cert.signature_detections)
+        parser.detect_face = lambda image: cert.photo_box
+        return "fixture boxes"
+
+    def require_facenet(self):
+        for package in ("keras_facenet", "tensorflow"):
+            if importlib.util.find_spec(package) is None:
+                raise Skip(f"{package} is not installed")
+
+    @property
+    def verifier(self):
+        if self._verifier is None:
+            from src.model_registry import SIGN_VERIFIER_MODEL_PATH
+            path = os.getenv("SIGN_VERIFIER_MODEL_PATH", SIGN_VERIFIER_MODEL_PATH)
+            if importlib.util.find_spec("tensorflow") is None:
+                raise Skip("tensorflow is not installed")
+            if not os.path.exists(path):
+                raise Skip(f"signature model not found at {path}")
+            from src.sign_verifier import SignatureVerifier
+            self._verifier = SignatureVerifier(model_path=path)
+        return self._verifier
+
+    def close(self):
+        for stub in (self.llm_stub, self.ledger_stub):
+            if stub is not None:
+                stub.close()
+        if self._ledger is not None:
+            self._ledger.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+
+# ---------------- Stages ---------------- #
+CASES = {}
+
+
+def case(name, per_resolution=True):
+    """Register `setup(bench, cert) -> (callable, extra)`; the callable is what gets timed."""
+    def register(setup):
+        CASES[name] = (setup, per_resolution)
+        return setup
+    return register
+
+
+@case("extract_text_from_image")
+def _extract_text(bench, cert):
+    bench.require_ocr()
+    parser = bench.parser
+    return lambda: parser.extract_text_from_image(cert.image), {"ocr_engine": type(parser.ocr_engine).__name__}
+
+
+@case("crop_signatures")
+def _crop_signatures(bench, cert):
+    parser = bench.parser
+    return lambda: parser.crop_signatures(cert.image, "bench", save=False,
+                                          detections=cert.signature_detections), {}
+
+
+@case("crop_photo")
+def _crop_photo(bench, cert):
+    parser = bench.parser
+    return lambda: parser.crop_photo(cert.image, "bench", save=False, box=cert.photo_box), {}
+
+
+@case("get_embedding")
+def _get_embedding(bench, cert):
+    bench.require_facenet()
+    from src.photo_verifier import get_embedding
+    crop = np.ascontiguousarray(cert.photo_crop())
+    return lambda: get_embedding(crop, skip_detection=True), {"skip_detection": True}
+
+
+@case("verify_signatures")
+def _verify_signatures(bench, cert):
+    verifier = bench.verifier
+    sig1, sig2 = [np.ascontiguousarray(c) for c in cert.signature_crops()]
+
+    def run():
+        if verifier.verify_signatures(sig1, sig2) is None:
+            raise RuntimeError("verify_signatures failed")
+    return run, {}
+
+
+@case("batch_verify")
+def _batch_verify(bench, cert):
+    verifier = bench.verifier
+    import cv2
+    paths = []
+    for seed in range(4):
+        for i, crop in enumerate(bench.certificate(cert.name, seed).signature_crops()):
+            path = os.path.join(bench.tmp, f"sig-{cert.name}-{seed}-{i}.png")
+            cv2.imwrite(path, crop)
+            paths.append(path)
+    pairs = list(itertools.combinations(paths, 2))
+    return lambda: verifier.batch_verify(pairs), {"pairs": len(pairs)}
+
+
+@case("analyze_for_edits")
+def _analyze_for_edits(bench, cert):
+    from src.pixel_mismatch import analyze_for_edits
+    path = bench.jpeg_path(cert)
+    return lambda: analyze_for_edits(path), {}
+
+
+@case("llm_extraction", per_resolution=False)
+def _llm_extraction(bench, cert):
+    parser = bench.parser
+    return (lambda: parser.extract_certificate_info(None, extracted_text=cert.text),
+            {"stub_latency_ms": bench.llm_latency_ms})
+
+
+@case("ledger_lookup", per_resolution=False)
+def _ledger_lookup(bench, cert):
+    ledger = bench.ledger
+    certificate_hash = "0x" + "ab" * 32
+    ledger.store_certificate(certificate_hash, {"certificate_info": cert.fields})
+    return lambda: ledger.get_certificate_info(certificate_hash), {"stub_latency_ms": bench.ledger_latency_ms}
+
+
+@case("parse_certificate")
+def _parse_certificate(bench, cert):
+    bench.require_ocr()
+    parser = bench.parser
+    detection = bench.stand_in_detection(cert)
+    return lambda: parser.parse_certificate(cert.jpeg_bytes, save_crops=False), {"detection": detection}
+
+
+@case("end_to_end")
+def _end_to_end(bench, cert):
+    """Parse, ledger lookup, ELA, and photo / signature checks when their models are present."""
+    bench.require_ocr()
+    from src.pixel_mismatch import analyze_for_edits
+    parser = bench.parser
+    ledger = bench.ledger
+    detection = bench.stand_in_detection(cert)
+    path = bench.jpeg_path(cert)
+    certificate_hash = "0x" + "cd" * 32
+    ledger.store_certificate(certificate_hash, {"certificate_info": cert.fields})
+
+    checks = []
+    try:
+        bench.require_facenet()
+        from src.photo_verifier import get_embedding
+        checks.append("photo")
+    except Skip:
+        get_embedding = None
+    try:
+        verifier = bench.verifier
+        checks.append("signature")
+    except Skip:
+        verifier = None
+
+    def run():
+        import cv2
+        result = parser.parse_certificate(cert.jpeg_bytes, save_crops=False)
+        ledger.get_certificate_info(certificate_hash)
+        analyze_for_edits(path)
+        if get_embedding is not None and result.get("photo_image"):
+            photo = cv2.imdecode(np.frombuffer(base64.b64decode(result["photo_image"]), np.uint8), cv2.IMREAD_COLOR)
+            get_embedding(photo, skip_detection=True)
+        signatures = result.get("signature_images") or []
+        if verifier is not None and len(signatures) >= 2:
+            crops = [cv2.imdecode(np.frombuffer(base64.b64decode(s), np.uint8), cv2.IMREAD_COLOR)
+                     for s in signatures[:2]]
+            verifier.verify_signatures(*crops)
+    return run, {"detection": detection, "checks": ["parse", "ledger", "ela", *checks]}
+
+
+# ---------------- Measurement ---------------- #
+def measure(fn, iterations, warmup, concurrency):
+    for _ in range(warmup):
+        fn()
+    rss_before = current_rss_mb()
+    latencies = []
+
+    def one(_=None):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+
+    wall_start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(one, range(iterations)))
+    else:
+        for _ in range(iterations):
+            one()
+    wall = time.perf_counter() - wall_start
+
+    ms = np.array(latencies) * 1000
+    rss_after = current_rss_mb()
+    return {
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "throughput_per_s": round(iterations / wall, 3),
+        "latency_ms": {
+            "mean": round(float(ms.mean()), 3),
+            "min": round(float(ms.min()), 3),
+            "p50": round(float(np.percentile(ms, 50)), 3),
+            "p95": round(float(np.percentile(ms, 95)), 3),
+            "p99": round(float(np.percentile(ms, 99)), 3),
+            "max": round(float(ms.max()), 3),
+        },
+        "rss_mb": round(rss_after, 1) if rss_after is not None else None,
+        "rss_delta_mb": round(rss_after - rss_before, 1) if rss_after is not None else None,
+        # High-water mark of the whole process so far; use --isolate for per-stage peaks
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def run_case(bench, name, resolution, args):
+    setup, _ = CASES[name]
+    entry = {"case": name, "resolution": resolution}
+    cert = bench.certificate(resolution or DEFAULT_RESOLUTIONS[0])
+    if resolution:
+        entry["pixels"] = [cert.width, cert.height]
+    try:
+        fn, extra = setup(bench, cert)
+        entry.update(extra)
+        entry.update(measure(fn, args.iterations, args.warmup, args.concurrency))
+        entry["status"] = "ok"
+    except Skip as e:
+        entry.update(status="skipped", reason=str(e))
+    except Exception as e:
+        entry.update(status="error", reason=f"{type(e).__name__}: {e}")
+    return entry
+
+
+def run_isolated(name, resolution, args):
+    """Run one stage in a fresh interpreter so its peak RSS is its own."""
+    cmd = [sys.executable, os.path.abspath(__file__), "--cases", name, "--resolutions", resolution or "",
+           "--iterations", str(args.iterations), "--warmup", str(args.warmup),
+           "--concurrency", str(args.concurrency), "--llm-latency-ms", str(args.llm_latency_ms),
+           "--ledger-latency-ms", str(args.ledger_latency_ms), "--output", "-", "--quiet"]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {"case": name, "resolution": resolution, "status": "error",
+                "reason": (proc.stderr.strip().splitlines() or ["subprocess failed"])[-1]}
+    return json.loads(proc.stdout)["results"][0]
+
+
+def metadata(args):
+    def version(module):
+        try:
+            return __import__(module).__version__
+        except Exception:
+            return None
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "versions": {m: version(m) for m in ("numpy", "cv2", "PIL", "tensorflow", "ultralytics")},
+        "env": {k: os.environ[k] for k in RECORDED_ENV if k in os.environ},
+        "settings": {"iterations": args.iterations, "warmup": args.warmup, "concurrency": args.concurrency,
+                     "isolate": args.isolate, "llm_latency_ms": args.llm_latency_ms,
+                     "ledger_latency_ms": args.ledger_latency_ms},
+    }
+
+
+# ---------------- Reporting ---------------- #
+def print_header(out=sys.stderr):
+    print(f"{'case':<26}{'resolution':<13}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/s':>9}"
+          f"{'peak MB':>9}  notes", file=out)
+
+
+def print_row(r, out=sys.stderr):
+    if r["status"] != "ok":
+        print(f"{r['case']:<26}{r['resolution'] or '-':<13}{r['status']:>10}  {r.get('reason', '')}", file=out)
+        return
+    lat = r["latency_ms"]
+    print(f"{r['case']:<26}{r['resolution'] or '-':<13}{lat['p50']:>10.1f}{lat['p95']:>10.1f}"
+          f"{lat['p99']:>10.1f}{r['throughput_per_s']:>9.2f}{r['peak_rss_mb']:>9.0f}  {r.get('detection', '')}",
+          file=out)
+
+
+def compare(results, baseline_path, max_regression, out=sys.stderr):
+    """Print p50/p95 changes against a previous report; returns the regressions beyond the limit."""
+    with open(baseline_path) as f:
+        baseline = {(r["case"], r["resolution"]): r for r in json.load(f)["results"] if r["status"] == "ok"}
+    regressions = []
+    print(f"\nAgainst {baseline_path} (limit +{max_regression:.0%}):", file=out)
+    for r in results:
+        before = baseline.get((r["case"], r["resolution"]))
+        if r["status"] != "ok" or before is None:
+            continue
+        changes = {q: r["latency_ms"][q] / before["latency_ms"][q] - 1
+                   for q in ("p50", "p95") if before["latency_ms"][q] > 0}
+        flag = any(change > max_regression for change in changes.values())
+        if flag:
+            regressions.append({"case": r["case"], "resolution": r["resolution"], **changes})
+        print(f"  {r['case']:<26}{r['resolution'] or '-':<13}"
+              + "".join(f"{q} {change:+7.1%}  " for q, change in changes.items())
+              + ("REGRESSION" if flag else ""), file=out)
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--cases", default=",".join(CASES), help=f"comma-separated subset of: {', '.join(CASES)}")
+    ap.add_argument("--resolutions", default=",".join(DEFAULT_RESOLUTIONS),
+                    help=f"comma-separated subset of: {', '.join(RESOLUTIONS)}")
+    ap.add_argument("--iterations", type=int, default=20)
+    ap.add_argument("--warmup", type=int, default=2)
+    ap.add_argument("--concurrency", type=int, default=1, help="parallel callers per stage (throughput runs)")
+    ap.add_argument("--llm-latency-ms", type=float, default=50.0)
+    ap.add_argument("--ledger-latency-ms", type=float, default=20.0)
+    ap.add_argument("--isolate", action="store_true", help="run each stage in its own process")
+    ap.add_argument("--output", help="report path ('-' for stdout); default benchmarks/results/<timestamp>.json")
+    ap.add_argument("--compare", help="previous report to compare against")
+    ap.add_argument("--max-regression", type=float, default=0.2,
+                    help="fail (exit 1) when p50 or p95 grows by more than this fraction")
+    ap.add_argument("--quiet", action="store_true")
+    args = ap.parse_args()
+
+    names = [n for n in args.cases.split(",") if n]
+    unknown = [n for n in names if n not in CASES]
+    if unknown:
+        ap.error(f"unknown cases: {', '.join(unknown)}")
+    resolutions = [r for r in args.resolutions.split(",") if r] or DEFAULT_RESOLUTIONS
+    unknown = [r for r in resolutions if r not in RESOLUTIONS]
+    if unknown:
+        ap.error(f"unknown resolutions: {', '.join(unknown)}")
+
+    # The parser resolves its model paths (Backend/models/...) from the repository root
+    os.chdir(REPO_DIR)
+    plan = [(name, resolution) for name in names
+            for resolution in (resolutions if CASES[name][1] else [None])]
+
+    bench = None if args.isolate else Bench(args.llm_latency_ms, args.ledger_latency_ms)
+    results = []
+    if not args.quiet:
+        print_header()
+    try:
+        for name, resolution in plan:
+            result = run_isolated(name, resolution, args) if args.isolate else run_case(bench, name, resolution, args)
+            results.append(result)
+            if not args.quiet:
+                print_row(result)
+    finally:
+        if bench is not None:
+            bench.close()
+
+    report = {"meta": metadata(args), "results": results}
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+    else:
+        path = args.output or os.path.join(BENCH_DIR, "results",
+                                           datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {path}", file=sys.stderr)
+
+    if args.compare:
+        if compare(results, args.compare, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
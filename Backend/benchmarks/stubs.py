@@ -0,0 +1,240 @@
+"""Local stand-ins for the external services the pipeline calls.
+
+`LLMStub` serves the OpenAI-compatible `/v1/chat/completions` route used by
+`src.llm_client` (point HF_LLM_BASE_URL at `stub.url`). `LedgerStub` is a
+JSON-RPC 2.0 endpoint with `ledger_getCertificate` and
+`ledger_storeCertificate`, called singly or in batch arrays. It also answers
+the Ethereum calls a web3 client makes for contract reads and transactions
+(point BLOCKCHAIN_RPC_URL at it). Both add a configurable latency, so benchmarks
+measure the client side without depending on network conditions.
+"""
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+
+class _StubServer:
+    """ThreadingHTTPServer on an ephemeral localhost port, served from a daemon thread."""
+
+    def __init__(self, latency_ms=0.0):
+        self.latency_ms = latency_ms
+        self.requests = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out as separate writes; Nagle would hold the body for a delayed ACK
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with stub._lock:
+                    stub.requests += 1
+                if stub.latency_ms:
+                    time.sleep(stub.latency_ms / 1000)
+                status, payload = stub.handle(self.path, json.loads(body or b"null"))
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name=type(self).__name__, daemon=True)
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def handle(self, path, request):
+        raise NotImplementedError
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class LLMStub(_StubServer):
+    """Answers every extraction prompt with `fields`; batched prompts get one object per certificate."""
+
+    def __init__(self, fields, latency_ms=50.0):
+        super().__init__(latency_ms)
+        self.fields = fields
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def handle(self, path, request):
+        if not path.endswith("/chat/completions"):
+            return 404, {"error": f"Unknown route {path}"}
+        prompt = request["messages"][-1]["content"]
+        count = len(re.findall(r'<certificate index="\d+">', prompt))
+        content = json.dumps([self.fields] * count if count else self.fields)
+        return 200, {
+            "id": f"stub-{uuid.uuid4().hex[:8]}",
+            "object": "chat.completion",
+            "model": request.get("model"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+        }
+
+
+class LedgerStub(_StubServer):
+    """In-memory certificate ledger behind JSON-RPC 2.0 (single and batch requests).
+
+    The `eth_*` methods are a dev-chain subset: every transaction is mined
+    at once with status 1, and `eth_call` returns `call_result` (ABI-encoded
+    hex) since the stub does not execute contract code.
+    """
+
+    CHAIN_ID = 1337
+    ACCOUNT = "0x" + "12" * 20
+
+    def __init__(self, latency_ms=20.0, call_result="0x" + "00" * 32):
+        super().__init__(latency_ms)
+        self.records = {}
+        self.call_result = call_result
+        self.transactions = {}
+        self.block_number = 1
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}/"
+
+    def _block(self, number):
+        return {"number": hex(number), "hash": "0x" + f"{number:064x}", "parentHash": "0x" + f"{number - 1:064x}",
+                "timestamp": hex(int(time.time())), "gasLimit": hex(30_000_000), "gasUsed": "0x0",
+                "baseFeePerGas": hex(1), "miner": self.ACCOUNT, "transactions": [], "uncles": []}
+
+    def _transaction(self, params):
+        # eth_sendTransaction carries a dict, eth_sendRawTransaction signed hex
+        to = params[0].get("to") if params and isinstance(params[0], dict) else None
+        with self._lock:
+            self.block_number += 1
+            tx_hash = "0x" + uuid.uuid4().hex * 2
+            self.transactions[tx_hash] = {
+                "transactionHash": tx_hash, "transactionIndex": "0x0", "status": "0x1",
+                "blockNumber": hex(self.block_number), "blockHash": "0x" + f"{self.block_number:064x}",
+                "from": self.ACCOUNT, "to": to,
+                "gasUsed": hex(100_000), "cumulativeGasUsed": hex(100_000), "effectiveGasPrice": hex(1),
+                "contractAddress": None, "logs": [], "logsBloom": "0x" + "00" * 256, "type": "0x2",
+            }
+        return tx_hash
+
+    def _eth(self, method, params):
+        answers = {
+            "eth_chainId": lambda: hex(self.CHAIN_ID),
+            "net_version": lambda: str(self.CHAIN_ID),
+            "web3_clientVersion": lambda: "authenex-ledger-stub",
+            "eth_accounts": lambda: [self.ACCOUNT],
+            "eth_blockNumber": lambda: hex(self.block_number),
+            "eth_getBlockByNumber": lambda: self._block(self.block_number),
+            "eth_gasPrice": lambda: hex(1_000_000_000),
+            "eth_maxPriorityFeePerGas": lambda: hex(1_000_000_000),
+            "eth_getTransactionCount": lambda: hex(len(self.transactions)),
+            "eth_estimateGas": lambda: hex(300_000),
+            "eth_getBalance": lambda: hex(10**21),
+            "eth_getCode": lambda: "0x6080604052",
+            "eth_call": lambda: self.call_result,
+            "eth_sendTransaction": lambda: self._transaction(params),
+            "eth_sendRawTransaction": lambda: self._transaction(params),
+            "eth_getTransactionReceipt": lambda: self.transactions.get(params[0]),
+        }
+        if method not in answers:
+            raise KeyError(method)
+        return answers[method]()
+
+    def _call(self, call):
+        method, params = call.get("method"), call.get("params") or []
+        if method == "ledger_getCertificate":
+            result = self.records.get(params[0])
+        elif method == "ledger_storeCertificate":
+            self.records[params[0]] = params[1]
+            result = {"transaction_hash": "0x" + uuid.uuid4().hex * 2}
+        elif method and method.startswith(("eth_", "net_", "web3_")):
+            try:
+                result = self._eth(method, params)
+            except KeyError:
+                return {"jsonrpc": "2.0", "id": call.get("id"),
+                        "error": {"code": -32601, "message": f"Method not found: {method}"}}
+        else:
+            return {"jsonrpc": "2.0", "id": call.get("id"),
+                    "error": {"code": -32601, "message": f"Method not found: {method}"}}
+        return {"jsonrpc": "2.0", "id": call.get("id"), "result": result}
+
+    def handle(self, path, request):
+        # One round trip (and one latency) per HTTP request, however many calls it carries
+        if isinstance(request, list):
+            return 200, [self._call(call) for call in request]
+        return 200, self._call(request)
+
+
+class LedgerClient:
+    """Minimal client for LedgerStub, shaped like the service's `blockchain` attribute."""
+
+    def __init__(self, url, timeout=10.0):
+        self._client = httpx.Client(base_url=url, timeout=timeout)
+        self._ids = iter(range(1, 1 << 62))
+
+    def _rpc(self, method, *params):
+        response = self._client.post("", json={"jsonrpc": "2.0", "id": next(self._ids),
+                                               "method": method, "params": list(params)})
+        response.raise_for_status()
+        body = response.json()
+        if "error" in body:
+            raise RuntimeError(body["error"]["message"])
+        return body["result"]
+
+    @staticmethod
+    def _info(certificate_hash, record):
+        if record is None:
+            return {"success": False, "exists": False, "certificate_hash": certificate_hash}
+        return {"success": True, "exists": True, "certificate_hash": certificate_hash, **record}
+
+    def get_certificate_info(self, certificate_hash):
+        return self._info(certificate_hash, self._rpc("ledger_getCertificate", certificate_hash))
+
+    def get_certificates_info(self, certificate_hashes):
+        """One JSON-RPC batch request for many hashes; results in order."""
+        calls = [{"jsonrpc": "2.0", "id": next(self._ids), "method": "ledger_getCertificate", "params": [h]}
+                 for h in certificate_hashes]
+        response = self._client.post("", json=calls)
+        response.raise_for_status()
+        # Batch responses may come back in any order
+        by_id = {reply.get("id"): reply for reply in response.json()}
+        results = []
+        for call, certificate_hash in zip(calls, certificate_hashes):
+            reply = by_id.get(call["id"]) or {"error": {"message": "missing from batch response"}}
+            if "error" in reply:
+                results.append({"error": reply["error"]["message"], "certificate_hash": certificate_hash})
+            else:
+                results.append(self._info(certificate_hash, reply["result"]))
+        return results
+
+    def store_certificate(self, certificate_hash, record):
+        return self._rpc("ledger_storeCertificate", certificate_hash, record)
+
+    def close(self):
+        self._client.close()
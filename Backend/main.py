@@ -1,29 +1,55 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
-from fastapi.responses import JSONResponse
+# First import: times every other import for the /health/startup diagnostic
+from src.startup_profile import get_startup_profile
+startup_profile = get_startup_profile()
+startup_profile.track_imports()
+
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, BackgroundTasks, Request
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer
 import re
-import mimetypes
 try:
-    from src.photo_verifier import verify_photos
-    from src.sign_verifier import SignatureVerifier
+    from src.photo_verifier import verify_photos, verify_photo_against_embedding
+    from src.sign_verifier import SignatureVerifier, verify_signature_files, verify_signature_against_embeddings
     from src.certificate_parser import CertificateParser
     from src.pixel_mismatch import analyze_for_edits
 except ImportError:
     from src.mock_services import mock_verify_photos as verify_photos
     from src.mock_services import MockSignatureVerifier as SignatureVerifier
     from src.mock_services import MockCertificateParser as CertificateParser
+    verify_signature_files = None
+    verify_signature_against_embeddings = None
     print("Using mock services - AI models not available")
 
 from src.certificate_verification_service import CertificateVerificationService
+from src.model_registry import get_registry
+from src.inference_executor import InferenceExecutor, LaneSaturated
+from src.result_cache import get_parse_cache
+from src.ledger_cache import get_ledger_cache
+from src.embedding_store import get_embedding_store, index_reference_embeddings
+from src.face_index import get_face_index, embed_face_bytes
+from src.template_extractor import get_template_extractor
+from src.perceptual_hash import get_near_duplicate_index, near_duplicate_distances, hash_image_bytes
+from src.upload_ingest import ingest_upload, UploadRejected, RequestSizeLimit, DOCUMENT_KINDS, IMAGE_KINDS, ARCHIVE_KINDS
+from src.batch_jobs import get_batch_job_manager
+from src.comprehensive_verifier import Stage, CriticalStageFailed, run_stages, overall_verdict
+from src.model_server import get_model_server_client, ModelServerError
+from src.onnx_backend import inference_backend, loaded_backends
+from src.metrics import (begin_request, lane_call_timer, render_latest, update_lane_gauges,
+                         REQUEST_SECONDS, REQUESTS_IN_FLIGHT)
 from pathlib import Path
 import tempfile
 import shutil
 import os
+import json
+import asyncio
+import threading
+import time
 from dotenv import load_dotenv
-from typing import Optional
+from typing import List, Optional
 
 load_dotenv()
+startup_profile.mark("imports")
 
 app = FastAPI(title="Certificate Verification API with Blockchain")
 
@@ -33,18 +59,49 @@ security = HTTPBearer()
 # File validation constants
 ALLOWED_FILE_TYPES = {'.pdf', '.jpg', '.jpeg', '.png'}
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+MAX_ARCHIVE_SIZE = int(os.getenv("BATCH_MAX_ARCHIVE_SIZE", str(500 * 1024 * 1024)))
+# Whole request bodies, enforced before form parsing; the largest endpoint takes five image parts
+MAX_REQUEST_SIZE = int(os.getenv("MAX_REQUEST_SIZE", str(5 * MAX_FILE_SIZE + 1024 * 1024)))
+MAX_BATCH_REQUEST_SIZE = int(os.getenv("BATCH_MAX_REQUEST_SIZE", str(MAX_ARCHIVE_SIZE + 16 * 1024 * 1024)))
+
+ALLOWED_ORIGINS = ["http://localhost:3000", "http://localhost:5173"]
+
+# Reject oversized bodies before Starlette spools them; added first so CORS headers still apply
+app.add_middleware(RequestSizeLimit, default_limit=MAX_REQUEST_SIZE,
+                   limits={"/certificates/batch": MAX_BATCH_REQUEST_SIZE})
 
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["http://localhost:3000", "http://localhost:5173"],
+    allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
     allow_methods=["GET", "POST"],  # Restrict to needed methods
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Request latency and in-flight metrics, plus a Server-Timing header with per-stage timings"""
+    timings = begin_request()
+    REQUESTS_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        REQUESTS_IN_FLIGHT.dec()
+        elapsed = time.perf_counter() - start
+        # Route templates, not raw paths, keep the label set bounded
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        REQUEST_SECONDS.labels(method=request.method, route=route, status=str(status)).observe(elapsed)
+    response.headers["Server-Timing"] = timings.server_timing(elapsed)
+    response.headers["Timing-Allow-Origin"] = ", ".join(ALLOWED_ORIGINS)
+    return response
+
+
 def validate_file(file: UploadFile) -> bool:
-    """Validate uploaded file type and size"""
+    """Validate the uploaded file name; the content type is sniffed by read_upload"""
     if not file.filename:
         return False
     
@@ -53,13 +110,16 @@ def validate_file(file: UploadFile) -> bool:
     if file_ext not in ALLOWED_FILE_TYPES:
         return False
     
-    # Check MIME type
-    mime_type, _ = mimetypes.guess_type(file.filename)
-    if mime_type and not mime_type.startswith(('image/', 'application/pdf')):
-        return False
-    
     return True
 
+
+async def read_upload(file: UploadFile, kinds=DOCUMENT_KINDS, max_size=MAX_FILE_SIZE):
+    """Stream an upload into a spooled buffer, enforcing the size limit and the sniffed format"""
+    try:
+        return await ingest_upload(file, max_size, kinds)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
 def sanitize_filename(filename: str) -> str:
     """Sanitize filename to prevent path traversal"""
     # Remove path separators and dangerous characters
@@ -70,14 +130,38 @@ def sanitize_filename(filename: str) -> str:
 # Initialize services
 cert_verification_service = CertificateVerificationService()
 
+# Parse results are cached by upload content (shared with the certificate parser)
+parse_cache = get_parse_cache()
+
+# Ledger reads go through a read-through cache that also coalesces concurrent lookups
+ledger_cache = get_ledger_cache(cert_verification_service.blockchain)
+
+MAX_LOOKUP_HASHES = int(os.getenv("LEDGER_LOOKUP_MAX_HASHES", "100"))
+
+# Blocking inference runs in bounded lanes so the event loop stays responsive
+inference_executor = InferenceExecutor.from_env()
+
+
+async def run_blocking(lane: str, fn, *args, **kwargs):
+    """Run blocking work in an inference lane, rejecting with Retry-After when the lane is full"""
+    try:
+        with lane_call_timer(lane, getattr(fn, "__name__", type(fn).__name__)):
+            return await inference_executor.run(lane, fn, *args, **kwargs)
+    except LaneSaturated as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail="Server busy, retry later",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
 # Legacy model initialization for backward compatibility
 BASE_DIR = Path(__file__).resolve().parents[1]
 SIGNATURE_OUTPUT_FOLDER = BASE_DIR / "cropped_signature"
 PHOTO_OUTPUT_FOLDER = BASE_DIR / "cropped_photo"
 
 SIGNATURE_OUTPUT_FOLDER = SIGNATURE_OUTPUT_FOLDER.as_posix()
-SIGN_PARSER_MODEL_PATH = BASE_DIR / "/Backend/models/sign_parser.pt"
-SIGN_VERIFIER_MODEL_PATH = BASE_DIR / "Backend/models/sign_verifier.keras"
+# Same resolved path the registry loads and warms up, so requests share that handle
+SIGN_VERIFIER_MODEL_PATH = get_registry().path("sign_verifier")
 
 
 
@@ -90,17 +174,136 @@ except Exception as e:
     parser = None
 
 
+@app.on_event("startup")
+async def warmup_models():
+    """Optionally load models and run a dummy inference in the background.
+
+    MODEL_WARMUP=all warms every registered model, or pass a comma-separated
+    list such as MODEL_WARMUP=sign_parser,face_detector. The server answers
+    /health/live right away; /health/ready turns 200 once warm-up finishes.
+    Without warm-up, models and their frameworks load on first use. Workers
+    backed by a model server (MODEL_SERVER_SOCKET) never load them locally.
+    """
+    startup_profile.mark("startup")
+    warmup = os.getenv("MODEL_WARMUP", "").strip()
+    if not warmup or warmup.lower() in ("0", "false", "no") or get_model_server_client() is not None:
+        startup_profile.set_warmup("skipped")
+        startup_profile.stop_tracking_imports()
+        return
+    names = None if warmup.lower() in ("1", "true", "yes", "all") else [n.strip() for n in warmup.split(",")]
+
+    def run_warmup():
+        with startup_profile.timed("warmup"):
+            results = get_registry().warmup(names)
+        print(f"Model warm-up: {results}")
+        startup_profile.set_warmup("done", results)
+        # Framework imports triggered by the model loaders are included in the profile
+        startup_profile.stop_tracking_imports()
+
+    startup_profile.set_warmup("running")
+    threading.Thread(target=run_warmup, name="model-warmup", daemon=True).start()
+
+
+def load_reference_embeddings(kind: str, certificate_hash: str):
+    """Fetch the stored reference embeddings for a certificate or raise an HTTP error"""
+    store = get_embedding_store()
+    if store is None:
+        raise HTTPException(status_code=503, detail="Embedding store not configured")
+    if not re.match(r'^[a-fA-F0-9]{64}$', certificate_hash):
+        raise HTTPException(status_code=400, detail="Invalid certificate hash format")
+    reference = store.get(kind, certificate_hash.lower())
+    if reference is None:
+        raise HTTPException(status_code=404, detail=f"No reference {kind} embedding for this certificate")
+    return reference
+
+
+def store_reference_embeddings(keys, parse_result):
+    """Background task: keep the certificate's face/signature embeddings for later checks"""
+    index_reference_embeddings(
+        get_embedding_store(),
+        [k.lower() for k in keys if isinstance(k, str)],
+        parse_result,
+        cert_verification_service.signature_verifier or verifier,
+        face_index=get_face_index()
+    )
+
+
+def reference_indexing_enabled() -> bool:
+    return get_embedding_store() is not None or get_face_index() is not None
+
+
+def index_stored_certificate(content_hash, file_path, result):
+    """Post-store indexing for batch items, matching /certificate/store-blockchain"""
+    if not isinstance(result, dict):
+        return
+    if isinstance(result.get("certificate_hash"), str):
+        ledger_cache.invalidate(result["certificate_hash"])
+    stored_index = get_near_duplicate_index("stored")
+    if stored_index is not None and not file_path.endswith(".pdf"):
+        try:
+            with open(file_path, "rb") as f:
+                stored_index.add(content_hash, hash_image_bytes(f.read()),
+                                 {"certificate_hash": result.get("certificate_hash")})
+        except ValueError:
+            pass
+    if reference_indexing_enabled():
+        store_reference_embeddings([content_hash, result.get("certificate_hash")], result)
+
+
+def parse_batch_item(file_path, content_hash):
+    """Batch parse stage; warms the parse cache the ledger stage reads from"""
+    if cert_verification_service.certificate_parser is None:
+        raise RuntimeError("Certificate parser not available")
+    cert_verification_service.certificate_parser.parse_certificate(file_path, content_hash=content_hash)
+
+
+def batch_job_manager():
+    return get_batch_job_manager(
+        parse_batch_item,
+        cert_verification_service.parse_and_store_certificate,
+        # Bulk ledger submission when the service supports it, else one write per certificate
+        store_batch_fn=getattr(cert_verification_service, "store_certificates_batch", None),
+        on_stored=index_stored_certificate
+    )
+
+
+@app.on_event("startup")
+async def start_batch_jobs():
+    """Start the batch workers and resume jobs interrupted by a restart"""
+    batch_job_manager().start()
+
+
+@app.on_event("shutdown")
+async def shutdown_executor():
+    batch_job_manager().shutdown()
+    inference_executor.shutdown()
+    face_index = get_face_index()
+    if face_index is not None:
+        face_index.save()
+
+
 @app.post("/verify-faces")
 async def verify_faces(
     file1_path: str,
-    file2_path: str,
+    file2_path: Optional[str] = None,
+    certificate_hash: Optional[str] = None,
     threshold: float = 0.9
 ):
+    """Compare two photos, or one photo with the reference stored for certificate_hash"""
     try:
-        result = verify_photos(file1_path, file2_path, threshold=threshold)
+        if certificate_hash:
+            reference = load_reference_embeddings("face", certificate_hash)
+            result = await run_blocking("cpu", verify_photo_against_embedding, file1_path, reference,
+                                        threshold=threshold)
+        elif file2_path:
+            result = await run_blocking("cpu", verify_photos, file1_path, file2_path, threshold=threshold)
+        else:
+            raise HTTPException(status_code=400, detail="Provide file2_path or certificate_hash")
         if result:
             return JSONResponse(content=result, status_code=200)
         return JSONResponse(content={"error": "Verification failed"}, status_code=400)
+    except HTTPException:
+        raise
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
@@ -108,20 +311,38 @@ async def verify_faces(
 @app.post("/verify-signatures")
 async def verify_signatures(
     file1_path: str,
-    file2_path: str,
+    file2_path: Optional[str] = None,
+    certificate_hash: Optional[str] = None,
     threshold: float = 0.5
 ):
+    """Compare two signatures, or one signature with the references stored for certificate_hash"""
     try:
-        result = verifier.verify_signatures(file1_path, file2_path, threshold=threshold)
+        if certificate_hash:
+            reference = load_reference_embeddings("signature", certificate_hash)
+            if verify_signature_against_embeddings is not None:
+                result = await run_blocking("cpu", verify_signature_against_embeddings, SIGN_VERIFIER_MODEL_PATH,
+                                            file1_path, reference, threshold=threshold)
+            else:
+                result = await run_blocking("io", verifier.verify_against_embeddings, file1_path, reference,
+                                            threshold=threshold)
+        elif not file2_path:
+            raise HTTPException(status_code=400, detail="Provide file2_path or certificate_hash")
+        elif verify_signature_files is not None:
+            result = await run_blocking("cpu", verify_signature_files, SIGN_VERIFIER_MODEL_PATH,
+                                        file1_path, file2_path, threshold=threshold)
+        else:
+            result = await run_blocking("io", verifier.verify_signatures, file1_path, file2_path, threshold=threshold)
         if result:
             return JSONResponse(content=result, status_code=200)
         return JSONResponse(content={"error": "Verification failed"}, status_code=400)
+    except HTTPException:
+        raise
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
     
 
 @app.post("/parse-certificate/")
-async def parse_certificate(file: UploadFile = File(...)):
+async def parse_certificate(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
     # Use the certificate parser from the service (includes mock fallback)
     if not cert_verification_service.certificate_parser:
         raise HTTPException(status_code=503, detail="Certificate parser not available")
@@ -131,36 +352,54 @@ async def parse_certificate(file: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail="Invalid file type or size")
     
     try:
-        tmp_dir = tempfile.mkdtemp()
-        safe_filename = sanitize_filename(file.filename)
-        file_path = os.path.join(tmp_dir, safe_filename)
-
-        # Check file size
-        file_content = await file.read()
-        if len(file_content) > MAX_FILE_SIZE:
-            raise HTTPException(status_code=413, detail="File too large")
-        
-        with open(file_path, "wb") as f:
-            f.write(file_content)
-
-        result = cert_verification_service.certificate_parser.parse_certificate(file_path)
+        with await read_upload(file) as upload:
+            file_content = upload.read()
+        content_hash = upload.sha256
+
+        # The parser decodes the bytes once in memory; no temp file round trip.
+        # OCR and the LLM call dominate parsing, so it runs in the I/O lane
+        result = await run_blocking(
+            "io", cert_verification_service.certificate_parser.parse_certificate,
+            file_content, content_hash=content_hash
+        )
+        if reference_indexing_enabled():
+            background_tasks.add_task(store_reference_embeddings, [content_hash], result)
         return JSONResponse(content=result, status_code=200)
 
     except HTTPException:
         raise
     except Exception as e:
         return JSONResponse(content={"error": "Processing failed"}, status_code=500)
-    finally:
-        # Cleanup
-        if 'tmp_dir' in locals():
-            shutil.rmtree(tmp_dir, ignore_errors=True)
 
 
 # Blockchain Certificate Endpoints
+async def confirmed_near_duplicate(candidates, file_path, content_hash):
+    """The first stored near-duplicate whose OCR text matches the upload, or None.
+
+    Same-template certificates of different students are only a few pHash
+    bits apart, so the upload is parsed (and cached for the store that
+    follows) and its text fingerprint compared with the stored parse.
+    """
+    parser = cert_verification_service.certificate_parser
+    parsed_index = get_near_duplicate_index("parsed")
+    if parser is None or parsed_index is None:
+        return None
+    result = await run_blocking("io", parser.parse_certificate, file_path, content_hash=content_hash)
+    fingerprint = result.get("text_fingerprint") if isinstance(result, dict) else None
+    if fingerprint is None:
+        return None
+    for match in candidates:
+        if parsed_index.metadata(match["key"]).get("text_fingerprint") == fingerprint:
+            return match
+    return None
+
+
 @app.post("/certificate/store-blockchain")
 async def store_certificate_blockchain(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    account_address: str = Form(...)
+    account_address: str = Form(...),
+    allow_near_duplicate: bool = Form(False)
 ):
     """Parse certificate and store on blockchain"""
     # Validate file
@@ -177,17 +416,46 @@ async def store_certificate_blockchain(
         safe_filename = sanitize_filename(file.filename)
         file_path = os.path.join(tmp_dir, safe_filename)
 
-        # Check file size
-        file_content = await file.read()
-        if len(file_content) > MAX_FILE_SIZE:
-            raise HTTPException(status_code=413, detail="File too large")
-        
-        with open(file_path, "wb") as f:
-            f.write(file_content)
-
-        result = cert_verification_service.parse_and_store_certificate(
+        upload = await read_upload(file)
+        content_hash = upload.sha256
+
+        upload.save(file_path)
+
+        # Flag re-scans / re-compressions of stored certificates; only a matching text refuses the store
+        stored_index = get_near_duplicate_index("stored")
+        upload_phash, near_duplicates = None, []
+        if stored_index is not None and upload.kind in IMAGE_KINDS:
+            try:
+                upload_phash = await run_blocking("cpu", hash_image_bytes, upload.read())
+            except ValueError:
+                upload_phash = None  # undecodable image
+        if upload_phash is not None:
+            flag_distance, skip_distance = near_duplicate_distances()
+            near_duplicates = stored_index.find(upload_phash, flag_distance, exclude=content_hash)
+            candidates = [m for m in near_duplicates if m["distance"] <= skip_distance]
+            duplicate = None
+            if candidates and not allow_near_duplicate:
+                duplicate = await confirmed_near_duplicate(candidates, file_path, content_hash)
+            if duplicate is not None:
+                return JSONResponse(content={
+                    "error": "Near-duplicate of an already stored certificate",
+                    "near_duplicate_of": duplicate,
+                    "near_duplicates": near_duplicates
+                }, status_code=409)
+
+        result = await run_blocking(
+            "io", cert_verification_service.parse_and_store_certificate,
             file_path, account_address
         )
+        if isinstance(result, dict) and isinstance(result.get("certificate_hash"), str):
+            # Drop a cached "not found" for the certificate just stored
+            ledger_cache.invalidate(result["certificate_hash"])
+        if upload_phash is not None and isinstance(result, dict):
+            stored_index.add(content_hash, upload_phash, {"certificate_hash": result.get("certificate_hash")})
+            result["near_duplicates"] = near_duplicates
+        if reference_indexing_enabled() and isinstance(result, dict):
+            keys = [content_hash, result.get("certificate_hash")]
+            background_tasks.add_task(store_reference_embeddings, keys, result)
         
         return JSONResponse(content=result, status_code=200)
 
@@ -196,6 +464,8 @@ async def store_certificate_blockchain(
     except Exception as e:
         return JSONResponse(content={"error": "Processing failed"}, status_code=500)
     finally:
+        if 'upload' in locals():
+            upload.close()
         if 'tmp_dir' in locals():
             shutil.rmtree(tmp_dir, ignore_errors=True)
 
@@ -208,15 +478,45 @@ async def get_certificate_blockchain(certificate_hash: str):
         raise HTTPException(status_code=400, detail="Invalid certificate hash format")
     
     try:
-        result = cert_verification_service.blockchain.get_certificate_info(certificate_hash)
+        result = await run_blocking("io", ledger_cache.get_certificate_info, certificate_hash)
         return JSONResponse(content=result, status_code=200)
+    except HTTPException:
+        raise
     except Exception as e:
         return JSONResponse(content={"error": "Certificate not found"}, status_code=404)
-    
+
+
+@app.post("/certificates/lookup")
+async def lookup_certificates_blockchain(request: Request):
+    """Look up many certificate hashes at once: {"certificate_hashes": [...]}
+
+    Cached and in-flight hashes are answered locally; the rest go to the
+    ledger in one batch call when the ledger client supports it.
+    """
+    try:
+        body = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    hashes = body.get("certificate_hashes") if isinstance(body, dict) else None
+    if not isinstance(hashes, list) or not hashes:
+        raise HTTPException(status_code=400, detail="certificate_hashes must be a non-empty list")
+    if len(hashes) > MAX_LOOKUP_HASHES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_LOOKUP_HASHES} hashes per lookup")
+    if not all(isinstance(h, str) and re.match(r'^[a-fA-F0-9]{64}$', h) for h in hashes):
+        raise HTTPException(status_code=400, detail="Invalid certificate hash format")
+
+    results = await run_blocking("io", ledger_cache.get_certificates_info, hashes)
+    return {"results": dict(zip(hashes, results))}
+
 
 @app.post("/certificate/analyze-edits")
-async def analyze_certificate_edits(file: UploadFile = File(...)):
-    """Analyze a certificate image for digital edits using Error Level Analysis (ELA)."""
+async def analyze_certificate_edits(file: UploadFile = File(...), preview: bool = Form(False)):
+    """Analyze a certificate image for digital edits using Error Level Analysis (ELA).
+
+    preview=true analyzes a downscaled copy for a quick heatmap; suspicious
+    regions are only reported for full-resolution analysis. The verdict
+    comes from the global error level; regions are for a reviewer to check.
+    """
     if not validate_file(file):
         raise HTTPException(status_code=400, detail="Invalid file type or size")
 
@@ -225,14 +525,11 @@ async def analyze_certificate_edits(file: UploadFile = File(...)):
         safe_filename = sanitize_filename(file.filename)
         file_path = os.path.join(tmp_dir, safe_filename)
 
-        file_content = await file.read()
-        if len(file_content) > MAX_FILE_SIZE:
-            raise HTTPException(status_code=413, detail="File too large")
-
-        with open(file_path, "wb") as f:
-            f.write(file_content)
+        with await read_upload(file, IMAGE_KINDS) as upload:
+            upload.save(file_path)
 
-        result = analyze_for_edits(file_path)
+        preview_side = int(os.getenv("EDIT_PREVIEW_MAX_SIDE", "1600")) if preview else None
+        result = await run_blocking("cpu", analyze_for_edits, file_path, preview_max_side=preview_side)
         if "error" in result:
             raise HTTPException(status_code=500, detail=result["error"])
 
@@ -251,53 +548,79 @@ async def verify_certificate_comprehensive(
     photo1: Optional[UploadFile] = File(None),
     photo2: Optional[UploadFile] = File(None),
     signature1: Optional[UploadFile] = File(None),
-    signature2: Optional[UploadFile] = File(None)
+    signature2: Optional[UploadFile] = File(None),
+    certificate_file: Optional[UploadFile] = File(None)
 ):
-    """Comprehensive certificate verification using blockchain + AI"""
-    tmp_files = []
-    
+    """Comprehensive certificate verification using blockchain + AI
+
+    The ledger lookup and the photo, signature and (with certificate_file)
+    edit-analysis stages run concurrently, each with its own timeout. Only
+    the ledger lookup is critical; a slow or failing AI stage is reported
+    under stage_errors and the rest of the result is still returned.
+    """
+    if not re.match(r'^[a-fA-F0-9]{64}$', certificate_hash):
+        raise HTTPException(status_code=400, detail="Invalid certificate hash format")
+
     try:
         tmp_dir = tempfile.mkdtemp()
-        
+
+        async def save_upload(upload_file, prefix):
+            # Size and format are checked while streaming, before anything reaches disk
+            if not upload_file:
+                return None
+            with await read_upload(upload_file, IMAGE_KINDS) as upload:
+                # Name by content hash; the client filename never touches the path
+                return upload.save(os.path.join(tmp_dir, f"{prefix}_{upload.sha256[:16]}.{upload.kind}"))
+
         # Save uploaded files
-        photo1_path = photo2_path = signature1_path = signature2_path = None
-        
-        if photo1:
-            photo1_path = os.path.join(tmp_dir, f"photo1_{photo1.filename}")
-            with open(photo1_path, "wb") as f:
-                shutil.copyfileobj(photo1.file, f)
-            tmp_files.append(photo1_path)
-        
-        if photo2:
-            photo2_path = os.path.join(tmp_dir, f"photo2_{photo2.filename}")
-            with open(photo2_path, "wb") as f:
-                shutil.copyfileobj(photo2.file, f)
-            tmp_files.append(photo2_path)
-        
-        if signature1:
-            signature1_path = os.path.join(tmp_dir, f"sig1_{signature1.filename}")
-            with open(signature1_path, "wb") as f:
-                shutil.copyfileobj(signature1.file, f)
-            tmp_files.append(signature1_path)
-        
-        if signature2:
-            signature2_path = os.path.join(tmp_dir, f"sig2_{signature2.filename}")
-            with open(signature2_path, "wb") as f:
-                shutil.copyfileobj(signature2.file, f)
-            tmp_files.append(signature2_path)
-        
-        # Perform comprehensive verification
-        result = cert_verification_service.verify_certificate_comprehensive(
-            certificate_hash=certificate_hash,
-            photo1_path=photo1_path,
-            photo2_path=photo2_path,
-            signature1_path=signature1_path,
-            signature2_path=signature2_path,
-            account_address=account_address
-        )
-        
+        photo1_path = await save_upload(photo1, "photo1")
+        photo2_path = await save_upload(photo2, "photo2")
+        signature1_path = await save_upload(signature1, "sig1")
+        signature2_path = await save_upload(signature2, "sig2")
+        certificate_path = await save_upload(certificate_file, "certificate")
+
+        stages = [Stage("ledger", "io", ledger_cache.get_certificate_info,
+                        certificate_hash, critical=True)]
+        if photo1_path and photo2_path:
+            stages.append(Stage("photo", "cpu", verify_photos, photo1_path, photo2_path, deadline_arg="deadline"))
+        if signature1_path and signature2_path:
+            if verify_signature_files is not None:
+                stages.append(Stage("signature", "cpu", verify_signature_files, SIGN_VERIFIER_MODEL_PATH,
+                                    signature1_path, signature2_path, deadline_arg="deadline"))
+            else:
+                sign_verifier = cert_verification_service.signature_verifier or verifier
+                stages.append(Stage("signature", "io", sign_verifier.verify_signatures,
+                                    signature1_path, signature2_path))
+        if certificate_path:
+            stages.append(Stage("edits", "cpu", analyze_for_edits, certificate_path, deadline_arg="deadline"))
+
+        try:
+            report = await run_stages(stages, run_blocking)
+        except CriticalStageFailed as e:
+            return JSONResponse(content={
+                "error": f"Ledger lookup failed: {e.reason}",
+                "certificate_hash": certificate_hash,
+                "stage_timings_ms": e.report["stage_timings_ms"],
+                "stage_errors": e.report["errors"]
+            }, status_code=504 if "timed out" in e.reason else 502)
+
+        results = report["results"]
+        result = {
+            "certificate_hash": certificate_hash,
+            "account_address": account_address,
+            "blockchain_verification": results["ledger"],
+            "photo_verification": results.get("photo"),
+            "signature_verification": results.get("signature"),
+            "edit_analysis": results.get("edits"),
+            "overall": overall_verdict(report),
+            "partial": report["partial"],
+            "stage_errors": report["errors"],
+            "stage_timings_ms": report["stage_timings_ms"]
+        }
         return JSONResponse(content=result, status_code=200)
         
+    except HTTPException:
+        raise
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
     finally:
@@ -306,6 +629,167 @@ async def verify_certificate_comprehensive(
             shutil.rmtree(tmp_dir, ignore_errors=True)
 
 
+@app.post("/certificates/batch", status_code=202)
+async def create_certificate_batch(
+    files: List[UploadFile] = File(...),
+    account_address: str = Form(...)
+):
+    """Queue many certificates (files and/or zip archives) for parsing and storage"""
+    if account_address and not re.match(r'^0x[a-fA-F0-9]{40}$', account_address):
+        # For mock mode, use a default address if invalid
+        account_address = '0x1234567890123456789012345678901234567890'
+
+    manager = batch_job_manager()
+    job_id = manager.create_job(account_address)
+    try:
+        items = 0
+        for file in files:
+            if (file.filename or "").lower().endswith(".zip"):
+                with await read_upload(file, ARCHIVE_KINDS, MAX_ARCHIVE_SIZE) as upload:
+                    try:
+                        items += await run_blocking("io", manager.add_archive, job_id, upload.open(), MAX_FILE_SIZE)
+                    except UploadRejected as e:
+                        raise HTTPException(status_code=e.status_code, detail=e.detail)
+            else:
+                with await read_upload(file) as upload:
+                    await run_blocking("io", manager.add_upload, job_id, upload)
+                    items += 1
+        if not items:
+            raise HTTPException(status_code=400, detail="No certificates in upload")
+    except Exception as e:
+        manager.discard(job_id)
+        if isinstance(e, HTTPException):
+            raise
+        return JSONResponse(content={"error": "Invalid batch upload"}, status_code=400)
+
+    manager.submit(job_id)
+    return {
+        "job_id": job_id,
+        "items": items,
+        "progress_url": f"/certificates/batch/{job_id}",
+        "results_url": f"/certificates/batch/{job_id}/results"
+    }
+
+
+def batch_progress_or_404(job_id: str):
+    progress = batch_job_manager().progress(job_id) if re.match(r'^[a-f0-9]{32}$', job_id) else None
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    return progress
+
+
+@app.get("/certificates/batch/{job_id}")
+async def get_certificate_batch(job_id: str):
+    """Progress of a batch job"""
+    return batch_progress_or_404(job_id)
+
+
+@app.get("/certificates/batch/{job_id}/results")
+async def stream_certificate_batch_results(job_id: str, after: int = 0, follow: bool = False):
+    """Finished items as NDJSON; with follow=true the stream stays open until the job completes"""
+    batch_progress_or_404(job_id)
+    manager = batch_job_manager()
+
+    async def lines():
+        last = after
+        while True:
+            rows = manager.results(job_id, after=last)
+            for row in rows:
+                last = row["seq"]
+                yield json.dumps(row) + "\n"
+            if rows:
+                continue
+            if not follow or manager.progress(job_id)["status"] != "running":
+                return
+            await asyncio.sleep(1.0)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.post("/faces/search")
+async def search_faces(
+    file: UploadFile = File(...),
+    k: int = Form(10),
+    max_distance: Optional[float] = Form(None)
+):
+    """Find certificates whose photo matches the uploaded face (1:N search)"""
+    face_index = get_face_index()
+    if face_index is None:
+        raise HTTPException(status_code=503, detail="Face index not configured")
+    if not validate_file(file):
+        raise HTTPException(status_code=400, detail="Invalid file type or size")
+
+    with await read_upload(file, IMAGE_KINDS) as upload:
+        file_content = upload.read()
+
+    try:
+        embedding = await run_blocking("cpu", embed_face_bytes, file_content)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    matches = face_index.search(embedding, k=max(1, min(k, 100)))
+    if max_distance is not None:
+        matches = [m for m in matches if m["distance"] <= max_distance]
+
+    # The same face under several names is the photo-reuse forgery pattern
+    names = {m.get("student_name") for m in matches if m.get("student_name")}
+    return {
+        "matches": matches,
+        "distinct_names": len(names),
+        "indexed_faces": len(face_index)
+    }
+
+
+def llm_client_stats():
+    llm_client = getattr(cert_verification_service.certificate_parser, "llm_client", None)
+    return llm_client.stats() if llm_client is not None else None
+
+
+def model_server_stats():
+    model_server = get_model_server_client()
+    if model_server is None:
+        return None
+    try:
+        return model_server.stats()
+    except ModelServerError as e:
+        return {"error": str(e)}
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics of this worker process"""
+    update_lane_gauges(inference_executor.stats())
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
+
+
+@app.get("/health/live")
+async def liveness():
+    """Liveness probe: the process is up and the event loop is responsive"""
+    return {"status": "alive", "uptime_seconds": round(startup_profile.elapsed(), 1)}
+
+
+@app.get("/health/ready")
+async def readiness():
+    """Readiness probe: model warm-up (if configured) has finished"""
+    body = {
+        "ready": startup_profile.warmed_up,
+        "warmup": startup_profile.warmup_status,
+        "models_loaded": sorted(get_registry().status()["loaded"])
+    }
+    return JSONResponse(content=body, status_code=200 if body["ready"] else 503)
+
+
+@app.get("/health/startup")
+async def startup_diagnostics():
+    """Start-up profile: slowest imports, start-up milestones and per-model load times"""
+    report = startup_profile.report()
+    report["models"] = get_registry().status()["loaded"]
+    return report
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -315,11 +799,20 @@ async def health_check():
     
     return {
         "status": "healthy",
+        "ready": startup_profile.warmed_up,
         "blockchain_connected": blockchain_status,
         "ai_models_loaded": {
             "certificate_parser": cert_verification_service.certificate_parser is not None,
             "signature_verifier": cert_verification_service.signature_verifier is not None
-        }
+        },
+        "models": get_registry().status(),
+        "inference_backend": {"configured": inference_backend(), "loaded": loaded_backends()},
+        "executor": inference_executor.stats(),
+        "parse_cache": parse_cache.stats() if parse_cache else None,
+        "ledger_cache": ledger_cache.stats(),
+        "template_extraction": get_template_extractor().stats() if get_template_extractor() else None,
+        "llm_client": llm_client_stats(),
+        "model_server": model_server_stats()
     }
 
 
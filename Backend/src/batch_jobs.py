@@ -0,0 +1,498 @@
+import hashlib
+import json
+import os
+import queue
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from src.upload_ingest import DOCUMENT_KINDS, UploadRejected, sniff_kind
+
+TERMINAL_STATUSES = ("done", "failed", "skipped")
+
+
+class BatchJobManager:
+    """Checkpointed background processing for bulk certificate ingestion.
+
+    Every job and item lives in a SQLite table, and uploaded files are kept
+    under `root/<job_id>/` until the job finishes, so a restart resumes from
+    the last completed stage. Items move through two stages with their own
+    concurrency: parsing runs on a pool of `parse_workers` threads, and
+    ledger writes run on a single thread that groups up to
+    `ledger_batch_size` parsed items (or whatever arrived within
+    `ledger_wait` seconds) into one bulk submission.
+
+    `parse_fn(path, content_hash)` parses one file. `store_batch_fn(paths,
+    account_address)` writes a group to the ledger and returns one result per
+    path; without it, `store_fn(path, account_address)` is called per item.
+    `on_stored(content_hash, path, result)` runs after a successful write.
+
+    A zip may hold at most `max_archive_members` files and
+    `max_archive_bytes` of uncompressed data; larger archives are rejected
+    with 413 before or while they are unpacked.
+
+    Several processes (uvicorn workers) may share one `db_path` and `root`.
+    Each job is owned by the process that created or claimed it, which renews
+    `lease_until` every `lease_seconds / 3`. Only jobs whose lease has expired
+    are resumed (running) or failed (receiving), and only by the process whose
+    conditional claim succeeds, so live uploads are left alone and no item is
+    processed twice.
+    """
+
+    def __init__(self, db_path, root, parse_fn, store_fn, store_batch_fn=None, on_stored=None,
+                 parse_workers=2, ledger_batch_size=25, ledger_wait=2.0, max_archive_members=1000,
+                 max_archive_bytes=2 * 1024 ** 3, lease_seconds=60.0):
+        self.root = root
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.max_archive_members = max_archive_members
+        self.max_archive_bytes = max_archive_bytes
+        self.parse_fn = parse_fn
+        self.store_fn = store_fn
+        self.store_batch_fn = store_batch_fn
+        self.on_stored = on_stored
+        self.parse_workers = parse_workers
+        self.ledger_batch_size = ledger_batch_size
+        self.ledger_wait = ledger_wait
+
+        os.makedirs(root, exist_ok=True)
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        # Other workers may hold the write lock briefly
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS batch_jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, account_address TEXT, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS batch_items ("
+            "job_id TEXT NOT NULL, idx INTEGER NOT NULL, filename TEXT, path TEXT, "
+            "content_hash TEXT, status TEXT NOT NULL, result TEXT, error TEXT, "
+            "done_seq INTEGER, updated_at REAL NOT NULL, PRIMARY KEY (job_id, idx))"
+        )
+        columns = {r[1] for r in self._db.execute("PRAGMA table_info(batch_jobs)")}
+        if "owner" not in columns:
+            self._db.execute("ALTER TABLE batch_jobs ADD COLUMN owner TEXT")
+        if "lease_until" not in columns:
+            self._db.execute("ALTER TABLE batch_jobs ADD COLUMN lease_until REAL")
+        self._db.commit()
+
+        self._parse_pool = None
+        self._ledger_queue = queue.Queue()
+        self._ledger_thread = None
+        self._lease_thread = None
+        self._owned = set()
+        self._stopping = threading.Event()
+
+    # ---------------- Lifecycle ---------------- #
+    def start(self):
+        """Start the workers and resume jobs whose owner has stopped renewing its lease."""
+        if self._ledger_thread is not None:
+            return
+        self._parse_pool = ThreadPoolExecutor(max_workers=self.parse_workers, thread_name_prefix="batch-parse")
+        self._ledger_thread = threading.Thread(target=self._ledger_loop, name="batch-ledger", daemon=True)
+        self._ledger_thread.start()
+        self._claim_expired()
+        self._lease_thread = threading.Thread(target=self._lease_loop, name="batch-lease", daemon=True)
+        self._lease_thread.start()
+
+    def shutdown(self):
+        self._stopping.set()
+        if self._parse_pool is not None:
+            self._parse_pool.shutdown(wait=False, cancel_futures=True)
+        if self._ledger_thread is not None:
+            self._ledger_queue.put(None)
+            self._ledger_thread.join(timeout=self.ledger_wait + 5)
+            if self._ledger_thread.is_alive():
+                # A ledger write may still be in flight; let the lease run out instead
+                return
+        # Hand unfinished jobs to the other workers straight away
+        with self._lock:
+            self._db.execute(
+                "UPDATE batch_jobs SET owner = NULL, lease_until = NULL WHERE owner = ? AND status = 'running'",
+                (self.worker_id,)
+            )
+            self._db.commit()
+            self._owned.clear()
+
+    # ---------------- Leases ---------------- #
+    def _lease_loop(self):
+        while not self._stopping.wait(self.lease_seconds / 3):
+            try:
+                self._renew_leases()
+                self._claim_expired()
+            except sqlite3.Error as e:
+                print(f"Batch job lease renewal failed: {e}")
+
+    def _renew_leases(self):
+        with self._lock:
+            self._db.execute(
+                "UPDATE batch_jobs SET lease_until = ? WHERE owner = ? AND status IN ('receiving', 'running')",
+                (time.time() + self.lease_seconds, self.worker_id)
+            )
+            self._db.commit()
+            # A job claimed by another worker after our lease lapsed is no longer ours to process
+            self._owned = {r[0] for r in self._db.execute(
+                "SELECT id FROM batch_jobs WHERE owner = ? AND status IN ('receiving', 'running')",
+                (self.worker_id,)
+            )}
+
+    def _claim_expired(self):
+        """Take over jobs whose owner is gone; each job is claimed by exactly one worker."""
+        now = time.time()
+        claimed = []
+        with self._lock:
+            candidates = self._db.execute(
+                "SELECT id, status FROM batch_jobs WHERE status IN ('receiving', 'running') "
+                "AND (owner IS NULL OR lease_until IS NULL OR lease_until < ?)", (now,)
+            ).fetchall()
+            for job_id, status in candidates:
+                cursor = self._db.execute(
+                    "UPDATE batch_jobs SET owner = ?, lease_until = ? WHERE id = ? AND status = ? "
+                    "AND (owner IS NULL OR lease_until IS NULL OR lease_until < ?)",
+                    (self.worker_id, now + self.lease_seconds, job_id, status, now)
+                )
+                if cursor.rowcount == 1:
+                    claimed.append((job_id, status))
+                    self._owned.add(job_id)
+            self._db.commit()
+
+        resumed = 0
+        for job_id, status in claimed:
+            if status == "receiving":
+                # The upload died with its worker and cannot be completed
+                self._set_job_status(job_id, "failed")
+                shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+            else:
+                self._dispatch(job_id)
+                resumed += 1
+        if resumed:
+            print(f"Resumed {resumed} batch job(s)")
+
+    # ---------------- Job creation ---------------- #
+    def _job_dir(self, job_id):
+        return os.path.join(self.root, job_id)
+
+    def create_job(self, account_address=None):
+        job_id = uuid.uuid4().hex
+        os.makedirs(self._job_dir(job_id), exist_ok=True)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO batch_jobs (id, status, account_address, created_at, updated_at, owner, lease_until) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, "receiving", account_address, now, now, self.worker_id, now + self.lease_seconds)
+            )
+            self._db.commit()
+            self._owned.add(job_id)
+        return job_id
+
+    def _add_item(self, job_id, filename, path, content_hash, status="pending", error=None):
+        with self._lock:
+            idx = self._db.execute(
+                "SELECT COALESCE(MAX(idx), -1) + 1 FROM batch_items WHERE job_id = ?", (job_id,)
+            ).fetchone()[0]
+            if status == "pending":
+                # The same file twice in one batch is only processed once
+                first = self._db.execute(
+                    "SELECT idx FROM batch_items WHERE job_id = ? AND content_hash = ? LIMIT 1",
+                    (job_id, content_hash)
+                ).fetchone()
+                if first is not None:
+                    status, error, path = "skipped", f"Duplicate of item {first[0]}", None
+            done_seq = None
+            if status in TERMINAL_STATUSES:
+                done_seq = self._db.execute(
+                    "SELECT COALESCE(MAX(done_seq), 0) + 1 FROM batch_items WHERE job_id = ?", (job_id,)
+                ).fetchone()[0]
+            self._db.execute(
+                "INSERT INTO batch_items (job_id, idx, filename, path, content_hash, status, error, done_seq, "
+                "updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, idx, filename, path, content_hash, status, error, done_seq, time.time())
+            )
+            self._db.commit()
+        return idx
+
+    def add_upload(self, job_id, upload):
+        """Add an `IngestedUpload` to a job; the file is copied into the job directory."""
+        path = os.path.join(self._job_dir(job_id), f"{upload.sha256}.{upload.kind}")
+        if not os.path.exists(path):
+            upload.save(path)
+        return self._add_item(job_id, upload.filename, path, upload.sha256)
+
+    def add_archive(self, job_id, fileobj, max_member_size, kinds=DOCUMENT_KINDS, chunk_size=64 * 1024):
+        """Unpack a zip into a job, streaming and hashing each member.
+
+        Members that are too large or not an accepted format become `skipped`
+        items so the client sees them in the results. Raises `UploadRejected`
+        (413) when the archive has too many members or unpacks to more than
+        `max_archive_bytes`; sizes are counted from the decompressed stream,
+        not the headers, which a zip bomb can fake. Returns the item count.
+        """
+        count = 0
+        total = 0
+        with zipfile.ZipFile(fileobj) as archive:
+            members = [info for info in archive.infolist()
+                       if not (info.is_dir() or info.filename.startswith("__MACOSX/")
+                               or os.path.basename(info.filename).startswith("."))]
+            # The central directory is already read; refuse obviously oversized archives up front
+            if len(members) > self.max_archive_members:
+                raise UploadRejected(413, f"Archive has more than {self.max_archive_members} files")
+            if sum(info.file_size for info in members) > self.max_archive_bytes:
+                raise UploadRejected(413, "Archive too large when unpacked")
+            for info in members:
+                name = info.filename
+                count += 1
+                if info.file_size > max_member_size:
+                    self._add_item(job_id, name, None, None, "skipped", "File too large")
+                    continue
+                tmp_path = os.path.join(self._job_dir(job_id), f".member-{count}")
+                digest = hashlib.sha256()
+                size = 0
+                with archive.open(info) as src:
+                    chunk = src.read(chunk_size)
+                    kind = sniff_kind(chunk[:16])
+                    if kind not in kinds:
+                        self._add_item(job_id, name, None, None, "skipped", "Unsupported file content")
+                        continue
+                    with open(tmp_path, "wb") as dst:
+                        while chunk:
+                            size += len(chunk)
+                            total += len(chunk)
+                            if total > self.max_archive_bytes:
+                                dst.close()
+                                os.remove(tmp_path)
+                                raise UploadRejected(413, "Archive too large when unpacked")
+                            if size > max_member_size:
+                                break
+                            digest.update(chunk)
+                            dst.write(chunk)
+                            chunk = src.read(chunk_size)
+                if size > max_member_size:
+                    os.remove(tmp_path)
+                    self._add_item(job_id, name, None, None, "skipped", "File too large")
+                    continue
+                content_hash = digest.hexdigest()
+                path = os.path.join(self._job_dir(job_id), f"{content_hash}.{kind}")
+                os.replace(tmp_path, path)
+                self._add_item(job_id, name, path, content_hash)
+        return count
+
+    def submit(self, job_id):
+        """Close a job for new files and queue its items."""
+        self._set_job_status(job_id, "running")
+        self._dispatch(job_id)
+
+    def discard(self, job_id):
+        """Drop a job whose upload failed before it was submitted."""
+        with self._lock:
+            self._db.execute("DELETE FROM batch_items WHERE job_id = ?", (job_id,))
+            self._db.execute("DELETE FROM batch_jobs WHERE id = ?", (job_id,))
+            self._db.commit()
+            self._owned.discard(job_id)
+        shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+
+    # ---------------- Processing ---------------- #
+    def _dispatch(self, job_id):
+        with self._lock:
+            account_address = self._db.execute(
+                "SELECT account_address FROM batch_jobs WHERE id = ?", (job_id,)
+            ).fetchone()[0]
+            items = self._db.execute(
+                "SELECT idx, path, content_hash, status FROM batch_items "
+                "WHERE job_id = ? AND status IN ('pending', 'parsed') ORDER BY idx", (job_id,)
+            ).fetchall()
+        for idx, path, content_hash, status in items:
+            item = (job_id, idx, path, content_hash, account_address)
+            if status == "parsed":
+                self._ledger_queue.put(item)
+            else:
+                self._parse_pool.submit(self._parse_item, item)
+        self._maybe_finish(job_id)
+
+    def _parse_item(self, item):
+        job_id, idx, path, content_hash, _ = item
+        if self._stopping.is_set() or job_id not in self._owned:
+            return
+        try:
+            self.parse_fn(path, content_hash)
+        except Exception as e:
+            self._finish_item(job_id, idx, "failed", error=f"Parsing failed: {e}")
+            return
+        self._update_item(job_id, idx, "parsed")
+        self._ledger_queue.put(item)
+
+    def _ledger_loop(self):
+        while True:
+            item = self._ledger_queue.get()
+            if item is None:
+                return
+            group = [item]
+            deadline = time.monotonic() + self.ledger_wait
+            while len(group) < self.ledger_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._ledger_queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._ledger_queue.put(None)
+                    break
+                group.append(item)
+
+            by_account = {}
+            for item in group:
+                if item[0] not in self._owned:
+                    continue
+                by_account.setdefault(item[4], []).append(item)
+            for account_address, items in by_account.items():
+                self._store_group(account_address, items)
+
+    def _store_group(self, account_address, items):
+        results = None
+        if self.store_batch_fn is not None and len(items) > 1:
+            try:
+                results = self.store_batch_fn([item[2] for item in items], account_address)
+                if len(results) != len(items):
+                    results = None
+            except Exception as e:
+                print(f"Bulk ledger submission failed, storing individually: {e}")
+                results = None
+        if results is None:
+            results = []
+            for item in items:
+                try:
+                    results.append(self.store_fn(item[2], account_address))
+                except Exception as e:
+                    results.append(e)
+
+        for (job_id, idx, path, content_hash, _), result in zip(items, results):
+            if isinstance(result, Exception):
+                self._finish_item(job_id, idx, "failed", error=f"Ledger write failed: {result}")
+            elif isinstance(result, dict) and result.get("error"):
+                self._finish_item(job_id, idx, "failed", error=str(result["error"]))
+            else:
+                if self.on_stored is not None:
+                    try:
+                        self.on_stored(content_hash, path, result)
+                    except Exception as e:
+                        print(f"Post-store hook failed for {content_hash}: {e}")
+                self._finish_item(job_id, idx, "done", result=result)
+
+    # ---------------- State ---------------- #
+    def _set_job_status(self, job_id, status):
+        with self._lock:
+            self._db.execute("UPDATE batch_jobs SET status = ?, updated_at = ? WHERE id = ?",
+                             (status, time.time(), job_id))
+            self._db.commit()
+
+    def _update_item(self, job_id, idx, status):
+        with self._lock:
+            self._db.execute("UPDATE batch_items SET status = ?, updated_at = ? WHERE job_id = ? AND idx = ?",
+                             (status, time.time(), job_id, idx))
+            self._db.commit()
+
+    def _finish_item(self, job_id, idx, status, result=None, error=None):
+        with self._lock:
+            self._db.execute(
+                "UPDATE batch_items SET status = ?, result = ?, error = ?, updated_at = ?, "
+                "done_seq = (SELECT COALESCE(MAX(done_seq), 0) + 1 FROM batch_items WHERE job_id = ?) "
+                "WHERE job_id = ? AND idx = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(),
+                 job_id, job_id, idx)
+            )
+            self._db.commit()
+        self._maybe_finish(job_id)
+
+    def _maybe_finish(self, job_id):
+        with self._lock:
+            open_items = self._db.execute(
+                "SELECT COUNT(*) FROM batch_items WHERE job_id = ? AND status IN ('pending', 'parsed')",
+                (job_id,)
+            ).fetchone()[0]
+            status = self._db.execute("SELECT status FROM batch_jobs WHERE id = ?", (job_id,)).fetchone()
+        if open_items == 0 and status is not None and status[0] == "running":
+            self._set_job_status(job_id, "completed")
+            self._owned.discard(job_id)
+            # Files are only needed to resume; results stay in the table
+            shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+
+    # ---------------- Queries ---------------- #
+    def progress(self, job_id):
+        """Job status with item counts per status, or None for an unknown job."""
+        with self._lock:
+            job = self._db.execute(
+                "SELECT status, account_address, created_at, updated_at FROM batch_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if job is None:
+                return None
+            counts = dict(self._db.execute(
+                "SELECT status, COUNT(*) FROM batch_items WHERE job_id = ? GROUP BY status", (job_id,)
+            ).fetchall())
+        total = sum(counts.values())
+        finished = sum(counts.get(s, 0) for s in TERMINAL_STATUSES)
+        return {
+            "job_id": job_id,
+            "status": job[0],
+            "account_address": job[1],
+            "total": total,
+            "finished": finished,
+            "counts": {s: counts.get(s, 0) for s in ("pending", "parsed") + TERMINAL_STATUSES},
+            "progress": round(finished / total, 3) if total else 1.0,
+            "created_at": job[2],
+            "updated_at": job[3],
+        }
+
+    def results(self, job_id, after=0, limit=500):
+        """Finished items in completion order; pass the last `seq` seen as `after` to page."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT done_seq, idx, filename, content_hash, status, result, error FROM batch_items "
+                "WHERE job_id = ? AND done_seq > ? ORDER BY done_seq LIMIT ?", (job_id, after, limit)
+            ).fetchall()
+        return [{
+            "seq": seq,
+            "index": idx,
+            "filename": filename,
+            "content_hash": content_hash,
+            "status": status,
+            "result": json.loads(result) if result else None,
+            "error": error,
+        } for seq, idx, filename, content_hash, status, result, error in rows]
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_batch_job_manager(parse_fn, store_fn, store_batch_fn=None, on_stored=None):
+    """Process-wide job manager configured from BATCH_* variables (not started)."""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                root = os.getenv("BATCH_JOBS_DIR", os.path.join("data", "batch_jobs"))
+                _manager = BatchJobManager(
+                    os.getenv("BATCH_JOBS_DB", os.path.join(root, "jobs.sqlite3")),
+                    root,
+                    parse_fn,
+                    store_fn,
+                    store_batch_fn=store_batch_fn,
+                    on_stored=on_stored,
+                    parse_workers=int(os.getenv("BATCH_PARSE_WORKERS", "2")),
+                    ledger_batch_size=int(os.getenv("BATCH_LEDGER_SIZE", "25")),
+                    ledger_wait=float(os.getenv("BATCH_LEDGER_WAIT", "2.0")),
+                    max_archive_members=int(os.getenv("BATCH_MAX_MEMBERS", "1000")),
+                    max_archive_bytes=int(os.getenv("BATCH_MAX_UNCOMPRESSED_SIZE", str(2 * 1024 ** 3))),
+                    lease_seconds=float(os.getenv("BATCH_LEASE_SECONDS", "60")),
+                )
+    return _manager
@@ -1,40 +1,35 @@
+import base64
+import copy
 import cv2
+import hashlib
+import numpy as np
 import pytesseract
 import re
 import os
-from ultralytics import YOLO
-from langchain_huggingface import HuggingFaceEndpoint, ChatHuggingFace
-from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
+import threading
 from dotenv import load_dotenv
+from src.model_registry import get_registry
+from src.result_cache import ResultCache, get_parse_cache, sha256_file
+from src.template_extractor import get_template_extractor
+from src.llm_client import get_extraction_client
+from src.ocr_engine import get_ocr_engine
+from src.pdf_ingest import is_pdf, iter_pdf_pages
+from src.perceptual_hash import get_near_duplicate_index, near_duplicate_distances, phash, text_fingerprint, to_hex
+from src.model_server import get_model_server_client
+from src.metrics import record_cache, stage_timer
 
 load_dotenv()
 HF_API = os.getenv("HF_API_TOKEN")
 
-# Set Tesseract path from environment or use default
-tesseract_path = os.getenv('TESSERACT_CMD', 'C:/Program Files/Tesseract-OCR/tesseract.exe')
-if os.path.exists(tesseract_path):
-    pytesseract.pytesseract.tesseract_cmd = tesseract_path
+LLM_MODEL = "meta-llama/Llama-3.3-70B-Instruct"  # or "google/gemma-2-2b-it"
 
+# Bump when OCR preprocessing or crop logic changes so cached results are not reused
+PIPELINE_VERSION = "3"
 
-class CertificateParser:
-    def __init__(self, signature_output_folder, photo_output_folder):
-        self.sign_parser_model_path = os.path.join("Backend", "models", "sign_parser.pt")
-        self.signature_output_folder = signature_output_folder
-        self.photo_output_folder = photo_output_folder
-
-        # Setup LLM
-        llm = HuggingFaceEndpoint(
-            model="meta-llama/Llama-3.3-70B-Instruct",  # or "google/gemma-2-2b-it"
-            huggingfacehub_api_token=str(HF_API),
-            task="text-generation",
-            temperature=0
-        )
-        self.model = ChatHuggingFace(llm=llm)
-        self.parser = JsonOutputParser()
+# SSD face boxes below this confidence are ignored; a false box would be masked out of OCR
+FACE_BOX_MIN_CONFIDENCE = float(os.getenv("FACE_BOX_MIN_CONFIDENCE", "0.5"))
 
-        self.prompt = PromptTemplate(
-            template="""
+EXTRACTION_PROMPT = """
 You are an AI assistant specialized in extracting information from student certificates.
 Extract the following fields from the certificate text.
 If a field is missing, set its value to null (the JSON null literal, not the string "null").
@@ -62,79 +57,166 @@ Certificate Text:
 
 output format:
 {format_instructions}
-""",
-            input_variables=["certificate_text"],
-            partial_variables={"format_instructions": self.parser.get_format_instructions()}
-        )
-
-        self.chain = self.prompt | self.model | self.parser
+"""
 
-    # ---------------- OCR ---------------- #
-    def extract_text_from_image(self, image_path, threshold_value=150):
-        img = cv2.imread(image_path)
-        if img is None:
-            raise FileNotFoundError(f"Could not read the image at: {image_path}")
-
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        _, thresh = cv2.threshold(gray, threshold_value, 255, cv2.THRESH_BINARY)
-
-        custom_config = r'--oem 3 --psm 6'
-        text = pytesseract.image_to_string(thresh, config=custom_config)
-
-        return text.strip()
+# Set Tesseract path from environment or use default
+tesseract_path = os.getenv('TESSERACT_CMD', 'C:/Program Files/Tesseract-OCR/tesseract.exe')
+if os.path.exists(tesseract_path):
+    pytesseract.pytesseract.tesseract_cmd = tesseract_path
 
-    def clean_ocr_text(self, text):
-        return re.sub(r"[^a-zA-Z0-9.,;:!?()@%&\-\s]", "", text)
 
-    def extract_certificate_info(self, image_path):
-        extracted_text = self.extract_text_from_image(image_path)
-        cleaned_text = self.clean_ocr_text(extracted_text)
-        result = self.chain.invoke({'certificate_text': cleaned_text})
-        return result
+def signature_boxes(results):
+    """(index, (x1, y1, x2, y2)) for every signature-class box in YOLO results."""
+    detections = []
+    for result in results:
+        boxes = result.boxes.xyxy.cpu().numpy()
+        class_ids = result.boxes.cls.cpu().numpy()
 
-    # ---------------- Signature Extraction ---------------- #
-    def crop_signatures(self, image_path, student_name):
-        os.makedirs(self.signature_output_folder, exist_ok=True)
-        image = cv2.imread(image_path)
-        if image is None:
-            raise FileNotFoundError(f"Could not read the image at: {image_path}")
+        for idx, (bbox, cls_id) in enumerate(zip(boxes, class_ids)):
+            if int(cls_id) == 0:  # signature class
+                detections.append((idx, tuple(map(int, bbox))))
+    return detections
 
-        model = YOLO(self.sign_parser_model_path)
-        results = model(image)
-        cropped_paths = []
 
+class CertificateParser:
+    def __init__(self, signature_output_folder, photo_output_folder, cache=None, save_crops=None,
+                 near_duplicate_index=None, template_extractor=None, llm_client=None, ocr_engine=None):
+        # The registry owns the model locations (MODELS_DIR, SIGN_PARSER_MODEL_PATH)
+        self.sign_parser_model_path = get_registry().path("sign_parser")
+        self.face_detector_paths = tuple(get_registry().path("face_detector").split(os.pathsep))
+        self.signature_output_folder = signature_output_folder
+        self.photo_output_folder = photo_output_folder
+        # When False, crops are returned as base64 PNGs instead of being written to the output folders
+        if save_crops is None:
+            save_crops = os.getenv("SAVE_CROPS", "true").lower() not in ("0", "false", "no")
+        self.save_crops = save_crops
+        self.ocr_engine = ocr_engine if ocr_engine is not None else get_ocr_engine()
+        # "roi": OCR only text blocks outside signature/photo boxes; "page": whole thresholded page
+        self.ocr_mode = os.getenv("OCR_MODE", "roi").lower()
+        # 0 disables; otherwise scans above this DPI are downsampled before detection and OCR
+        self.target_dpi = int(os.getenv("OCR_TARGET_DPI", "0"))
+        self.pdf_dpi = int(os.getenv("PDF_DPI", "200"))
+        self.pdf_min_text_chars = int(os.getenv("PDF_MIN_TEXT_CHARS", "40"))
+        self.pdf_rasterize_text_pages = os.getenv("PDF_RASTERIZE_TEXT_PAGES", "true").lower() not in ("0", "false", "no")
+
+        # langchain is imported on first LLM use (see `parser`, `prompt` and `chain`)
+        self._llm_lock = threading.Lock()
+        self._parser = None
+        self._prompt = None
+        self._chain = None
+
+        # Pooled async client with retries, deadline and optional micro-batching (LLM_CLIENT=langchain disables)
+        self.llm_client = llm_client if llm_client is not None else get_extraction_client(
+            LLM_MODEL,
+            lambda text: self.prompt.format(certificate_text=text),
+            lambda output: self.parser.parse(output)
+        )
+        self.template_extractor = template_extractor if template_extractor is not None \
+            else get_template_extractor()
+
+        # Cache results by upload content; the version covers model, prompt and pipeline changes
+        self.cache = cache if cache is not None else get_parse_cache()
+        self.version = hashlib.sha256(
+            "|".join([PIPELINE_VERSION, LLM_MODEL, EXTRACTION_PROMPT, self.sign_parser_model_path,
+                      self.ocr_mode, str(self.target_dpi), str(self.pdf_dpi)]).encode()
+        ).hexdigest()[:16]
+
+        # Perceptual hashes of parsed uploads, to spot re-scans and re-compressions
+        self.near_duplicates = near_duplicate_index if near_duplicate_index is not None \
+            else get_near_duplicate_index("parsed")
+
+    # ---------------- LLM (lazy) ---------------- #
+    @property
+    def parser(self):
+        if self._parser is None:
+            from langchain_core.output_parsers import JsonOutputParser
+            self._parser = JsonOutputParser()
+        return self._parser
+
+    @property
+    def prompt(self):
+        if self._prompt is None:
+            from langchain_core.prompts import PromptTemplate
+            self._prompt = PromptTemplate(
+                template=EXTRACTION_PROMPT,
+                input_variables=["certificate_text"],
+                partial_variables={"format_instructions": self.parser.get_format_instructions()}
+            )
+        return self._prompt
+
+    @property
+    def chain(self):
+        """LangChain pipeline, only built when the pooled LLM client is disabled."""
+        if self._chain is None:
+            with self._llm_lock:
+                if self._chain is None:
+                    from langchain_huggingface import HuggingFaceEndpoint, ChatHuggingFace
+                    llm = HuggingFaceEndpoint(
+                        model=LLM_MODEL,
+                        huggingfacehub_api_token=str(HF_API),
+                        task="text-generation",
+                        temperature=0
+                    )
+                    self._chain = self.prompt | ChatHuggingFace(llm=llm) | self.parser
+        return self._chain
+
+    # ---------------- Image Loading ---------------- #
+    @staticmethod
+    def decode_image(data):
+        """Decode encoded image bytes (PNG/JPEG) into a BGR array."""
+        img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError("Could not decode the uploaded image")
+        return img
+
+    def load_image(self, image):
+        """Accept a file path, encoded bytes or an already decoded array."""
+        if isinstance(image, np.ndarray):
+            return image
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            return self.decode_image(image)
+        img = cv2.imread(str(image))
+        if img is None:
+            raise FileNotFoundError(f"Could not read the image at: {image}")
+        return img
+
+    @staticmethod
+    def encode_png(image):
+        ok, buffer = cv2.imencode(".png", image)
+        if not ok:
+            raise ValueError("Could not encode crop as PNG")
+        return buffer.tobytes()
+
+    @staticmethod
+    def _crop_prefix(student_name):
         student_name = student_name if student_name else "unknown"
-        student_name = student_name.replace(" ", "_").strip().lower()
-
-        for result in results:
-            boxes = result.boxes.xyxy.cpu().numpy()
-            class_ids = result.boxes.cls.cpu().numpy()
-
-            for idx, (bbox, cls_id) in enumerate(zip(boxes, class_ids)):
-                if int(cls_id) == 0:  # signature class
-                    x1, y1, x2, y2 = map(int, bbox)
-                    cropped = image[y1:y2, x1:x2]
-                    cropped_name = f"{student_name}_signature_{idx}.png"
-                    cropped_path = os.path.join(self.signature_output_folder, cropped_name)
-                    cv2.imwrite(cropped_path, cropped)
-                    cropped_paths.append(cropped_path)
-
-        return [p.replace("\\", "/") for p in cropped_paths] if cropped_paths else []
-
-    # ---------------- Photo Extraction ---------------- #
-    def crop_photo(self, image_path, student_name):
-        os.makedirs(self.photo_output_folder, exist_ok=True)
-
-        image = cv2.imread(image_path)
-        if image is None:
-            raise FileNotFoundError(f"Could not read the image at: {image_path}")
-
-        # Pretrained DNN face detector (make sure these files exist in Backend/models)
-        prototxt = os.path.join("Backend", "models", "deploy.prototxt")
-        model_file = os.path.join("Backend", "models", "res10_300x300_ssd_iter_140000.caffemodel")
-
-        net = cv2.dnn.readNetFromCaffe(prototxt, model_file)
-
+        return student_name.replace(" ", "_").strip().lower()
+
+    # ---------------- Layout Detection ---------------- #
+    def downsample(self, image):
+        """Shrink oversized scans to `target_dpi` before detection; returns (image, scale)."""
+        if not self.target_dpi:
+            return image, 1.0
+        # DPI is estimated from the long side, assuming an A4 page
+        dpi = max(image.shape[:2]) / 11.69
+        if dpi <= self.target_dpi:
+            return image, 1.0
+        scale = self.target_dpi / dpi
+        resized = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return resized, scale
+
+    def detect_signatures(self, image):
+        """YOLO signature boxes as (index, (x1, y1, x2, y2)) in image coordinates."""
+        model_server = get_model_server_client()
+        if model_server is not None:
+            return [(idx, tuple(box)) for idx, box in model_server.call("signature_detection", image)]
+
+        with get_registry().get("sign_parser", self.sign_parser_model_path) as model:
+            results = model(image)
+        return signature_boxes(results)
+
+    def detect_face(self, image, min_confidence=None):
+        """Box of the most confident face as (x1, y1, x2, y2), or None when no box reaches min_confidence."""
         (h, w) = image.shape[:2]
         blob = cv2.dnn.blobFromImage(
             cv2.resize(image, (300, 300)),
@@ -143,15 +225,21 @@ output format:
             (104.0, 177.0, 123.0)
         )
 
-        net.setInput(blob)
-        detections = net.forward()
+        # Pretrained DNN face detector (make sure these files exist in Backend/models)
+        face_detector = get_registry().get("face_detector", os.pathsep.join(self.face_detector_paths))
+        with face_detector as net:
+            net.setInput(blob)
+            detections = net.forward()
 
         if detections.shape[2] == 0:
             return None  # No face found
 
         # Select detection with highest confidence
         max_conf_idx = detections[0, 0, :, 2].argmax()
-        confidence = detections[0, 0, max_conf_idx, 2]
+        if min_confidence is None:
+            min_confidence = FACE_BOX_MIN_CONFIDENCE
+        if detections[0, 0, max_conf_idx, 2] < min_confidence:
+            return None  # Certificates without a photo still yield low-confidence boxes
 
         # Extract bounding box
         box = detections[0, 0, max_conf_idx, 3:7] * [w, h, w, h]
@@ -160,13 +248,151 @@ output format:
         # Ensure coords are within bounds
         x1, y1 = max(0, x1), max(0, y1)
         x2, y2 = min(w - 1, x2), min(h - 1, y2)
+        return (int(x1), int(y1), int(x2), int(y2))
+
+    @staticmethod
+    def _scale_box(box, scale):
+        return tuple(int(round(v / scale)) for v in box)
+
+    @staticmethod
+    def _mask_boxes(image, boxes, value):
+        """Fill `boxes` (plus a small margin, so photo and signature edges go too) with `value`, in place."""
+        h, w = image.shape[:2]
+        margin = max(5, min(w, h) // 100)
+        for x1, y1, x2, y2 in boxes:
+            image[max(0, y1 - margin):y2 + margin, max(0, x1 - margin):x2 + margin] = value
+        return image
+
+    def find_text_regions(self, gray, exclude_boxes=()):
+        """Bounding boxes of text blocks, in reading order, outside the excluded boxes."""
+        h, w = gray.shape[:2]
+        ink = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 31, 15)
+        self._mask_boxes(ink, exclude_boxes, 0)
+
+        # Borders and ruling lines would merge every block they touch into one page-sized
+        # contour after dilation; strokes much longer than any word are not text
+        lines = cv2.morphologyEx(ink, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (max(30, w // 6), 1)))
+        lines |= cv2.morphologyEx(ink, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (1, max(30, h // 6))))
+        ink[cv2.dilate(lines, np.ones((3, 3), np.uint8)) > 0] = 0
+
+        # Smear characters into words and lines so each contour is a text block
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(15, w // 60), max(3, h // 300)))
+        blocks = cv2.dilate(ink, kernel, iterations=1)
+        contours, _ = cv2.findContours(blocks, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        min_height, min_area = max(8, h // 200), (w * h) // 20000
+        regions = []
+        for contour in contours:
+            x, y, bw, bh = cv2.boundingRect(contour)
+            if bh < min_height or bw * bh < min_area:
+                continue
+            if bw > 0.9 * w and bh > 0.5 * h:
+                # Still spans the page (e.g. a decorative frame); OCR would get everything at once
+                continue
+            pad = max(2, bh // 8)
+            regions.append((max(0, x - pad), max(0, y - pad), min(w, x + bw + pad), min(h, y + bh + pad)))
+
+        # Reading order: top to bottom, then left to right within a line
+        line_height = max(1, int(np.median([r[3] - r[1] for r in regions]))) if regions else 1
+        return sorted(regions, key=lambda r: (r[1] // line_height, r[0]))
 
-        cropped = image[y1:y2, x1:x2]
+    # ---------------- OCR ---------------- #
+    def extract_text_from_image(self, image, threshold_value=150):
+        img = self.load_image(image)
 
-        student_name = student_name if student_name else "unknown"
-        student_name = student_name.replace(" ", "_").strip().lower()
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        _, thresh = cv2.threshold(gray, threshold_value, 255, cv2.THRESH_BINARY)
+
+        # --oem 3 --psm 6, through persistent workers when available
+        text = self.ocr_engine.recognize(thresh, psm=6)
+
+        return text.strip()
+
+    def extract_text_from_regions(self, image, exclude_boxes=()):
+        """OCR only the text-bearing regions, in parallel, each with its own adaptive binarization.
+
+        Falls back to full-page OCR when no text regions are found.
+        """
+        img = self.load_image(image)
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        regions = self.find_text_regions(gray, exclude_boxes)
+        if not regions:
+            return self.extract_text_from_image(img)
+        # A text block can overlap a photo or signature; crop from a copy with them blanked out
+        if len(exclude_boxes):
+            gray = self._mask_boxes(gray.copy(), exclude_boxes, 255)
+
+        crops = []
+        for x1, y1, x2, y2 in regions:
+            region = gray[y1:y2, x1:x2]
+            block = max(3, min(31, (min(region.shape[:2]) // 2) | 1))
+            crops.append(cv2.adaptiveThreshold(region, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                               cv2.THRESH_BINARY, block, 10))
+        texts = self.ocr_engine.recognize_many(crops, psm=6)
+        return "\n".join(t.strip() for t in texts if t.strip())
+
+    def clean_ocr_text(self, text):
+        return re.sub(r"[^a-zA-Z0-9.,;:!?()@%&\-\s]", "", text)
 
-        cropped_name = f"{student_name}_photo.png"
+    def extract_certificate_info(self, image, extracted_text=None):
+        if extracted_text is None:
+            extracted_text = self.extract_text_from_image(image)
+
+        # Known layouts are handled by deterministic rules; only fall back to the LLM when unsure.
+        # The rules see the raw OCR text since cleaning drops separators such as '/' in dates and IDs
+        if self.template_extractor is not None:
+            with stage_timer("template_extraction"):
+                result = self.template_extractor.extract(extracted_text)
+            if result is not None:
+                return result
+
+        cleaned_text = self.clean_ocr_text(extracted_text)
+        with stage_timer("llm_extraction"):
+            if self.llm_client is not None:
+                return self.llm_client.extract_sync(cleaned_text)
+            result = self.chain.invoke({'certificate_text': cleaned_text})
+        return result
+
+    # ---------------- Signature Extraction ---------------- #
+    def crop_signatures(self, image, student_name, save=True, detections=None):
+        """Crop detected signatures; returns file paths, or PNG bytes when save is False."""
+        image = self.load_image(image)
+        if detections is None:
+            detections = self.detect_signatures(image)
+        crops = []
+
+        student_name = self._crop_prefix(student_name)
+        if save:
+            os.makedirs(self.signature_output_folder, exist_ok=True)
+
+        for idx, (x1, y1, x2, y2) in detections:
+            cropped = image[y1:y2, x1:x2]  # view into the decoded page, no copy
+            if not save:
+                crops.append(self.encode_png(cropped))
+                continue
+            cropped_name = f"{student_name}_signature_{idx}.png"
+            cropped_path = os.path.join(self.signature_output_folder, cropped_name)
+            cv2.imwrite(cropped_path, cropped)
+            crops.append(cropped_path.replace("\\", "/"))
+
+        return crops
+
+    # ---------------- Photo Extraction ---------------- #
+    def crop_photo(self, image, student_name, save=True, box=None):
+        """Crop the most confident face; returns a file path, or PNG bytes when save is False."""
+        image = self.load_image(image)
+        if box is None:
+            box = self.detect_face(image)
+        if box is None:
+            return None  # No face found
+
+        (x1, y1, x2, y2) = box
+        cropped = image[y1:y2, x1:x2]
+        if not save:
+            return self.encode_png(cropped)
+
+        os.makedirs(self.photo_output_folder, exist_ok=True)
+        cropped_name = f"{self._crop_prefix(student_name)}_photo.png"
         cropped_path = os.path.join(self.photo_output_folder, cropped_name)
         cv2.imwrite(cropped_path, cropped)
 
@@ -174,14 +400,189 @@ output format:
 
 
     # ---------------- Combined ---------------- #
-    def parse_certificate(self, image_path):
-        ocr_result = self.extract_certificate_info(image_path)
-        sig_paths = self.crop_signatures(image_path, ocr_result["student_name"])
-        photo_path = self.crop_photo(image_path, ocr_result["student_name"])
+    @staticmethod
+    def content_hash(image):
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            return hashlib.sha256(image).hexdigest()
+        if isinstance(image, np.ndarray):
+            return hashlib.sha256(np.ascontiguousarray(image).data).hexdigest()
+        return sha256_file(image)
+
+    def _cache_key(self, content_hash, save_crops):
+        version = self.version if save_crops else f"{self.version}-inline"
+        return ResultCache.make_key(content_hash, version)
+
+    def parse_certificate(self, image, content_hash=None, save_crops=None):
+        """Parse a certificate given as a file path, encoded bytes or a decoded array."""
+        save_crops = self.save_crops if save_crops is None else save_crops
+        if self.cache is None and self.near_duplicates is None:
+            return self._parse_any(image, save_crops)
+
+        content_hash = content_hash or self.content_hash(image)
+        if self.cache is not None:
+            result = self.cache.get(self._cache_key(content_hash, save_crops))
+            record_cache("parse", result is not None)
+            if result is not None:
+                return result
+
+        if is_pdf(image):
+            result = self.parse_pdf(image, save_crops)
+            if self.cache is not None:
+                self.cache.put(self._cache_key(content_hash, save_crops), result)
+            return result
+
+        # Decode once; every stage below works on this array (or views of it)
+        with stage_timer("decode"):
+            image = self.load_image(image)
+
+        near_duplicates, image_phash, reuse = [], None, None
+        if self.near_duplicates is not None:
+            with stage_timer("near_duplicate_lookup"):
+                image_phash = phash(image)
+                flag_distance, skip_distance = near_duplicate_distances()
+                near_duplicates = self.near_duplicates.find(image_phash, flag_distance, exclude=content_hash)
+            reuse = [m for m in near_duplicates if m["distance"] <= skip_distance and m.get("text_fingerprint")]
+
+        result = self._parse_certificate(image, save_crops, reuse=reuse)
+        if image_phash is not None:
+            record_cache("near_duplicate", "near_duplicate_of" in result)
+            result["perceptual_hash"] = to_hex(image_phash)
+            result["near_duplicates"] = near_duplicates
+            self.near_duplicates.add(content_hash, image_phash, {
+                "student_name": (result.get("certificate_info") or {}).get("student_name"),
+                "text_fingerprint": result.get("text_fingerprint"),
+            })
+
+        if self.cache is not None:
+            self.cache.put(self._cache_key(content_hash, save_crops), result)
+        return result
+
+    def _reuse_near_duplicate(self, candidates, fingerprint, save_crops):
+        """Fields of a near-duplicate whose OCR text matches this page, so the LLM can be skipped.
+
+        Pages from one institute template sit within a few pHash bits of each
+        other, so only an equal text fingerprint counts as the same document.
+        """
+        if self.cache is None or fingerprint is None:
+            return None, None
+        for match in candidates:
+            if match.get("text_fingerprint") != fingerprint:
+                continue
+            cached = self.cache.get(self._cache_key(match["key"], save_crops))
+            if cached is not None and cached.get("certificate_info"):
+                return copy.deepcopy(cached["certificate_info"]), {
+                    "content_hash": match["key"], "distance": match["distance"]}
+        return None, None
+
+    def _parse_any(self, image, save_crops):
+        if is_pdf(image):
+            return self.parse_pdf(image, save_crops)
+        return self._parse_certificate(image, save_crops)
+
+    def _parse_certificate(self, image, save_crops=True, text=None, crop_name_suffix="", reuse=None):
+        """Parse one page. `text` (e.g. a PDF text layer) skips OCR; with no image only fields are extracted.
+
+        `reuse` lists near-duplicate candidates (index matches with a text
+        fingerprint). The page's fingerprint is then added to the result, and
+        a candidate with the same text supplies the fields instead of the LLM.
+        """
+        if image is None:
+            return self._page_result(self.extract_certificate_info(None, extracted_text=text), [], None, save_crops)
+
+        image = self.load_image(image)
+
+        # Layout detection runs once, on a downsampled copy for oversized scans
+        work, scale = self.downsample(image)
+        with stage_timer("signature_detection"):
+            signature_boxes = self.detect_signatures(work)
+        with stage_timer("face_detection"):
+            face_box = self.detect_face(work)
+
+        with stage_timer("ocr"):
+            if text is not None:
+                pass  # embedded text layer, no OCR needed
+            elif self.ocr_mode == "roi":
+                exclude = [box for _, box in signature_boxes] + ([face_box] if face_box else [])
+                text = self.extract_text_from_regions(work, exclude)
+            else:
+                text = self.extract_text_from_image(work)
+        fingerprint = near_duplicate_of = ocr_result = None
+        if reuse is not None:
+            fingerprint = text_fingerprint(text)
+            ocr_result, near_duplicate_of = self._reuse_near_duplicate(reuse, fingerprint, save_crops)
+        if ocr_result is None:
+            ocr_result = self.extract_certificate_info(work, extracted_text=text)
+
+        # Crops come from the full-resolution page
+        signature_boxes = [(idx, self._scale_box(box, scale)) for idx, box in signature_boxes]
+        face_box = self._scale_box(face_box, scale) if face_box else None
+        crop_name = f"{ocr_result['student_name'] or 'unknown'}{crop_name_suffix}"
+        with stage_timer("crop"):
+            signatures = self.crop_signatures(image, crop_name, save=save_crops, detections=signature_boxes)
+            photo = self.crop_photo(image, crop_name, save=save_crops, box=face_box)
+        result = self._page_result(ocr_result, signatures, photo, save_crops)
+        if reuse is not None:
+            result["text_fingerprint"] = fingerprint
+        if near_duplicate_of is not None:
+            result["near_duplicate_of"] = near_duplicate_of
+        return result
+
+    def _page_result(self, ocr_result, signatures, photo, save_crops):
+        if not save_crops:
+            return {
+                "certificate_info": ocr_result,
+                "signature_folder": None,
+                "signature_paths": [],
+                "photo_path": None,
+                "signature_images": [base64.b64encode(s).decode("ascii") for s in signatures],
+                "photo_image": base64.b64encode(photo).decode("ascii") if photo is not None else None
+            }
 
         return {
             "certificate_info": ocr_result,
-            "signature_folder": self.signature_output_folder if sig_paths else None,
-            "signature_paths": sig_paths,
-            "photo_path": photo_path
+            "signature_folder": self.signature_output_folder if signatures else None,
+            "signature_paths": signatures,
+            "photo_path": photo
+        }
+
+    # ---------------- PDF ---------------- #
+    def parse_pdf(self, source, save_crops=True):
+        """Parse a (multi-page) PDF page by page and aggregate the results.
+
+        Pages are rasterized lazily, one at a time; pages with an embedded text
+        layer skip OCR. The top-level certificate_info takes, per field, the
+        first non-null value across pages.
+        """
+        pages = []
+        certificate_info = {}
+        signature_paths, signature_images = [], []
+        photo_path = photo_image = None
+
+        for page in iter_pdf_pages(source, dpi=self.pdf_dpi, min_text_chars=self.pdf_min_text_chars,
+                                   rasterize_text_pages=self.pdf_rasterize_text_pages):
+            result = self._parse_certificate(page.image, save_crops, text=page.text,
+                                             crop_name_suffix=f" page{page.index + 1}")
+            result["page"] = page.index + 1
+            result["text_source"] = "text_layer" if page.text is not None else "ocr"
+            pages.append(result)
+
+            for field, value in (result["certificate_info"] or {}).items():
+                if certificate_info.get(field) is None:
+                    certificate_info[field] = value
+            signature_paths += result["signature_paths"]
+            signature_images += result.get("signature_images", [])
+            photo_path = photo_path or result["photo_path"]
+            photo_image = photo_image or result.get("photo_image")
+
+        aggregated = {
+            "certificate_info": certificate_info,
+            "signature_folder": self.signature_output_folder if signature_paths else None,
+            "signature_paths": signature_paths,
+            "photo_path": photo_path,
+            "page_count": len(pages),
+            "pages": pages
         }
+        if not save_crops:
+            aggregated["signature_images"] = signature_images
+            aggregated["photo_image"] = photo_image
+        return aggregated
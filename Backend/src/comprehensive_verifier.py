@@ -0,0 +1,112 @@
+import asyncio
+import os
+import time
+
+from src.inference_executor import DeadlineExceeded
+
+# Seconds each stage may take before it is reported as timed out
+DEFAULT_STAGE_TIMEOUTS = {
+    "ledger": 10.0,
+    "photo": 20.0,
+    "signature": 20.0,
+    "edits": 15.0,
+}
+
+
+def stage_timeout(name):
+    """Timeout for a stage from VERIFY_<NAME>_TIMEOUT, falling back to the defaults above."""
+    default = DEFAULT_STAGE_TIMEOUTS.get(name, 30.0)
+    return float(os.getenv(f"VERIFY_{name.upper()}_TIMEOUT", str(default)))
+
+
+class Stage:
+    """One independent verification step: `fn(*args, **kwargs)` run in an executor lane.
+
+    When `fn` can stop early, `deadline_arg` names the keyword argument that
+    receives the absolute deadline (time.time() + timeout); see
+    inference_executor.check_deadline.
+    """
+
+    def __init__(self, name, lane, fn, *args, critical=False, timeout=None, deadline_arg=None, **kwargs):
+        self.name = name
+        self.lane = lane
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.critical = critical
+        self.timeout = stage_timeout(name) if timeout is None else timeout
+        self.deadline_arg = deadline_arg
+
+
+class CriticalStageFailed(Exception):
+    """A stage the verdict cannot be given without failed or timed out."""
+
+    def __init__(self, stage, reason, report):
+        super().__init__(f"{stage}: {reason}")
+        self.stage = stage
+        self.reason = reason
+        self.report = report
+
+
+async def run_stages(stages, run):
+    """Run all stages concurrently, each under its own timeout.
+
+    `run(lane, fn, *args, **kwargs)` is the awaitable that executes blocking
+    work (main.run_blocking). A failing or slow non-critical stage leaves its
+    result as None and is listed under `errors`; the other stages still
+    complete. A failing critical stage raises `CriticalStageFailed` with the
+    partial report attached.
+
+    The timeout bounds the response, not the work: `asyncio.wait_for`
+    cancels a stage still queued in its lane, but one already running in a
+    thread or process cannot be interrupted and holds its lane slot until it
+    returns. Stages with a `deadline_arg` get the deadline passed in and stop
+    at their next check instead.
+    """
+    async def timed(stage):
+        start = time.perf_counter()
+        kwargs = dict(stage.kwargs)
+        if stage.deadline_arg:
+            kwargs[stage.deadline_arg] = time.time() + stage.timeout
+        try:
+            value = await asyncio.wait_for(run(stage.lane, stage.fn, *stage.args, **kwargs), stage.timeout)
+            error = None
+        except (asyncio.TimeoutError, DeadlineExceeded):
+            value, error = None, f"timed out after {stage.timeout:g}s"
+        except Exception as e:
+            value, error = None, getattr(e, "detail", None) or str(e) or type(e).__name__
+        return value, error, round((time.perf_counter() - start) * 1000, 1)
+
+    outcomes = await asyncio.gather(*(timed(stage) for stage in stages))
+
+    report = {"results": {}, "errors": {}, "stage_timings_ms": {}}
+    for stage, (value, error, elapsed_ms) in zip(stages, outcomes):
+        report["results"][stage.name] = value
+        report["stage_timings_ms"][stage.name] = elapsed_ms
+        if error is not None:
+            report["errors"][stage.name] = error
+    report["partial"] = bool(report["errors"])
+
+    for stage in stages:
+        if stage.critical and stage.name in report["errors"]:
+            raise CriticalStageFailed(stage.name, report["errors"][stage.name], report)
+    return report
+
+
+def overall_verdict(report):
+    """Verified only when the ledger has the certificate and every stage that ran agrees."""
+    results = report["results"]
+    checks = {}
+    if "ledger" in results:
+        ledger = results["ledger"]
+        checks["ledger"] = bool(ledger) and not (isinstance(ledger, dict) and ledger.get("error"))
+    for name in ("photo", "signature"):
+        if name in results and results[name] is not None:
+            checks[name] = bool(results[name].get("prediction"))
+    if results.get("edits") is not None and "verdict" in results["edits"]:
+        checks["edits"] = results["edits"]["verdict"] == "LIKELY ORIGINAL"
+    return {
+        "verified": bool(checks) and all(checks.values()) and not report["errors"],
+        "checks": checks,
+        "inconclusive": sorted(report["errors"]),
+    }
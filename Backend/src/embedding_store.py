@@ -0,0 +1,119 @@
+import base64
+import os
+import re
+import threading
+
+import cv2
+import numpy as np
+
+_KEY_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+
+class EmbeddingStore:
+    """Reference embeddings on disk, one float32 `.npy` per certificate and kind.
+
+    Layout is `<root>/<kind>/<key[:2]>/<key>.npy`, where kind is `face` or
+    `signature`. Arrays are 2-D (one row per reference) and are opened
+    memory-mapped, so lookups do not copy the data.
+    """
+
+    KINDS = ("face", "signature")
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, kind, key):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown embedding kind: {kind}")
+        if not _KEY_PATTERN.match(key):
+            raise ValueError(f"Invalid embedding key: {key}")
+        return os.path.join(self.root, kind, key[:2], f"{key}.npy")
+
+    def put(self, kind, key, embeddings):
+        embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        path = self._path(kind, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so readers never see a half-written file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, embeddings)
+        os.replace(tmp_path, path)
+
+    def get(self, kind, key):
+        path = self._path(kind, key)
+        if not os.path.exists(path):
+            return None
+        return np.load(path, mmap_mode="r")
+
+    def has(self, kind, key):
+        return os.path.exists(self._path(kind, key))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_embedding_store():
+    """Process-wide store rooted at EMBEDDING_STORE_DIR, or None when it is not configured."""
+    global _store
+    root = os.getenv("EMBEDDING_STORE_DIR")
+    if not root:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = EmbeddingStore(root)
+    return _store
+
+
+def _load_crop(path=None, encoded=None):
+    if encoded is not None:
+        return cv2.imdecode(np.frombuffer(base64.b64decode(encoded), dtype=np.uint8), cv2.IMREAD_COLOR)
+    if path is not None:
+        return cv2.imread(path)
+    return None
+
+
+def index_reference_embeddings(store, keys, parse_result, signature_verifier=None, face_index=None):
+    """Embed the face and signature crops of a parse result and store them under each key.
+
+    The face embedding is also inserted into `face_index` (under the first key)
+    so reused photos can be found with a 1:N search.
+    """
+    keys = [k for k in dict.fromkeys(keys) if k]
+    if (store is None and face_index is None) or not keys or not parse_result:
+        return
+
+    face = _load_crop(parse_result.get("photo_path"), parse_result.get("photo_image"))
+    if face is not None:
+        try:
+            from src.photo_verifier import get_embedding
+            # Detect and crop with MTCNN like the probe photos on /verify-faces and /faces/search;
+            # the parser's photo crop has a different margin and framing
+            embedding = get_embedding(face)
+            if store is not None:
+                for key in keys:
+                    store.put("face", key, embedding)
+            if face_index is not None:
+                info = parse_result.get("certificate_info") or {}
+                face_index.add(keys[0], embedding, {
+                    "student_name": info.get("student_name"),
+                    "institute_name": info.get("institute_name"),
+                    "certificate_id": info.get("certificate_id"),
+                })
+        except Exception as e:
+            print(f"Warning: could not store face embedding: {e}")
+
+    if store is None or signature_verifier is None:
+        return
+    crops = [_load_crop(path=p) for p in parse_result.get("signature_paths") or []]
+    crops += [_load_crop(encoded=e) for e in parse_result.get("signature_images") or []]
+    crops = [c for c in crops if c is not None]
+    if crops:
+        try:
+            batch = np.stack([signature_verifier.preprocess_signature(c) for c in crops])
+            embeddings = signature_verifier.embed_signatures(batch)
+            for key in keys:
+                store.put("signature", key, embeddings)
+        except Exception as e:
+            print(f"Warning: could not store signature embeddings: {e}")
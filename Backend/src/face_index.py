@@ -0,0 +1,467 @@
+import contextlib
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: only one process may write to an index root
+    fcntl = None
+
+
+def _normalize(vectors):
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _top_k(scores, k):
+    k = min(k, len(scores))
+    if k == 0:
+        return np.zeros(0, dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx])]
+
+
+def train_kmeans(vectors, n_lists, iterations=10, sample_size=None, seed=0):
+    """Spherical k-means on L2-normalized vectors; returns normalized centroids."""
+    rng = np.random.default_rng(seed)
+    sample_size = sample_size or min(len(vectors), n_lists * 64)
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignment = _assign(sample, centroids)
+        order = np.argsort(assignment, kind="stable")
+        counts = np.bincount(assignment, minlength=n_lists)
+        sums = np.zeros_like(centroids)
+        nonempty = counts > 0
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[nonempty]
+        sums[nonempty] = np.add.reduceat(sample[order], starts, axis=0)
+        empty = ~nonempty
+        # Re-seed empty lists from random samples so every list stays usable
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = _normalize(sums)
+    return centroids
+
+
+def _assign(vectors, centroids, chunk_size=65536):
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk_size):
+        chunk = np.asarray(vectors[start:start + chunk_size], dtype=np.float32)
+        assignment[start:start + chunk_size] = (chunk @ centroids.T).argmax(axis=1)
+    return assignment
+
+
+class FaceIndex:
+    """1:N search over L2-normalized face embeddings.
+
+    Small corpora are searched brute force with one matmul. Once the base
+    reaches `ivf_threshold` vectors, an inverted-file (IVF) index is
+    trained: vectors are stored grouped by their nearest centroid, and a
+    query only scans the `nprobe` closest lists.
+
+    Inserts go to an in-memory delta. Every `autosave_every` inserts the
+    delta is appended to disk as a segment, which writes only the new rows.
+    The delta and segments are scanned brute force. Once segments hold
+    `compact_every` rows, a background thread merges them into a new base
+    and trains or refreshes the IVF lists. It works on a snapshot outside
+    the lock and swaps the new base in when done, so searches and inserts
+    carry on meanwhile.
+
+    On disk, `manifest.json` names the current base directory and the live
+    segments. A base is `vectors.npy`, `meta.jsonl`, and for IVF
+    `centroids.npy` plus `offsets.npy` (list boundaries). A segment is
+    `segments/<n>.npy` plus `<n>.jsonl`. Base and segment vectors are
+    memory-mapped. An index saved before manifests existed, with the base
+    files in the root, still loads.
+
+    Several processes (uvicorn workers) may share one root on a local
+    filesystem. Writes take an `flock` on `root/.lock` and re-read the
+    manifest first, so segment ids come from the manifest and every write
+    keeps the other processes' segments. Only one process compacts at a time
+    (`root/.compact.lock`). A process picks up the others' segments at its
+    next flush, or at a search after the manifest changed.
+    """
+
+    def __init__(self, root=None, dim=512, ivf_threshold=50000, nprobe=16, autosave_every=1000,
+                 compact_every=50000):
+        self.root = root
+        self.dim = dim
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self.autosave_every = autosave_every
+        self.compact_every = compact_every
+
+        self._lock = threading.RLock()
+        # Segment and manifest writes, and reading other processes' changes; never held during a scan
+        self._io_lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._compacting = False
+        self._base = np.zeros((0, dim), dtype=np.float32)
+        self._base_meta = []
+        self._centroids = None
+        self._offsets = None
+        self._base_dir = None
+        self._generation = 0
+        self._segments = []
+        self._next_segment = 0
+        self._manifest_stamp = None
+        self._delta = []
+        self._delta_meta = []
+        self._keys = set()
+
+        if root and (os.path.exists(os.path.join(root, "manifest.json"))
+                     or os.path.exists(os.path.join(root, "vectors.npy"))):
+            self.load()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._base_meta) + sum(len(s["meta"]) for s in self._segments) + len(self._delta_meta)
+
+    def add(self, key, embedding, metadata=None):
+        """Insert one embedding; returns False when the key is already indexed."""
+        with self._lock:
+            if key in self._keys:
+                return False
+            self._keys.add(key)
+            self._delta.append(_normalize(embedding)[0])
+            self._delta_meta.append(dict(metadata or {}, key=key))
+            autosave = self.root and self.autosave_every and len(self._delta) >= self.autosave_every
+        if autosave:
+            self.flush()
+        return True
+
+    def search(self, embedding, k=10, nprobe=None):
+        query = _normalize(embedding)[0]
+        if self.root:
+            self._refresh()
+        with self._lock:
+            base, base_meta = self._base, self._base_meta
+            centroids, offsets = self._centroids, self._offsets
+            flat = [(s["vectors"], s["meta"]) for s in self._segments]
+            if self._delta:
+                flat.append((np.stack(self._delta), list(self._delta_meta)))
+
+        candidates, candidate_meta = [], []
+        if len(base_meta):
+            if centroids is None:
+                rows = np.arange(len(base_meta))
+                scores = np.asarray(base @ query)
+            else:
+                lists = _top_k(centroids @ query, nprobe or self.nprobe)
+                rows = np.concatenate([np.arange(offsets[i], offsets[i + 1]) for i in lists])
+                # Lists are contiguous on disk, so each slice is a sequential mmap read
+                vectors = np.concatenate([base[offsets[i]:offsets[i + 1]] for i in lists])
+                scores = vectors @ query
+            best = _top_k(scores, k)
+            candidates.append(scores[best])
+            candidate_meta.extend(base_meta[rows[i]] for i in best)
+        for vectors, meta in flat:
+            scores = np.asarray(vectors @ query)
+            best = _top_k(scores, k)
+            candidates.append(scores[best])
+            candidate_meta.extend(meta[i] for i in best)
+
+        if not candidates:
+            return []
+        scores = np.concatenate(candidates)
+        order = _top_k(scores, k)
+        # For unit vectors: ||a - b|| = sqrt(2 - 2 cos)
+        distances = np.sqrt(np.maximum(0.0, 2.0 - 2.0 * scores[order]))
+        return [
+            {"distance": round(float(d), 4), **candidate_meta[i]}
+            for d, i in zip(distances, order)
+        ]
+
+    # ---------------- Persistence ---------------- #
+    def _segment_path(self, segment_id):
+        return os.path.join(self.root, "segments", str(segment_id))
+
+    @contextlib.contextmanager
+    def _root_lock(self, name=".lock", shared=False, blocking=True):
+        """flock a file in the root so processes sharing it take turns; yields whether it was acquired."""
+        if fcntl is None:
+            yield True
+            return
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, name), "a") as f:
+            try:
+                fcntl.flock(f, (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if blocking else fcntl.LOCK_NB))
+                acquired = True
+            except BlockingIOError:
+                acquired = False
+            yield acquired
+
+    def _read_manifest(self):
+        path = os.path.join(self.root, "manifest.json")
+        if not os.path.exists(path):
+            return {"base": ".", "generation": 0, "segments": [], "next_segment": 0}, None
+        stat = os.stat(path)
+        with open(path) as f:
+            manifest = json.load(f)
+        manifest.setdefault("next_segment", max(manifest["segments"], default=-1) + 1)
+        return manifest, (stat.st_mtime_ns, stat.st_ino)
+
+    def _load_base(self, base_dir):
+        path = os.path.join(self.root, base_dir)
+        if not os.path.exists(os.path.join(path, "vectors.npy")):
+            return np.zeros((0, self.dim), dtype=np.float32), [], None, None
+        base = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        with open(os.path.join(path, "meta.jsonl")) as f:
+            base_meta = [json.loads(line) for line in f]
+        centroids = offsets = None
+        if os.path.exists(os.path.join(path, "centroids.npy")):
+            centroids = np.load(os.path.join(path, "centroids.npy"))
+            offsets = np.load(os.path.join(path, "offsets.npy"))
+        return base, base_meta, centroids, offsets
+
+    def _load_segment(self, segment_id):
+        path = self._segment_path(segment_id)
+        with open(path + ".jsonl") as f:
+            meta = [json.loads(line) for line in f]
+        return {"id": segment_id, "vectors": np.load(path + ".npy", mmap_mode="r"), "meta": meta, "persisted": True}
+
+    def _sync(self):
+        """Bring the in-memory view up to the manifest on disk; the caller holds _io_lock and the root lock.
+
+        Returns the keys that arrived from disk, which pending inserts may duplicate.
+        """
+        manifest, stamp = self._read_manifest()
+        with self._lock:
+            reload_base = (manifest["base"], manifest["generation"]) != (self._base_dir, self._generation)
+            known = {s["id"]: s for s in self._segments if s["persisted"]}
+        if reload_base:
+            base, base_meta, centroids, offsets = self._load_base(manifest["base"])
+        segments = [known.get(i) or self._load_segment(i) for i in manifest["segments"]]
+
+        with self._lock:
+            if reload_base:
+                self._base, self._base_meta, self._centroids, self._offsets = base, base_meta, centroids, offsets
+                self._base_dir, self._generation = manifest["base"], manifest["generation"]
+                arrived = {m["key"] for m in base_meta} | {m["key"] for s in segments for m in s["meta"]}
+            else:
+                arrived = {m["key"] for s in segments if s["id"] not in known for m in s["meta"]}
+            # Segments merged by another process's compaction drop out with the old base
+            self._segments = segments + [s for s in self._segments if not s["persisted"]]
+            self._next_segment = manifest["next_segment"]
+            self._manifest_stamp = stamp
+            if reload_base:
+                self._keys = arrived | {m["key"] for s in self._segments for m in s["meta"]} \
+                    | {m["key"] for m in self._delta_meta}
+            else:
+                self._keys |= arrived
+        return arrived
+
+    def _refresh(self):
+        """Pick up segments and bases written by other processes since the manifest was last read."""
+        try:
+            stat = os.stat(os.path.join(self.root, "manifest.json"))
+        except FileNotFoundError:
+            return
+        if (stat.st_mtime_ns, stat.st_ino) == self._manifest_stamp:
+            return
+        with self._io_lock, self._root_lock(shared=True):
+            self._sync()
+
+    def load(self):
+        with self._io_lock, self._root_lock(shared=True):
+            self._sync()
+        # Leftovers of a compaction interrupted before its manifest was written; a base
+        # directory is only stale when no process is compacting into it
+        with self._root_lock(".compact.lock", blocking=False) as idle:
+            if idle:
+                current = self._read_manifest()[0]["base"]
+                for name in os.listdir(self.root):
+                    if name.startswith("base-") and name != current:
+                        shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    def _write_manifest(self):
+        """Record the current base and persisted segments; the caller holds _io_lock and the root lock."""
+        with self._lock:
+            manifest = {"base": self._base_dir, "generation": self._generation,
+                        "segments": [s["id"] for s in self._segments if s["persisted"]],
+                        "next_segment": self._next_segment}
+        path = os.path.join(self.root, "manifest.json")
+        self._write(path, lambda f: f.write(json.dumps(manifest).encode()))
+        stat = os.stat(path)
+        self._manifest_stamp = (stat.st_mtime_ns, stat.st_ino)
+
+    def flush(self):
+        """Append pending inserts to disk as a new segment; only the new rows are written."""
+        if not self.root:
+            raise ValueError("FaceIndex has no root directory to save to")
+        with self._io_lock, self._root_lock():
+            # Another process may have appended segments or compacted since this one last looked
+            arrived = self._sync()
+            with self._lock:
+                if self._delta:
+                    keep = [i for i, m in enumerate(self._delta_meta) if m["key"] not in arrived]
+                    if keep:
+                        self._segments.append({"id": None, "vectors": np.stack([self._delta[i] for i in keep]),
+                                               "meta": [self._delta_meta[i] for i in keep], "persisted": False})
+                    self._delta, self._delta_meta = [], []
+                # Includes segments whose earlier write failed
+                pending = [s for s in self._segments if not s["persisted"]]
+            if not pending:
+                return
+            os.makedirs(os.path.join(self.root, "segments"), exist_ok=True)
+            for segment in pending:
+                # Ids are allocated from the shared manifest, so no two processes write the same files
+                segment["id"] = self._next_segment
+                self._next_segment += 1
+                path = self._segment_path(segment["id"])
+                self._write(path + ".npy", lambda f: np.save(f, segment["vectors"]))
+                self._write(path + ".jsonl",
+                            lambda f: f.write("".join(json.dumps(m) + "\n" for m in segment["meta"]).encode()))
+                vectors = np.load(path + ".npy", mmap_mode="r")
+                with self._lock:
+                    segment["vectors"], segment["persisted"] = vectors, True
+            self._write_manifest()
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        with self._lock:
+            rows = sum(len(s["meta"]) for s in self._segments if s["persisted"])
+            if self._compacting or not self.compact_every or rows < self.compact_every:
+                return
+            self._compacting = True
+        threading.Thread(target=self._compact_in_background, name="face-index-compaction", daemon=True).start()
+
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        except Exception as e:
+            print(f"Warning: face index compaction failed: {e}")
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def compact(self, rebuild=False):
+        """Merge persisted segments into a new base, training or refreshing the IVF lists as needed.
+
+        The merge runs on a snapshot without holding the index lock; only
+        swapping in the new base and rewriting the manifest are locked. When
+        another process is already compacting the same root, a plain
+        compaction is skipped and a rebuild waits for it.
+        """
+        if not self.root:
+            raise ValueError("FaceIndex has no root directory to save to")
+        with self._compact_lock, self._root_lock(".compact.lock", blocking=rebuild) as acquired:
+            if not acquired:
+                return
+            # Include segments appended by other processes
+            with self._io_lock, self._root_lock():
+                self._sync()
+            with self._lock:
+                base, base_meta = self._base, self._base_meta
+                base_centroids, base_offsets = self._centroids, self._offsets
+                segments = [s for s in self._segments if s["persisted"]]
+                old_base_dir, generation = self._base_dir, self._generation + 1
+            if not segments and not rebuild:
+                return
+            new_rows = np.concatenate([np.asarray(s["vectors"]) for s in segments]) if segments \
+                else np.zeros((0, self.dim), dtype=np.float32)
+            vectors = np.concatenate([np.asarray(base), new_rows])
+            meta = base_meta + [m for s in segments for m in s["meta"]]
+
+            centroids = base_centroids
+            if rebuild or (centroids is None and len(meta) >= self.ivf_threshold):
+                n_lists = max(1, min(len(meta), int(4 * np.sqrt(len(meta)))))
+                centroids = train_kmeans(vectors, n_lists)
+                assignment = _assign(vectors, centroids)
+            elif centroids is not None:
+                # Base rows are already grouped by list; only the new rows need assigning
+                base_assignment = np.repeat(np.arange(len(centroids)), np.diff(base_offsets))
+                assignment = np.concatenate([base_assignment, _assign(new_rows, centroids)])
+
+            offsets = None
+            if centroids is not None:
+                order = np.argsort(assignment, kind="stable")
+                vectors = vectors[order]
+                meta = [meta[i] for i in order]
+                offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=len(centroids)))])
+
+            base_dir = f"base-{generation}"
+            path = os.path.join(self.root, base_dir)
+            os.makedirs(path, exist_ok=True)
+            self._write(os.path.join(path, "vectors.npy"), lambda f: np.save(f, vectors))
+            self._write(os.path.join(path, "meta.jsonl"),
+                        lambda f: f.write("".join(json.dumps(m) + "\n" for m in meta).encode()))
+            if centroids is not None:
+                self._write(os.path.join(path, "centroids.npy"), lambda f: np.save(f, centroids))
+                self._write(os.path.join(path, "offsets.npy"), lambda f: np.save(f, offsets))
+            del vectors
+            mapped = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+
+            merged = {s["id"] for s in segments}
+            with self._io_lock, self._root_lock():
+                # Keep segments other processes appended during the merge
+                self._sync()
+                with self._lock:
+                    self._base, self._base_meta, self._centroids, self._offsets = mapped, meta, centroids, offsets
+                    self._base_dir, self._generation = base_dir, generation
+                    self._segments = [s for s in self._segments if s["id"] not in merged]
+                self._write_manifest()
+
+            # Searches that snapshotted the old files keep their mappings; unlinking is safe
+            if old_base_dir == ".":
+                for name in ("vectors.npy", "meta.jsonl", "centroids.npy", "offsets.npy"):
+                    if os.path.exists(os.path.join(self.root, name)):
+                        os.remove(os.path.join(self.root, name))
+            elif old_base_dir:
+                shutil.rmtree(os.path.join(self.root, old_base_dir), ignore_errors=True)
+            for segment_id in merged:
+                for ext in (".npy", ".jsonl"):
+                    if os.path.exists(self._segment_path(segment_id) + ext):
+                        os.remove(self._segment_path(segment_id) + ext)
+
+    def save(self, rebuild=False):
+        """Persist pending inserts as a segment; with rebuild, also merge everything and retrain the IVF lists."""
+        self.flush()
+        if rebuild:
+            self.compact(rebuild=True)
+
+    @staticmethod
+    def _write(path, writer):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            writer(f)
+        os.replace(tmp_path, path)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_face_index():
+    """Process-wide face index rooted at FACE_INDEX_DIR, or None when it is not configured."""
+    global _index
+    root = os.getenv("FACE_INDEX_DIR")
+    if not root:
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = FaceIndex(
+                    root,
+                    ivf_threshold=int(os.getenv("FACE_INDEX_IVF_THRESHOLD", "50000")),
+                    nprobe=int(os.getenv("FACE_INDEX_NPROBE", "16")),
+                    autosave_every=int(os.getenv("FACE_INDEX_AUTOSAVE_EVERY", "1000")),
+                    compact_every=int(os.getenv("FACE_INDEX_COMPACT_EVERY", "50000")),
+                )
+    return _index
+
+
+def embed_face_bytes(data):
+    """Decode an uploaded image and return its FaceNet embedding."""
+    import cv2
+    from src.photo_verifier import get_embedding
+
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Could not decode the uploaded image")
+    return get_embedding(image)
@@ -0,0 +1,163 @@
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+
+class LaneSaturated(Exception):
+    """Raised when a lane's workers and queue are all taken."""
+
+    def __init__(self, lane, retry_after, status_code=503):
+        super().__init__(f"Inference lane '{lane}' is saturated")
+        self.lane = lane
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised by lane work that gave up because its caller's deadline passed."""
+
+
+def check_deadline(deadline):
+    """Raise DeadlineExceeded once `deadline` (a time.time() value, None for no limit) has passed.
+
+    Lane work cannot be interrupted from outside: a timed-out caller stops
+    waiting, but a running thread or process keeps its slot until the
+    function returns. Long functions call this between steps so they give up
+    soon after the caller has.
+    """
+    if deadline is not None and time.time() > deadline:
+        raise DeadlineExceeded("deadline exceeded")
+
+
+class Lane:
+    """A bounded pool of workers for one class of blocking work.
+
+    `thread` lanes suit I/O-bound work that releases the GIL (tesseract
+    subprocesses, HTTP calls to the LLM). `process` lanes suit CPU-bound
+    inference; functions submitted to them must be picklable module-level
+    callables.
+    """
+
+    def __init__(self, name, kind="thread", max_workers=4, max_queue=16,
+                 retry_after=5, reject_status=503):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown lane kind: {kind}")
+        self.name = name
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.reject_status = reject_status
+
+        self._pool = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def _get_pool(self):
+        if self._pool is None:
+            if self.kind == "thread":
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix=f"lane-{self.name}")
+            else:
+                # spawn: forking a parent that already imported TensorFlow is unsafe
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def _release(self, future):
+        with self._lock:
+            self._pending -= 1
+            if future.cancelled() or future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    async def run(self, fn, *args, **kwargs):
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise LaneSaturated(self.name, self.retry_after, self.reject_status)
+            self._pending += 1
+
+        try:
+            if self.kind == "thread":
+                # Carry request-scoped context (e.g. timings) into the worker thread
+                call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+            else:
+                call = functools.partial(fn, *args, **kwargs)
+            future = self._get_pool().submit(call)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+
+        # Release the slot only when the work really finishes, even if the caller is cancelled
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def stats(self):
+        with self._lock:
+            pending = self._pending
+            return {
+                "kind": self.kind,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": min(pending, self.max_workers),
+                "queued": max(0, pending - self.max_workers),
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+            }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+class InferenceExecutor:
+    def __init__(self, lanes):
+        self.lanes = {lane.name: lane for lane in lanes}
+
+    async def run(self, lane, fn, *args, **kwargs):
+        return await self.lanes[lane].run(fn, *args, **kwargs)
+
+    def stats(self):
+        return {name: lane.stats() for name, lane in self.lanes.items()}
+
+    def shutdown(self):
+        for lane in self.lanes.values():
+            lane.shutdown()
+
+    @classmethod
+    def from_env(cls):
+        """Build the default `io` and `cpu` lanes from INFERENCE_* environment variables."""
+        retry_after = int(os.getenv("INFERENCE_RETRY_AFTER", "5"))
+        reject_status = int(os.getenv("INFERENCE_REJECT_STATUS", "503"))
+        cpu_count = os.cpu_count() or 2
+        return cls([
+            Lane(
+                "io",
+                kind="thread",
+                max_workers=int(os.getenv("INFERENCE_IO_WORKERS", "8")),
+                max_queue=int(os.getenv("INFERENCE_IO_QUEUE", "32")),
+                retry_after=retry_after,
+                reject_status=reject_status,
+            ),
+            Lane(
+                "cpu",
+                kind=os.getenv("INFERENCE_CPU_LANE_KIND", "thread"),
+                max_workers=int(os.getenv("INFERENCE_CPU_WORKERS", str(cpu_count))),
+                max_queue=int(os.getenv("INFERENCE_CPU_QUEUE", "16")),
+                retry_after=retry_after,
+                reject_status=reject_status,
+            ),
+        ])
@@ -0,0 +1,233 @@
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from src.metrics import record_cache
+
+
+def normalize_hash(certificate_hash):
+    return certificate_hash.lower().removeprefix("0x")
+
+
+def classify(result):
+    """"found", "not_found", or None for results that must not be cached (errors, unconfirmed records)."""
+    if not isinstance(result, dict) or not result:
+        return None
+    if result.get("exists") is False or result.get("found") is False:
+        return "not_found"
+    error = result.get("error")
+    if error:
+        return "not_found" if "not found" in str(error).lower() else None
+    if result.get("success") is False or result.get("confirmed") is False:
+        return None
+    return "found"
+
+
+class LedgerCache:
+    """Read-through cache with single-flight lookups in front of the ledger.
+
+    `lookup_fn(hash)` is the ledger read (`blockchain.get_certificate_info`).
+    A confirmed record does not change, so it is kept for `ttl_seconds`. A
+    not-found answer is kept only for `negative_ttl_seconds`, because the
+    certificate may be stored a moment later; stores also call
+    `invalidate`. Errors are never cached.
+
+    Concurrent lookups of the same hash share one ledger call: the first
+    caller runs it and the others wait for its result (or its exception).
+    `get_certificates_info` resolves many hashes and sends the misses as one
+    call to `batch_lookup_fn(hashes)` when the ledger supports it.
+    """
+
+    def __init__(self, lookup_fn, batch_lookup_fn=None, max_entries=10000, ttl_seconds=24 * 3600,
+                 negative_ttl_seconds=30, batch_fallback_workers=8):
+        self.lookup_fn = lookup_fn
+        self.batch_lookup_fn = batch_lookup_fn
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.batch_fallback_workers = batch_fallback_workers
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.ledger_calls = 0
+        self.batch_calls = 0
+
+    def _cached(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, kind, value = entry
+        if expires_at <= now:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        if kind == "not_found":
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return value
+
+    def _claim(self, keys):
+        """Split keys into cached values, lookups already in flight, and keys this caller must fetch."""
+        now = time.time()
+        cached, waiting, owned = {}, {}, {}
+        with self._lock:
+            for key in keys:
+                value = self._cached(key, now)
+                if value is not None:
+                    cached[key] = copy.deepcopy(value)
+                elif key in self._pending:
+                    self.coalesced += 1
+                    waiting[key] = self._pending[key]
+                else:
+                    self.misses += 1
+                    owned[key] = self._pending[key] = Future()
+        for key in keys:
+            record_cache("ledger", key in cached)
+        return cached, waiting, owned
+
+    def _settle(self, key, future, result=None, error=None):
+        kind = classify(result) if error is None else None
+        ttl = self.ttl_seconds if kind == "found" else self.negative_ttl_seconds
+        with self._lock:
+            # An invalidate() during the lookup drops the pending entry; its answer may be stale
+            if self._pending.get(key) is future:
+                del self._pending[key]
+                if kind is not None and ttl > 0 and self.max_entries > 0:
+                    self._entries[key] = (time.time() + ttl, kind, result)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def get_certificate_info(self, certificate_hash):
+        key = normalize_hash(certificate_hash)
+        cached, waiting, owned = self._claim([key])
+        if key in cached:
+            return cached[key]
+        if key in waiting:
+            return waiting[key].result()
+        with self._lock:
+            self.ledger_calls += 1
+        try:
+            result = self.lookup_fn(certificate_hash)
+        except Exception as e:
+            self._settle(key, owned[key], error=e)
+            raise
+        self._settle(key, owned[key], result)
+        return result
+
+    def _fetch_many(self, hashes):
+        """Ledger answers for `hashes`, in order; a failed lookup is returned as its exception."""
+        if self.batch_lookup_fn is not None and len(hashes) > 1:
+            with self._lock:
+                self.batch_calls += 1
+            try:
+                results = self.batch_lookup_fn(hashes)
+                if len(results) == len(hashes):
+                    return list(results)
+                print(f"Ledger batch lookup returned {len(results)} results for {len(hashes)} hashes")
+            except Exception as e:
+                print(f"Ledger batch lookup failed, looking up individually: {e}")
+
+        def lookup(certificate_hash):
+            with self._lock:
+                self.ledger_calls += 1
+            try:
+                return self.lookup_fn(certificate_hash)
+            except Exception as e:
+                return e
+
+        if len(hashes) == 1:
+            return [lookup(hashes[0])]
+        with ThreadPoolExecutor(max_workers=min(self.batch_fallback_workers, len(hashes))) as pool:
+            return list(pool.map(lookup, hashes))
+
+    def get_certificates_info(self, certificate_hashes):
+        """Results for many hashes, in order; a hash whose lookup failed gets {"error": ...}."""
+        by_key = {}
+        for certificate_hash in certificate_hashes:
+            by_key.setdefault(normalize_hash(certificate_hash), certificate_hash)
+        cached, waiting, owned = self._claim(list(by_key))
+        results = dict(cached)
+
+        if owned:
+            keys = list(owned)
+            try:
+                fetched = self._fetch_many([by_key[key] for key in keys])
+            except BaseException as e:
+                for key in keys:
+                    self._settle(key, owned[key], error=e)
+                raise
+            for key, result in zip(keys, fetched):
+                if isinstance(result, Exception):
+                    self._settle(key, owned[key], error=result)
+                    results[key] = {"error": f"Ledger lookup failed: {result}"}
+                else:
+                    self._settle(key, owned[key], result)
+                    results[key] = result
+
+        for key, future in waiting.items():
+            try:
+                results[key] = future.result()
+            except Exception as e:
+                results[key] = {"error": f"Ledger lookup failed: {e}"}
+        return [results[normalize_hash(certificate_hash)] for certificate_hash in certificate_hashes]
+
+    def invalidate(self, certificate_hash):
+        key = normalize_hash(certificate_hash)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._pending.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.negative_hits + self.misses + self.coalesced
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "ledger_calls": self.ledger_calls,
+                "batch_calls": self.batch_calls,
+                "hit_rate": round((self.hits + self.negative_hits) / lookups, 3) if lookups else None,
+                "in_flight": len(self._pending),
+            }
+
+
+_ledger_cache = None
+_ledger_cache_lock = threading.Lock()
+
+
+def get_ledger_cache(blockchain):
+    """Process-wide ledger read cache configured from LEDGER_CACHE_* variables.
+
+    With LEDGER_CACHE_ENABLED off nothing is stored, but concurrent lookups
+    are still coalesced and batch lookups still work.
+    """
+    global _ledger_cache
+    if _ledger_cache is None:
+        with _ledger_cache_lock:
+            if _ledger_cache is None:
+                enabled = os.getenv("LEDGER_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+                _ledger_cache = LedgerCache(
+                    blockchain.get_certificate_info,
+                    # Multicall-style batch read when the ledger client supports it
+                    batch_lookup_fn=getattr(blockchain, "get_certificates_info", None),
+                    max_entries=int(os.getenv("LEDGER_CACHE_SIZE", "10000")) if enabled else 0,
+                    ttl_seconds=float(os.getenv("LEDGER_CACHE_TTL", str(24 * 3600))),
+                    negative_ttl_seconds=float(os.getenv("LEDGER_CACHE_NEGATIVE_TTL", "30")),
+                )
+    return _ledger_cache
@@ -0,0 +1,243 @@
+import asyncio
+import os
+import random
+import threading
+
+import httpx
+
+DEFAULT_BASE_URL = "https://router.huggingface.co/v1"
+
+BATCH_PROMPT = """
+You are an AI assistant specialized in extracting information from student certificates.
+Below are {count} certificate texts, each between <certificate index="N"> tags.
+For every certificate extract: student_name, institute_name, degree, major, date_of_issue, certificate_id.
+If a field is missing, set its value to null (the JSON null literal, not the string "null").
+
+Return a **strict JSON array** with exactly {count} objects, in the same order as the certificates.
+Do not add any text outside the JSON array.
+
+{certificates}
+"""
+
+
+class LLMRequestError(Exception):
+    """The LLM endpoint failed after all retries, or the deadline passed."""
+
+
+class AsyncExtractionClient:
+    """Pooled async client for the OpenAI-compatible chat completions endpoint.
+
+    One `httpx.AsyncClient` is reused for every call. Concurrency is capped
+    by a semaphore, 429/5xx responses and transport errors are retried with
+    exponential backoff (honouring Retry-After), and every extraction has a
+    hard deadline. With `batch_size > 1`, texts arriving within
+    `batch_window_ms` are packed into one prompt and the returned JSON array
+    is split back per caller.
+
+    Sync callers (worker threads) use `extract_sync`, which runs the coroutine
+    on a private event loop thread so the pool and semaphore are shared.
+    """
+
+    def __init__(self, model, build_prompt, parse_output, api_token=None, base_url=DEFAULT_BASE_URL,
+                 max_concurrency=4, timeout=30.0, deadline=90.0, max_retries=4,
+                 backoff_base=0.5, backoff_max=8.0, batch_size=1, batch_window_ms=20):
+        self.model = model
+        self.build_prompt = build_prompt
+        self.parse_output = parse_output
+        self.api_token = api_token
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.batch_size = batch_size
+        self.batch_window_ms = batch_window_ms
+
+        self._client = None
+        self._semaphore = None
+        self._queue = None
+        self._batch_task = None
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.batched_items = 0
+
+    # ---------------- HTTP ---------------- #
+    def _ensure_started(self):
+        # Created lazily so they bind to the loop that actually runs them
+        if self._client is None:
+            headers = {"Authorization": f"Bearer {self.api_token}"} if self.api_token else {}
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=headers,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_concurrency,
+                                    max_keepalive_connections=self.max_concurrency),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            try:
+                return min(self.backoff_max, float(retry_after))
+            except ValueError:
+                pass
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * (0.5 + random.random() / 2)
+
+    async def complete(self, prompt, max_tokens=1024):
+        """Send one chat completion and return the message content."""
+        self._ensure_started()
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0,
+            "max_tokens": max_tokens,
+        }
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            async with self._semaphore:
+                self.requests += 1
+                try:
+                    response = await self._client.post("/chat/completions", json=payload)
+                    if response.status_code == 429 or response.status_code >= 500:
+                        retry_after = response.headers.get("Retry-After")
+                        last_error = LLMRequestError(f"LLM endpoint returned {response.status_code}")
+                    else:
+                        response.raise_for_status()
+                        return response.json()["choices"][0]["message"]["content"]
+                except httpx.TransportError as e:
+                    last_error = e
+            if attempt < self.max_retries:
+                self.retries += 1
+                await asyncio.sleep(self._backoff(attempt, retry_after))
+        self.failures += 1
+        raise LLMRequestError(f"LLM request failed after {self.max_retries + 1} attempts: {last_error}")
+
+    # ---------------- Extraction ---------------- #
+    async def extract(self, certificate_text):
+        try:
+            if self.batch_size > 1:
+                return await asyncio.wait_for(self._enqueue(certificate_text), self.deadline)
+            return await asyncio.wait_for(self._extract_one(certificate_text), self.deadline)
+        except asyncio.TimeoutError:
+            self.failures += 1
+            raise LLMRequestError(f"LLM extraction exceeded the {self.deadline}s deadline")
+
+    async def _extract_one(self, certificate_text):
+        return self.parse_output(await self.complete(self.build_prompt(certificate_text)))
+
+    async def _enqueue(self, certificate_text):
+        self._ensure_started()
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._batch_task = asyncio.get_running_loop().create_task(self._batch_worker())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((certificate_text, future))
+        return await future
+
+    async def _batch_worker(self):
+        while True:
+            items = [await self._queue.get()]
+            deadline = asyncio.get_running_loop().time() + self.batch_window_ms / 1000
+            while len(items) < self.batch_size:
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            items = [(text, future) for text, future in items if not future.done()]
+            if items:
+                asyncio.get_running_loop().create_task(self._run_batch(items))
+
+    async def _run_batch(self, items):
+        try:
+            if len(items) == 1:
+                results = [await self._extract_one(items[0][0])]
+            else:
+                results = await self._extract_batch([text for text, _ in items])
+                self.batched_items += len(items)
+        except Exception as e:
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(items, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _extract_batch(self, texts):
+        certificates = "\n\n".join(
+            f'<certificate index="{i}">\n{text}\n</certificate>' for i, text in enumerate(texts, start=1)
+        )
+        prompt = BATCH_PROMPT.format(count=len(texts), certificates=certificates)
+        try:
+            parsed = self.parse_output(await self.complete(prompt, max_tokens=512 * len(texts)))
+        except LLMRequestError:
+            raise
+        except Exception:
+            parsed = None
+        if isinstance(parsed, list) and len(parsed) == len(texts) and all(isinstance(p, dict) for p in parsed):
+            return parsed
+        # The model did not return one object per certificate; retry them individually
+        return await asyncio.gather(*(self._extract_one(text) for text in texts))
+
+    # ---------------- Sync bridge ---------------- #
+    def _get_loop(self):
+        if self._loop is None:
+            with self._loop_lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name="llm-client", daemon=True).start()
+                    self._loop = loop
+        return self._loop
+
+    def extract_sync(self, certificate_text):
+        """Blocking extraction for worker threads; calls share this client's loop and pool."""
+        return asyncio.run_coroutine_threadsafe(self.extract(certificate_text), self._get_loop()).result()
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "batched_items": self.batched_items,
+            "max_concurrency": self.max_concurrency,
+            "batch_size": self.batch_size,
+        }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_extraction_client(model, build_prompt, parse_output):
+    """Process-wide client configured from LLM_* variables, or None when LLM_CLIENT=langchain."""
+    global _client
+    if os.getenv("LLM_CLIENT", "async").lower() != "async":
+        return None
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = AsyncExtractionClient(
+                    model,
+                    build_prompt,
+                    parse_output,
+                    api_token=os.getenv("HF_API_TOKEN"),
+                    base_url=os.getenv("HF_LLM_BASE_URL", DEFAULT_BASE_URL),
+                    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "4")),
+                    timeout=float(os.getenv("LLM_TIMEOUT", "30")),
+                    deadline=float(os.getenv("LLM_DEADLINE", "90")),
+                    max_retries=int(os.getenv("LLM_MAX_RETRIES", "4")),
+                    batch_size=int(os.getenv("LLM_BATCH_SIZE", "1")),
+                    batch_window_ms=float(os.getenv("LLM_BATCH_WINDOW_MS", "20")),
+                )
+    return _client
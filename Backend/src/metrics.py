@@ -0,0 +1,161 @@
+"""Prometheus metrics and per-request stage timings.
+
+Hot paths wrap their stages in `stage_timer(name)` (or `@timed(name)`).
+Each stage is observed in the `authenex_stage_seconds` histogram. When it
+runs inside an HTTP request, it is also added to that request's
+`RequestTimings`, which the middleware in main.py turns into a
+`Server-Timing` header. Thread lanes copy the request context into their
+workers. Work in process lanes is only timed from the calling side, as one
+lane call.
+
+Without prometheus-client installed the metrics are no-ops; Server-Timing
+still works.
+"""
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import prometheus_client
+except ImportError:  # pragma: no cover - optional at runtime, listed in requirements.txt
+    prometheus_client = None
+
+# Model inference and OCR run from milliseconds to tens of seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class _NoopMetric:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+
+def _metric(kind, name, documentation, labelnames=(), **kwargs):
+    if prometheus_client is None:
+        return _NoopMetric()
+    return getattr(prometheus_client, kind)(name, documentation, labelnames, **kwargs)
+
+
+STAGE_SECONDS = _metric("Histogram", "authenex_stage_seconds",
+                        "Time spent in one stage of parsing or verification", ["stage"],
+                        buckets=LATENCY_BUCKETS)
+LANE_CALL_SECONDS = _metric("Histogram", "authenex_lane_call_seconds",
+                            "Time of a call submitted to an inference lane, queueing included",
+                            ["lane", "function"], buckets=LATENCY_BUCKETS)
+REQUEST_SECONDS = _metric("Histogram", "authenex_request_seconds", "HTTP request latency",
+                          ["method", "route", "status"], buckets=LATENCY_BUCKETS)
+REQUESTS_IN_FLIGHT = _metric("Gauge", "authenex_requests_in_flight", "HTTP requests being served")
+CACHE_LOOKUPS = _metric("Counter", "authenex_cache_lookups_total", "Cache lookups by outcome",
+                        ["cache", "result"])
+MODEL_LOADS = _metric("Counter", "authenex_model_loads_total", "Models loaded into this process", ["model"])
+MODEL_LOAD_SECONDS = _metric("Histogram", "authenex_model_load_seconds", "Model load time", ["model"],
+                             buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120))
+LANE_IN_FLIGHT = _metric("Gauge", "authenex_lane_in_flight", "Calls running in an inference lane", ["lane"])
+LANE_QUEUED = _metric("Gauge", "authenex_lane_queued", "Calls waiting for an inference lane worker", ["lane"])
+
+
+class RequestTimings:
+    """Stage durations of one request; stages may run in several threads at once."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def add(self, name, seconds):
+        with self._lock:
+            total, count = self._stages.get(name, (0.0, 0))
+            self._stages[name] = (total + seconds, count + 1)
+
+    def server_timing(self, total_seconds=None):
+        """`Server-Timing` header value, durations in milliseconds; repeated stages are summed."""
+        with self._lock:
+            entries = [f"{name};dur={total * 1000:.1f}" + (f';desc="x{count}"' if count > 1 else "")
+                       for name, (total, count) in self._stages.items()]
+        if total_seconds is not None:
+            entries.append(f"total;dur={total_seconds * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def begin_request():
+    """Start collecting stage timings for the current request context."""
+    timings = RequestTimings()
+    _request_timings.set(timings)
+    return timings
+
+
+def _record(name, seconds):
+    STAGE_SECONDS.labels(stage=name).observe(seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+@contextmanager
+def stage_timer(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, time.perf_counter() - start)
+
+
+def timed(name):
+    """Decorator form of `stage_timer`."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage_timer(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def lane_call_timer(lane, function):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        LANE_CALL_SECONDS.labels(lane=lane, function=function).observe(seconds)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.add(f"{lane}.{function}", seconds)
+
+
+def record_cache(cache, hit):
+    CACHE_LOOKUPS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+def record_model_load(model, seconds):
+    MODEL_LOADS.labels(model=model).inc()
+    MODEL_LOAD_SECONDS.labels(model=model).observe(seconds)
+
+
+def update_lane_gauges(executor_stats):
+    for lane, stats in executor_stats.items():
+        LANE_IN_FLIGHT.labels(lane=lane).set(stats["in_flight"])
+        LANE_QUEUED.labels(lane=lane).set(stats["queued"])
+
+
+def render_latest():
+    """(body, content type) for the /metrics endpoint."""
+    if prometheus_client is None:
+        return b"# prometheus-client is not installed\n", "text/plain; charset=utf-8"
+    return prometheus_client.generate_latest(), prometheus_client.CONTENT_TYPE_LATEST
@@ -0,0 +1,247 @@
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+from src.metrics import record_model_load
+
+MODELS_DIR = os.getenv("MODELS_DIR", os.path.join("Backend", "models"))
+
+SIGN_PARSER_MODEL_PATH = os.path.join(MODELS_DIR, "sign_parser.pt")
+SIGN_VERIFIER_MODEL_PATH = os.path.join(MODELS_DIR, "sign_verifier.keras")
+FACE_DETECTOR_PROTOTXT = os.path.join(MODELS_DIR, "deploy.prototxt")
+FACE_DETECTOR_WEIGHTS = os.path.join(MODELS_DIR, "res10_300x300_ssd_iter_140000.caffemodel")
+
+
+class ModelHandle:
+    """Shared handle around a loaded model.
+
+    Use it as a context manager to get the model; models that are not safe to
+    call from several threads at once (YOLO, cv2.dnn nets) are serialized
+    behind a per-handle lock.
+    """
+
+    def __init__(self, name, path, model, load_seconds, nbytes, serialize=True):
+        self.name = name
+        self.path = path
+        self.model = model
+        self.load_seconds = load_seconds
+        self.nbytes = nbytes
+        self._lock = threading.RLock() if serialize else nullcontext()
+
+    def __enter__(self):
+        self._lock.__enter__()
+        return self.model
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._lock.__exit__(exc_type, exc, tb)
+
+    def info(self):
+        return {
+            "path": self.path,
+            "load_seconds": round(self.load_seconds, 3),
+            "memory_mb": round(self.nbytes / (1024 * 1024), 2) if self.nbytes is not None else None,
+        }
+
+
+def normalize_model_path(path):
+    """Canonical form of a model path (or os.pathsep-joined paths), so every spelling shares one handle."""
+    if path is None:
+        return None
+    return os.pathsep.join(os.path.realpath(p) for p in str(path).split(os.pathsep))
+
+
+class ModelRegistry:
+    """Loads each model at most once per process and hands out shared handles.
+
+    Handles are keyed by model name and resolved path: relative, absolute
+    and symlinked spellings of one file load it once.
+    """
+
+    def __init__(self):
+        self._specs = {}
+        self._handles = {}
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def register(self, name, loader, default_path=None, warmup=None, serialize=True):
+        self._specs[name] = {
+            "loader": loader,
+            "default_path": default_path,
+            "warmup": warmup,
+            "serialize": serialize,
+        }
+
+    def path(self, name):
+        """Resolved default path of a registered model; pass it around instead of rebuilding it."""
+        return normalize_model_path(self._specs[name]["default_path"])
+
+    def get(self, name, path=None):
+        if name not in self._specs:
+            raise KeyError(f"Unknown model: {name}")
+        spec = self._specs[name]
+        path = normalize_model_path(path if path is not None else spec["default_path"])
+        key = (name, path)
+
+        handle = self._handles.get(key)
+        if handle is not None:
+            return handle
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Per-model lock so a slow load doesn't block unrelated models
+        with load_lock:
+            handle = self._handles.get(key)
+            if handle is None:
+                start = time.perf_counter()
+                model = spec["loader"](path)
+                elapsed = time.perf_counter() - start
+                record_model_load(name, elapsed)
+                handle = ModelHandle(
+                    name, path, model, elapsed,
+                    _estimate_nbytes(model, path),
+                    serialize=spec["serialize"],
+                )
+                self._handles[key] = handle
+        return handle
+
+    def is_loaded(self, name):
+        return any(key[0] == name for key in self._handles)
+
+    def warmup(self, names=None):
+        """Load the given models (all registered ones by default) and run one dummy inference."""
+        results = {}
+        for name in names or list(self._specs):
+            try:
+                handle = self.get(name)
+                warmup = self._specs[name]["warmup"]
+                if warmup is not None:
+                    with handle as model:
+                        warmup(model)
+                results[name] = "ok"
+            except Exception as e:
+                print(f"Warning: warm-up failed for {name}: {e}")
+                results[name] = f"failed: {e}"
+        return results
+
+    def status(self):
+        loaded = {}
+        for (name, _), handle in list(self._handles.items()):
+            loaded[name] = handle.info()
+        total = sum(h.nbytes or 0 for h in self._handles.values())
+        return {
+            "registered": sorted(self._specs),
+            "loaded": loaded,
+            "total_memory_mb": round(total / (1024 * 1024), 2),
+        }
+
+
+def _estimate_nbytes(model, path=None):
+    """Best-effort size of the model weights in bytes."""
+    # ONNX wrappers report their graph sizes
+    nbytes = getattr(model, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+
+    # ultralytics YOLO wraps a torch module
+    torch_module = getattr(model, "model", None)
+    if torch_module is not None and hasattr(torch_module, "parameters"):
+        try:
+            return sum(p.numel() * p.element_size() for p in torch_module.parameters())
+        except Exception:
+            pass
+
+    # keras models, or wrappers such as FaceNet that hold one in `.model`
+    for candidate in (model, torch_module):
+        weights = getattr(candidate, "weights", None)
+        if weights:
+            try:
+                import numpy as np
+                return sum(
+                    int(np.prod(w.shape)) * np.dtype(getattr(w.dtype, "name", w.dtype)).itemsize
+                    for w in weights
+                )
+            except Exception:
+                pass
+
+    paths = path.split(os.pathsep) if path else []
+    sizes = [os.path.getsize(p) for p in paths if os.path.exists(p)]
+    return sum(sizes) if sizes else None
+
+
+# ---------------- Loaders ---------------- #
+def _load_sign_parser(path):
+    # INFERENCE_BACKEND=onnx / onnx-int8 load the exported graph instead of the .pt weights
+    from src.onnx_backend import load_sign_parser
+    return load_sign_parser(path)
+
+
+def _warmup_sign_parser(model):
+    import numpy as np
+    model(np.zeros((640, 640, 3), dtype=np.uint8), verbose=False)
+
+
+def _load_face_detector(path):
+    import cv2
+    prototxt, weights = path.split(os.pathsep)
+    return cv2.dnn.readNetFromCaffe(prototxt, weights)
+
+
+def _warmup_face_detector(net):
+    import cv2
+    import numpy as np
+    blob = cv2.dnn.blobFromImage(np.zeros((300, 300, 3), dtype=np.uint8), 1.0, (300, 300), (104.0, 177.0, 123.0))
+    net.setInput(blob)
+    net.forward()
+
+
+def _load_face_embedder(path):
+    from keras_facenet import FaceNet
+    return FaceNet()
+
+
+def _warmup_face_embedder(embedder):
+    import numpy as np
+    embedder.embeddings(np.zeros((1, 160, 160, 3), dtype=np.uint8))
+
+
+def _load_sign_verifier(path):
+    from src.onnx_backend import load_sign_verifier
+    model = load_sign_verifier(path)
+    if model is not None:
+        return model
+    from src.sign_verifier import SignatureVerifier
+    return SignatureVerifier.load_model_safe(path)
+
+
+def _warmup_sign_verifier(model):
+    import numpy as np
+    sig = np.zeros((1, 155, 220, 3), dtype=np.float32)
+    model.predict([sig, sig], verbose=0)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                registry = ModelRegistry()
+                # Read here rather than at import so a .env loaded by the app applies
+                registry.register("sign_parser", _load_sign_parser,
+                                  os.getenv("SIGN_PARSER_MODEL_PATH", SIGN_PARSER_MODEL_PATH),
+                                  warmup=_warmup_sign_parser)
+                registry.register("face_detector", _load_face_detector,
+                                  os.pathsep.join([FACE_DETECTOR_PROTOTXT, FACE_DETECTOR_WEIGHTS]),
+                                  warmup=_warmup_face_detector)
+                registry.register("face_embedder", _load_face_embedder, None,
+                                  warmup=_warmup_face_embedder, serialize=False)
+                registry.register("sign_verifier", _load_sign_verifier,
+                                  os.getenv("SIGN_VERIFIER_MODEL_PATH", SIGN_VERIFIER_MODEL_PATH),
+                                  warmup=_warmup_sign_verifier, serialize=False)
+                _registry = registry
+    return _registry
@@ -0,0 +1,269 @@
+"""Node-local inference server shared by all API workers.
+
+One process loads the models and serves the API workers (`uvicorn
+--workers N`) over a Unix socket, so the weights are held once per node
+instead of once per worker. Request images go through
+`multiprocessing.shared_memory` instead of being serialized into the socket
+stream. Requests for the same operation that arrive within a short window
+run as one batch.
+
+    MODEL_SERVER_SOCKET=/tmp/authenex-models.sock python -m src.model_server
+
+Workers use the server when MODEL_SERVER_SOCKET is set in their environment.
+"""
+import argparse
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+import uuid
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from src.micro_batcher import MicroBatcher
+
+_HEADER = struct.Struct("!I")
+
+
+def _send(sock, message):
+    payload = json.dumps(message).encode()
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _recv(sock):
+    header = _recv_exact(sock, _HEADER.size)
+    if header is None:
+        return None
+    payload = _recv_exact(sock, _HEADER.unpack(header)[0])
+    return json.loads(payload) if payload is not None else None
+
+
+def _attach(name):
+    """Open a client's block without registering it with this process's resource tracker."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        block = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(block._name, "shared_memory")
+        return block
+
+
+# ---------------- Batched operations ---------------- #
+def _face_embedding_batch(images, skip_detection=False):
+    from src.photo_verifier import embed_faces
+    return [e.tolist() if e is not None else None for e in embed_faces(images, skip_detection=skip_detection)]
+
+
+def _face_crop_embedding_batch(images):
+    return _face_embedding_batch(images, skip_detection=True)
+
+
+def _signature_embedding_batch(batches):
+    from src.model_registry import SIGN_VERIFIER_MODEL_PATH
+    from src.sign_verifier import SignatureVerifier
+    verifier = SignatureVerifier(model_path=os.getenv("SIGN_VERIFIER_MODEL_PATH", SIGN_VERIFIER_MODEL_PATH))
+    # Every request may carry several signatures; one forward pass for all of them
+    embeddings = verifier.embed_signatures(np.concatenate(batches))
+    splits = np.cumsum([len(b) for b in batches])[:-1]
+    return [part.tolist() for part in np.split(embeddings, splits)]
+
+
+def _signature_detection_batch(images):
+    from src.certificate_parser import signature_boxes
+    from src.model_registry import SIGN_PARSER_MODEL_PATH, get_registry
+    path = os.getenv("SIGN_PARSER_MODEL_PATH", SIGN_PARSER_MODEL_PATH)
+    with get_registry().get("sign_parser", path) as model:
+        results = model(list(images), verbose=False)
+    return [[[idx, list(box)] for idx, box in signature_boxes([result])] for result in results]
+
+
+OPERATIONS = {
+    "face_embedding": _face_embedding_batch,
+    "face_crop_embedding": _face_crop_embedding_batch,
+    "signature_embedding": _signature_embedding_batch,
+    "signature_detection": _signature_detection_batch,
+}
+
+
+class ModelServer:
+    def __init__(self, socket_path, max_batch_size=32, window_ms=5.0):
+        self.socket_path = socket_path
+        self.batchers = {
+            op: MicroBatcher(fn, max_batch_size=max_batch_size, window_ms=window_ms, name=f"batch-{op}")
+            for op, fn in OPERATIONS.items()
+        }
+
+    def handle(self, request):
+        op = request.get("op")
+        if op == "ping":
+            return {"ok": True}
+        if op == "stats":
+            from src.model_registry import get_registry
+            return {"ok": True, "result": {
+                "batchers": {name: b.stats() for name, b in self.batchers.items()},
+                "models": get_registry().status(),
+            }}
+        if op not in self.batchers:
+            return {"ok": False, "error": f"Unknown operation: {op}"}
+
+        block = _attach(request["shm"])
+        try:
+            # Copy out so nothing downstream keeps a view into the client's block
+            array = np.array(np.ndarray(request["shape"], dtype=request["dtype"], buffer=block.buf))
+        finally:
+            block.close()
+        try:
+            return {"ok": True, "result": self.batchers[op](array)}
+        except Exception as e:
+            return {"ok": False, "error": str(e), "type": type(e).__name__}
+
+    def serve_forever(self):
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                while True:
+                    request = _recv(self.request)
+                    if request is None:
+                        return
+                    _send(self.request, server.handle(request))
+
+        class Server(socketserver.ThreadingUnixStreamServer):
+            daemon_threads = True
+            # Every worker thread of every API worker may connect at once
+            request_queue_size = 256
+
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        with Server(self.socket_path, Handler) as unix_server:
+            print(f"Model server listening on {self.socket_path}")
+            try:
+                unix_server.serve_forever()
+            finally:
+                os.unlink(self.socket_path)
+
+
+class ModelServerError(Exception):
+    """The model server rejected a request or could not be reached."""
+
+
+class ModelServerClient:
+    """Per-worker client; each thread keeps one connection to the server."""
+
+    # Server-side failures that callers already handle for local inference
+    _ERRORS = {"ValueError": ValueError, "FileNotFoundError": FileNotFoundError}
+
+    def __init__(self, socket_path, timeout=30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _drop_connection(self):
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+    def _roundtrip(self, message):
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+                _send(sock, message)
+                response = _recv(sock)
+            except socket.timeout:
+                # The request may still be running; do not send it twice
+                self._drop_connection()
+                raise ModelServerError(f"Model server did not answer within {self.timeout}s")
+            except OSError as e:
+                self._drop_connection()
+                if attempt:
+                    raise ModelServerError(f"Model server unavailable: {e}")
+                continue
+            if response is not None:
+                return response
+            # Stale connection (server restarted); reconnect once
+            self._drop_connection()
+        raise ModelServerError("Model server closed the connection")
+
+    def call(self, op, array):
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes),
+                                           name=f"authenex-{uuid.uuid4().hex[:16]}")
+        try:
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            response = self._roundtrip({"op": op, "shm": block.name, "shape": list(array.shape),
+                                        "dtype": array.dtype.str})
+        finally:
+            block.close()
+            block.unlink()
+        if not response.get("ok"):
+            raise self._ERRORS.get(response.get("type"), ModelServerError)(response.get("error"))
+        return response["result"]
+
+    def ping(self):
+        return bool(self._roundtrip({"op": "ping"}).get("ok"))
+
+    def stats(self):
+        return self._roundtrip({"op": "stats"}).get("result")
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_model_server_client():
+    """Client for MODEL_SERVER_SOCKET, or None to run models in this process."""
+    global _client
+    socket_path = os.getenv("MODEL_SERVER_SOCKET")
+    if not socket_path:
+        return None
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ModelServerClient(socket_path, timeout=float(os.getenv("MODEL_SERVER_TIMEOUT", "30")))
+    return _client
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Serve models to API workers over a Unix socket")
+    ap.add_argument("--socket", default=os.getenv("MODEL_SERVER_SOCKET", "/tmp/authenex-models.sock"))
+    ap.add_argument("--max-batch-size", type=int, default=int(os.getenv("MODEL_SERVER_MAX_BATCH", "32")))
+    ap.add_argument("--window-ms", type=float, default=float(os.getenv("MODEL_SERVER_WINDOW_MS", "5")))
+    ap.add_argument("--warmup", default=os.getenv("MODEL_WARMUP", "all"),
+                    help="'all', 'none' or a comma-separated list of models to load before serving")
+    args = ap.parse_args()
+
+    # The model code paths below must run locally in this process, not call back into the server
+    os.environ.pop("MODEL_SERVER_SOCKET", None)
+    if args.warmup.lower() not in ("none", "0", "false", "no", ""):
+        from src.model_registry import get_registry
+        names = None if args.warmup.lower() in ("all", "1", "true", "yes") else args.warmup.split(",")
+        print(f"Model warm-up: {get_registry().warmup(names)}")
+    ModelServer(args.socket, args.max_batch_size, args.window_ms).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
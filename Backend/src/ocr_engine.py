@@ -0,0 +1,105 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class PytesseractEngine:
+    """Original path: one `tesseract` subprocess (and temp image) per call."""
+
+    name = "pytesseract"
+
+    def __init__(self, workers=None, lang="eng"):
+        import pytesseract
+        self._pytesseract = pytesseract
+        self.lang = lang
+        self._pool = ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 2,
+                                        thread_name_prefix="ocr")
+
+    def recognize(self, image, psm=6):
+        config = f'--oem 3 --psm {psm}'
+        return self._pytesseract.image_to_string(image, lang=self.lang, config=config)
+
+    def recognize_many(self, images, psm=6):
+        return list(self._pool.map(lambda img: self.recognize(img, psm), images))
+
+
+class TesserocrEngine:
+    """Long-lived libtesseract workers through tesserocr.
+
+    Each worker thread owns one `PyTessBaseAPI`, so language data is loaded
+    once per worker instead of once per call. tesserocr releases the GIL
+    while recognizing, so the workers run in parallel on separate cores, and
+    images are handed over as raw pixel buffers without a temp file or a
+    subprocess pipe.
+    """
+
+    name = "tesserocr"
+
+    def __init__(self, workers=None, lang="eng", tessdata=None):
+        import tesserocr
+        self._tesserocr = tesserocr
+        self.lang = lang
+        self.tessdata = tessdata
+        self._local = threading.local()
+        self._pool = ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 2,
+                                        thread_name_prefix="ocr")
+
+    def _api(self):
+        api = getattr(self._local, "api", None)
+        if api is None:
+            kwargs = {"lang": self.lang, "oem": self._tesserocr.OEM.DEFAULT}
+            if self.tessdata:
+                kwargs["path"] = self.tessdata
+            api = self._tesserocr.PyTessBaseAPI(**kwargs)
+            self._local.api = api
+        return api
+
+    def _recognize(self, image, psm):
+        api = self._api()
+        api.SetPageSegMode(psm)
+        image = np.ascontiguousarray(image)
+        height, width = image.shape[:2]
+        channels = 1 if image.ndim == 2 else image.shape[2]
+        if channels == 3:
+            image = np.ascontiguousarray(image[:, :, ::-1])  # tesseract expects RGB
+        api.SetImageBytes(image.tobytes(), width, height, channels, width * channels)
+        return api.GetUTF8Text()
+
+    def recognize(self, image, psm=6):
+        return self._pool.submit(self._recognize, image, psm).result()
+
+    def recognize_many(self, images, psm=6):
+        return list(self._pool.map(lambda img: self._recognize(img, psm), images))
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_ocr_engine():
+    """Process-wide OCR engine chosen by OCR_ENGINE (auto, tesserocr or pytesseract).
+
+    `auto` uses persistent tesserocr workers when the package and language
+    data are available and falls back to pytesseract otherwise.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                choice = os.getenv("OCR_ENGINE", "auto").lower()
+                workers = int(os.getenv("OCR_WORKERS", "0")) or None
+                lang = os.getenv("OCR_LANG", "eng")
+                engine = None
+                if choice in ("auto", "tesserocr"):
+                    try:
+                        engine = TesserocrEngine(workers, lang, os.getenv("TESSDATA_PREFIX"))
+                        engine._pool.submit(engine._api).result()  # fail fast if language data is missing
+                    except Exception as e:
+                        if choice == "tesserocr":
+                            raise
+                        print(f"Persistent OCR engine unavailable, using pytesseract: {e}")
+                        engine = None
+                _engine = engine or PytesseractEngine(workers, lang)
+    return _engine
@@ -0,0 +1,235 @@
+"""ONNX Runtime backend for the signature verifier and the signature detector.
+
+INFERENCE_BACKEND selects how the model registry loads both models:
+
+    native     sign_verifier.keras through tf.keras, sign_parser.pt through ultralytics/torch (default)
+    onnx       sign_verifier.onnx and sign_parser.onnx through onnxruntime
+    onnx-int8  the same graphs with int8 dynamic quantization (*.int8.onnx)
+
+The ONNX files are exported next to the originals, once per model version:
+
+    PYTHONPATH=Backend python -m src.onnx_backend export --int8    # from the repo root, like MODELS_DIR
+
+The signature model is exported twice. The full siamese graph, with
+L1DistanceLayer lowered to Abs + ReduceSum, serves `verify_signatures`.
+The shared embedding tower serves `embed_signatures`. Both are wrapped so
+SignatureVerifier uses them like the Keras model. The YOLO export is loaded
+back through ultralytics, which keeps its letterboxing and NMS. If a
+selected ONNX file is missing, the registry logs it and loads the native
+model instead. Check accuracy and speed with benchmarks/onnx_parity.py
+before switching a deployment.
+"""
+import argparse
+import os
+import shutil
+import threading
+
+import numpy as np
+
+BACKENDS = ("native", "onnx", "onnx-int8")
+
+_loaded_backends = {}
+_loaded_lock = threading.Lock()
+
+
+def inference_backend():
+    backend = os.getenv("INFERENCE_BACKEND", "native").lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"INFERENCE_BACKEND must be one of {', '.join(BACKENDS)}, not {backend!r}")
+    return backend
+
+
+def onnx_path(native_path, quantized=False, suffix=""):
+    """sign_verifier.keras -> sign_verifier.onnx / sign_verifier.int8.onnx (suffix before the extension)."""
+    base = os.path.splitext(native_path)[0] + suffix
+    return base + (".int8.onnx" if quantized else ".onnx")
+
+
+def loaded_backends():
+    """Backend each model was actually loaded with in this process, for /health."""
+    with _loaded_lock:
+        return dict(_loaded_backends)
+
+
+def _record_backend(name, backend):
+    with _loaded_lock:
+        _loaded_backends[name] = backend
+
+
+def _session(path):
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    # 0 lets onnxruntime use one thread per physical core
+    options.intra_op_num_threads = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))
+    options.inter_op_num_threads = 1
+    return ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+
+
+# ---------------- Runtime wrappers ---------------- #
+class OnnxEmbeddingModel:
+    """The signature embedding tower, with the `predict` / `output_shape` interface of a Keras model."""
+
+    def __init__(self, path):
+        self.path = path
+        self.session = _session(path)
+        self.input_name = self.session.get_inputs()[0].name
+        self.output_shape = (None, self.session.get_outputs()[0].shape[-1])
+        self.nbytes = os.path.getsize(path)
+
+    def predict(self, images, batch_size=64, verbose=0):
+        images = np.asarray(images, dtype=np.float32)
+        outputs = [self.session.run(None, {self.input_name: images[i:i + batch_size]})[0]
+                   for i in range(0, len(images), batch_size)]
+        return np.concatenate(outputs) if outputs else np.zeros((0, self.output_shape[-1]), dtype=np.float32)
+
+
+class OnnxSignatureModel:
+    """The siamese signature model; `predict([a, b])` returns L1 distances like the Keras model.
+
+    The embedding tower is a separate session, loaded on the first
+    `get_layer("EmbeddingNet")` call.
+    """
+
+    def __init__(self, siamese_path, embedding_path):
+        self.path = siamese_path
+        self.embedding_path = embedding_path
+        self.session = _session(siamese_path)
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self._embedding = None
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        size = os.path.getsize(self.path)
+        return size + (self._embedding.nbytes if self._embedding is not None else 0)
+
+    def predict(self, inputs, verbose=0):
+        feeds = {name: np.asarray(x, dtype=np.float32) for name, x in zip(self.input_names, inputs)}
+        return self.session.run(None, feeds)[0]
+
+    def get_layer(self, name):
+        if name != "EmbeddingNet":
+            raise ValueError(f"No layer named {name!r} in the ONNX signature model")
+        if self._embedding is None:
+            with self._lock:
+                if self._embedding is None:
+                    self._embedding = OnnxEmbeddingModel(self.embedding_path)
+        return self._embedding
+
+
+# ---------------- Loaders (called by the model registry) ---------------- #
+def load_sign_verifier(native_path):
+    """ONNX signature model for the configured backend, or None to load the Keras model."""
+    backend = inference_backend()
+    if backend != "native":
+        quantized = backend == "onnx-int8"
+        siamese, embedding = onnx_path(native_path, quantized), onnx_path(native_path, quantized, "_embedding")
+        missing = [p for p in (siamese, embedding) if not os.path.exists(p)]
+        if not missing:
+            _record_backend("sign_verifier", backend)
+            return OnnxSignatureModel(siamese, embedding)
+        print(f"Warning: {', '.join(missing)} not found (run `python -m src.onnx_backend export`); "
+              f"loading the Keras signature model")
+    _record_backend("sign_verifier", "native")
+    return None
+
+
+def load_sign_parser(native_path):
+    from ultralytics import YOLO
+    backend = inference_backend()
+    if backend != "native":
+        path = onnx_path(native_path, backend == "onnx-int8")
+        if os.path.exists(path):
+            _record_backend("sign_parser", backend)
+            # ultralytics runs .onnx weights through onnxruntime with the same pre- and post-processing
+            return YOLO(path, task="detect")
+        print(f"Warning: {path} not found (run `python -m src.onnx_backend export`); loading {native_path}")
+    _record_backend("sign_parser", "native")
+    return YOLO(native_path)
+
+
+# ---------------- Export ---------------- #
+def _export_keras(model, path, opset):
+    import tensorflow as tf
+    import tf2onnx
+
+    inputs = model.inputs
+    spec = [tf.TensorSpec((None, *x.shape[1:]), tf.float32, name=f"input_{i}") for i, x in enumerate(inputs)]
+
+    @tf.function(input_signature=spec)
+    def forward(*args):
+        return model(list(args) if len(args) > 1 else args[0], training=False)
+
+    tf2onnx.convert.from_function(forward, input_signature=spec, opset=opset, output_path=path)
+    return path
+
+
+def quantize(path, quantized_path):
+    """int8 dynamic quantization: weights stored as 8-bit, activations quantized per call."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+    # Shape inference and graph folding first, so more operators are quantized
+    prepared = quantized_path + ".prep"
+    quant_pre_process(path, prepared, skip_symbolic_shape=True)
+    try:
+        # ConvInteger on the CPU provider only takes unsigned weights
+        quantize_dynamic(prepared, quantized_path, weight_type=QuantType.QUInt8)
+    finally:
+        os.remove(prepared)
+    return quantized_path
+
+
+def export_sign_verifier(native_path, opset=17, int8=False):
+    """Export the siamese model and its embedding tower; returns the written paths."""
+    from src.sign_verifier import SignatureVerifier
+    model = SignatureVerifier.load_model_safe(native_path)
+    tower = SignatureVerifier(model=model).embedding_model
+    written = [_export_keras(model, onnx_path(native_path), opset),
+               _export_keras(tower, onnx_path(native_path, suffix="_embedding"), opset)]
+    if int8:
+        written += [quantize(path, onnx_path(native_path, True, suffix))
+                    for path, suffix in zip(written[:2], ("", "_embedding"))]
+    return written
+
+
+def export_sign_parser(native_path, opset=17, int8=False, imgsz=640):
+    from ultralytics import YOLO
+    # Fixed input size: ultralytics letterboxes every image to imgsz anyway
+    exported = YOLO(native_path).export(format="onnx", imgsz=imgsz, opset=opset, simplify=True, dynamic=False)
+    target = onnx_path(native_path)
+    if os.path.abspath(exported) != os.path.abspath(target):
+        shutil.move(exported, target)
+    written = [target]
+    if int8:
+        written.append(quantize(target, onnx_path(native_path, True)))
+    return written
+
+
+EXPORTERS = {
+    "sign_verifier": export_sign_verifier,
+    "sign_parser": export_sign_parser,
+}
+
+
+def main():
+    from src.model_registry import SIGN_PARSER_MODEL_PATH, SIGN_VERIFIER_MODEL_PATH
+    ap = argparse.ArgumentParser(description="Export the signature models to ONNX")
+    ap.add_argument("command", choices=["export"])
+    ap.add_argument("--models", default=",".join(EXPORTERS), help="comma-separated: sign_verifier,sign_parser")
+    ap.add_argument("--sign-verifier", default=os.getenv("SIGN_VERIFIER_MODEL_PATH", SIGN_VERIFIER_MODEL_PATH))
+    ap.add_argument("--sign-parser", default=os.getenv("SIGN_PARSER_MODEL_PATH", SIGN_PARSER_MODEL_PATH))
+    ap.add_argument("--opset", type=int, default=17)
+    ap.add_argument("--int8", action="store_true", help="also write int8 dynamically quantized copies")
+    args = ap.parse_args()
+
+    paths = {"sign_verifier": args.sign_verifier, "sign_parser": args.sign_parser}
+    for name in args.models.split(","):
+        if name not in EXPORTERS:
+            ap.error(f"unknown model {name!r}")
+        for path in EXPORTERS[name](paths[name], opset=args.opset, int8=args.int8):
+            print(f"{name}: wrote {path} ({os.path.getsize(path) / 2**20:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import os
+from collections import namedtuple
+
+PdfPage = namedtuple("PdfPage", ["index", "text", "image"])
+
+PDF_MAGIC = b"%PDF-"
+
+
+def is_pdf(source):
+    """True for PDF bytes or a path to a PDF file, judged by the magic bytes."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source[:5]) == PDF_MAGIC
+    if isinstance(source, (str, os.PathLike)) and os.path.isfile(source):
+        with open(source, "rb") as f:
+            return f.read(5) == PDF_MAGIC
+    return False
+
+
+def iter_pdf_pages(source, dpi=200, min_text_chars=40, rasterize_text_pages=True):
+    """Yield the pages of a PDF one at a time.
+
+    Pages with an embedded text layer of at least `min_text_chars`
+    characters come with that text, so OCR can be skipped. A page is only
+    rasterized (BGR array at `dpi`) when it has no usable text layer, or
+    when `rasterize_text_pages` is set so signatures and photos can still be
+    cropped. Only one rendered page is alive at a time.
+    """
+    import pypdfium2 as pdfium
+
+    if isinstance(source, (bytearray, memoryview)):
+        source = bytes(source)
+    pdf = pdfium.PdfDocument(source)
+    try:
+        for index in range(len(pdf)):
+            page = pdf[index]
+            try:
+                textpage = page.get_textpage()
+                text = textpage.get_text_range().strip()
+                textpage.close()
+                text = text if len(text) >= min_text_chars else None
+
+                image = None
+                if text is None or rasterize_text_pages:
+                    bitmap = page.render(scale=dpi / 72)
+                    # pdfium renders BGR(A); copy so the array outlives the bitmap buffer
+                    image = bitmap.to_numpy()[:, :, :3].copy()
+                    bitmap.close()
+            finally:
+                page.close()
+            yield PdfPage(index, text, image)
+    finally:
+        pdf.close()
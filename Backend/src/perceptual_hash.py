@@ -0,0 +1,204 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from itertools import combinations
+
+import cv2
+import numpy as np
+
+HASH_BITS = 64
+
+
+# ---------------- Hashes ---------------- #
+def _gray(image):
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+
+
+def _bits_to_int(bits):
+    value = 0
+    for bit in bits.ravel():
+        value = (value << 1) | int(bit)
+    return value
+
+
+def phash(image):
+    """64-bit DCT perceptual hash; robust to re-compression, rescaling and small edits."""
+    thumb = cv2.resize(_gray(image), (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(thumb)[:8, :8]
+    # Median of the low frequencies, ignoring the DC term
+    return _bits_to_int(low > np.median(low.ravel()[1:]))
+
+
+def dhash(image):
+    """64-bit gradient hash over a 9x8 grayscale thumbnail."""
+    thumb = cv2.resize(_gray(image), (9, 8), interpolation=cv2.INTER_AREA)
+    return _bits_to_int(thumb[:, 1:] > thumb[:, :-1])
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def to_hex(value):
+    return f"{value:016x}"
+
+
+def text_fingerprint(text):
+    """Digest of OCR text, ignoring case, punctuation and whitespace.
+
+    Certificates printed from one template hash within a few bits of each
+    other, so a pHash match alone does not mean the same document; reuse and
+    refusal also require equal text fingerprints.
+    """
+    normalized = " ".join(re.sub(r"[^0-9a-z]+", " ", (text or "").lower()).split())
+    return hashlib.sha256(normalized.encode()).hexdigest() if normalized else None
+
+
+def hash_image_bytes(data):
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Could not decode the uploaded image")
+    return phash(image)
+
+
+# ---------------- Index ---------------- #
+class MultiIndexHashTable:
+    """Sub-linear Hamming search by multi-index hashing.
+
+    Each 64-bit hash is split into `chunks` substrings with one table per
+    substring. By the pigeonhole principle, two hashes within distance r
+    agree to within r // chunks bits on at least one substring, so a query
+    only probes the few substring values in that radius and verifies the
+    full distance on the candidates.
+    """
+
+    def __init__(self, chunks=4):
+        self.chunks = chunks
+        self.chunk_bits = HASH_BITS // chunks
+        self._mask = (1 << self.chunk_bits) - 1
+        self._tables = [dict() for _ in range(chunks)]
+        self._hashes = {}
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def _split(self, value):
+        return [(value >> (i * self.chunk_bits)) & self._mask for i in range(self.chunks)]
+
+    def _neighbours(self, value, radius):
+        yield value
+        for r in range(1, radius + 1):
+            for positions in combinations(range(self.chunk_bits), r):
+                flipped = value
+                for p in positions:
+                    flipped ^= 1 << p
+                yield flipped
+
+    def add(self, key, value):
+        if key in self._hashes:
+            self.remove(key)
+        self._hashes[key] = value
+        for table, part in zip(self._tables, self._split(value)):
+            table.setdefault(part, set()).add(key)
+
+    def remove(self, key):
+        value = self._hashes.pop(key)
+        for table, part in zip(self._tables, self._split(value)):
+            table[part].discard(key)
+
+    def query(self, value, max_distance):
+        radius = max_distance // self.chunks
+        candidates = set()
+        for table, part in zip(self._tables, self._split(value)):
+            for probe in self._neighbours(part, radius):
+                candidates.update(table.get(probe, ()))
+        matches = []
+        for key in candidates:
+            distance = hamming(value, self._hashes[key])
+            if distance <= max_distance:
+                matches.append((distance, key))
+        return sorted(matches)
+
+
+class NearDuplicateIndex:
+    """Perceptual-hash index with optional SQLite persistence."""
+
+    def __init__(self, db_path=None, table="phash_index", chunks=4):
+        self.table = table
+        self._index = MultiIndexHashTable(chunks)
+        self._metadata = {}
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, phash TEXT NOT NULL, metadata TEXT)"
+            )
+            self._db.commit()
+            for key, value, metadata in self._db.execute(f"SELECT key, phash, metadata FROM {table}"):
+                self._index.add(key, int(value, 16))
+                self._metadata[key] = json.loads(metadata) if metadata else {}
+
+    def __len__(self):
+        return len(self._index)
+
+    def add(self, key, value, metadata=None):
+        with self._lock:
+            self._index.add(key, value)
+            self._metadata[key] = metadata or {}
+            if self._db is not None:
+                self._db.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, phash, metadata) VALUES (?, ?, ?)",
+                    (key, to_hex(value), json.dumps(metadata or {}))
+                )
+                self._db.commit()
+
+    def metadata(self, key):
+        with self._lock:
+            return dict(self._metadata.get(key, {}))
+
+    def find(self, value, max_distance=10, exclude=None):
+        """Indexed entries within `max_distance` bits, closest first."""
+        with self._lock:
+            matches = self._index.query(value, max_distance)
+            return [
+                {"key": key, "distance": distance, **self._metadata.get(key, {})}
+                for distance, key in matches if key != exclude
+            ]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_near_duplicate_index(name="parsed"):
+    """Process-wide index per namespace, or None when NEAR_DUP_ENABLED is off.
+
+    Entries persist in NEAR_DUP_INDEX_DB when it is set, otherwise they live
+    only for the lifetime of the process.
+    """
+    if os.getenv("NEAR_DUP_ENABLED", "true").lower() in ("0", "false", "no"):
+        return None
+    if name not in _indexes:
+        with _indexes_lock:
+            if name not in _indexes:
+                _indexes[name] = NearDuplicateIndex(os.getenv("NEAR_DUP_INDEX_DB") or None, table=f"phash_{name}")
+    return _indexes[name]
+
+
+def near_duplicate_distances():
+    """(flag_distance, skip_distance) thresholds in bits.
+
+    Matches within flag_distance are only reported. Within skip_distance a
+    match whose OCR text fingerprint is also equal is reused by the parser
+    and refused by the store endpoint. The default skip_distance of -1 turns
+    reuse and refusal off.
+    """
+    return (
+        int(os.getenv("NEAR_DUP_FLAG_DISTANCE", "10")),
+        int(os.getenv("NEAR_DUP_SKIP_DISTANCE", "-1")),
+    )
@@ -1,27 +1,121 @@
+import os
+import threading
+
 import cv2
-from keras_facenet import FaceNet
+import numpy as np
 from numpy.linalg import norm
+from src.micro_batcher import MicroBatcher
+from src.model_registry import get_registry
+from src.model_server import get_model_server_client
+from src.inference_executor import check_deadline
+from src.metrics import stage_timer, timed
+
+FACE_DETECTION_THRESHOLD = 0.95
+# FaceNet input; every crop in a stacked batch must have this shape
+FACE_INPUT_SIZE = (160, 160)
+
+_face_batcher = None
+_face_batcher_lock = threading.Lock()
+
+
+def _read_image(img):
+    if isinstance(img, np.ndarray):
+        return img, "image array"
+    image = cv2.imread(img)
+    if image is None:
+        raise FileNotFoundError(f"Could not read the image at: {img}")
+    return image, img
+
+
+def face_crop(image, skip_detection=False, embedder=None):
+    """RGB crop of the most confident face in a BGR array, or None when no face is found.
+
+    MTCNN runs in the calling thread, so concurrent requests detect in
+    parallel and only the embedder forward pass is batched. With
+    skip_detection the image is taken to be a face crop already and is
+    resized to the FaceNet input size.
+    """
+    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    if skip_detection:
+        return cv2.resize(image, FACE_INPUT_SIZE)
+    if embedder is None:
+        embedder = get_registry().get("face_embedder").model
+    detections = [d for d in embedder.mtcnn().detect_faces(image) if d["confidence"] > FACE_DETECTION_THRESHOLD]
+    if not detections:
+        return None
+    best = max(detections, key=lambda d: d["confidence"])
+    return embedder.crop(image, best["box"])
+
 
+def embed_faces(images, skip_detection=False):
+    """FaceNet embeddings for a list of BGR arrays, in one forward pass.
 
-embedder = FaceNet()
+    Detection still runs per image, but every detected face goes through the
+    embedder together. Returns one embedding per image, or None where no
+    face was detected.
+    """
+    return _embed_face_batch([face_crop(image, skip_detection) for image in images])
 
-def get_embedding(img_path):
-    img = cv2.imread(img_path)
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
 
-    detections = embedder.extract(img, threshold=0.95)
+def _embed_face_batch(crops):
+    """Embeddings for RGB face crops in one forward pass; None entries stay None."""
+    results = [None] * len(crops)
+    slots = [i for i, crop in enumerate(crops) if crop is not None]
+    if slots:
+        with get_registry().get("face_embedder") as embedder:
+            for i, embedding in zip(slots, embedder.embeddings([crops[i] for i in slots])):
+                results[i] = embedding
+    return results
 
-    if len(detections) == 0:
-        raise ValueError(f"No face detected in {img_path}")
 
-    embedding = detections[0]["embedding"]
-    return embedding
+def face_batcher():
+    """In-process batcher for embedding calls from concurrent requests; None when disabled."""
+    global _face_batcher
+    window_ms = float(os.getenv("FACE_BATCH_WINDOW_MS", "5"))
+    if window_ms <= 0:
+        return None
+    if _face_batcher is None:
+        with _face_batcher_lock:
+            if _face_batcher is None:
+                _face_batcher = MicroBatcher(_embed_face_batch,
+                                             max_batch_size=int(os.getenv("FACE_BATCH_MAX", "32")),
+                                             window_ms=window_ms, name="face-embedding-batch")
+    return _face_batcher
 
 
-def verify_photos(img1_path, img2_path, threshold=0.9):
-    emb1 = get_embedding(img1_path)
-    emb2 = get_embedding(img2_path)
+def get_embeddings(images, skip_detection=False):
+    """FaceNet embeddings of the first face in each image path or BGR array.
 
+    The images are submitted together, so they share a batch with each other
+    and with embedding calls from other requests.
+    """
+    loaded = [_read_image(img) for img in images]
+    images = [image for image, _ in loaded]
+    model_server = get_model_server_client()
+    with stage_timer("face_embedding"):
+        if model_server is not None:
+            op = "face_crop_embedding" if skip_detection else "face_embedding"
+            embeddings = [model_server.call(op, image) for image in images]
+        else:
+            crops = [face_crop(image, skip_detection) for image in images]
+            if face_batcher() is not None:
+                futures = [face_batcher().submit(crop) if crop is not None else None for crop in crops]
+                embeddings = [future.result() if future is not None else None for future in futures]
+            else:
+                embeddings = _embed_face_batch(crops)
+
+    for embedding, (_, source) in zip(embeddings, loaded):
+        if embedding is None:
+            raise ValueError(f"No face detected in {source}")
+    return [np.asarray(embedding, dtype=np.float32) for embedding in embeddings]
+
+
+def get_embedding(img, skip_detection=False):
+    """FaceNet embedding of the first face in an image path or BGR array."""
+    return get_embeddings([img], skip_detection=skip_detection)[0]
+
+
+def compare_embeddings(emb1, emb2, threshold=0.9):
     emb1 = emb1 / norm(emb1)
     emb2 = emb2 / norm(emb2)
 
@@ -37,3 +131,18 @@ def verify_photos(img1_path, img2_path, threshold=0.9):
             'confidence': round(float(confidence), 2),
             "threshold": threshold
         }
+
+
+@timed("photo_verification")
+def verify_photos(img1_path, img2_path, threshold=0.9, deadline=None):
+    # Work queued behind a timed-out request is skipped rather than run for nobody
+    check_deadline(deadline)
+    emb1, emb2 = get_embeddings([img1_path, img2_path])
+    return compare_embeddings(emb1, emb2, threshold)
+
+
+@timed("photo_verification")
+def verify_photo_against_embedding(img_path, reference_embedding, threshold=0.9):
+    """Compare a probe photo with a stored reference embedding; only the probe is embedded."""
+    emb = get_embedding(img_path)
+    return compare_embeddings(emb, np.atleast_2d(np.asarray(reference_embedding, dtype=np.float32))[0], threshold)
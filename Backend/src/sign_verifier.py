@@ -1,35 +1,65 @@
 import cv2
 import numpy as np
-import tensorflow as tf
-from tensorflow.keras import layers
+from src.inference_executor import check_deadline
+from src.model_registry import get_registry
+from src.model_server import get_model_server_client
+from src.metrics import stage_timer
 
-class L1DistanceLayer(layers.Layer):
-    
-    def __init__(self, **kwargs):
-        super(L1DistanceLayer, self).__init__(**kwargs)
-    
-    def call(self, inputs):
-        emb_a, emb_b = inputs
-        diff = tf.abs(emb_a - emb_b)
-        distance = tf.reduce_sum(diff, axis=1, keepdims=True)
-        return distance
-    
-    def get_config(self):
-        return super(L1DistanceLayer, self).get_config()
+_l1_distance_layer = None
+
+
+def _build_l1_distance_layer():
+    # Defined on first use so importing this module does not import TensorFlow
+    import tensorflow as tf
+    from tensorflow.keras import layers
+
+    class L1DistanceLayer(layers.Layer):
+        
+        def __init__(self, **kwargs):
+            super(L1DistanceLayer, self).__init__(**kwargs)
+        
+        def call(self, inputs):
+            emb_a, emb_b = inputs
+            diff = tf.abs(emb_a - emb_b)
+            distance = tf.reduce_sum(diff, axis=1, keepdims=True)
+            return distance
+        
+        def get_config(self):
+            return super(L1DistanceLayer, self).get_config()
+
+    L1DistanceLayer.__qualname__ = "L1DistanceLayer"
+    return L1DistanceLayer
+
+
+def __getattr__(name):
+    """`from src.sign_verifier import L1DistanceLayer` keeps working, building the class lazily."""
+    global _l1_distance_layer
+    if name == "L1DistanceLayer":
+        if _l1_distance_layer is None:
+            _l1_distance_layer = _build_l1_distance_layer()
+        return _l1_distance_layer
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 class SignatureVerifier:
     def __init__(self, model_path=None, model=None):
-        if model is not None:
-            self.model = model
-        elif model_path is not None:
-            self.model = self.load_model_safe(model_path)
-        else:
+        if model is None and model_path is None:
             raise ValueError("Either model_path or model must be provided")
+        self.model_path = model_path
+        self._model = model
+        self._embedding_model = None
+
+    @property
+    def model(self):
+        # Loaded on first use; shared per process, so every verifier built for the same path reuses one model
+        if self._model is None:
+            self._model = get_registry().get("sign_verifier", self.model_path).model
+        return self._model
     
     @staticmethod
     def load_model_safe(model_path):
         try:
-            custom_objects = {'L1DistanceLayer': L1DistanceLayer}
+            import tensorflow as tf
+            custom_objects = {'L1DistanceLayer': __getattr__('L1DistanceLayer')}
             
             model = tf.keras.models.load_model(
                 model_path,
@@ -43,7 +73,8 @@ class SignatureVerifier:
     
     def preprocess_signature(self, img_path, target_size=(220, 155)):
         try:
-            img = cv2.imread(img_path)
+            # Already-decoded crops (e.g. from CertificateParser) skip the disk read
+            img = img_path if isinstance(img_path, np.ndarray) else cv2.imread(img_path)
             if img is None:
                 raise FileNotFoundError(f"Image not found: {img_path}")
             
@@ -51,18 +82,25 @@ class SignatureVerifier:
             img = img.astype("float32") / 255.0
             return img
         except Exception as e:
-            print(f"Error preprocessing image {img_path}: {e}")
+            print(f"Error preprocessing image {img_path if isinstance(img_path, str) else 'array'}: {e}")
             raise
     
     def verify_signatures(self, sig1_path, sig2_path, threshold=0.5):
         try:
-            sig1 = self.preprocess_signature(sig1_path)
-            sig2 = self.preprocess_signature(sig2_path)
-            
-            sig1 = np.expand_dims(sig1, axis=0)
-            sig2 = np.expand_dims(sig2, axis=0)
+            with stage_timer("signature_preprocess"):
+                sig1 = self.preprocess_signature(sig1_path)
+                sig2 = self.preprocess_signature(sig2_path)
             
-            distance = self.model.predict([sig1, sig2], verbose=0)[0][0]
+            if self._remote() is not None:
+                # The siamese head is an L1 distance, so embeddings from the model server suffice
+                emb1, emb2 = self.embed_signatures(np.stack([sig1, sig2]))
+                distance = np.abs(emb1 - emb2).sum()
+            else:
+                sig1 = np.expand_dims(sig1, axis=0)
+                sig2 = np.expand_dims(sig2, axis=0)
+
+                with stage_timer("signature_inference"):
+                    distance = self.model.predict([sig1, sig2], verbose=0)[0][0]
             
             prediction = distance < threshold
 
@@ -80,11 +118,119 @@ class SignatureVerifier:
             print(f"Error during verification: {e}")
             return None
     
-    def batch_verify(self, signature_pairs, threshold=0.5):
+    @property
+    def embedding_model(self):
+        """The shared tower of the siamese model (input image -> embedding)."""
+        if self._embedding_model is None:
+            try:
+                self._embedding_model = self.model.get_layer('EmbeddingNet')
+            except ValueError:
+                import tensorflow as tf
+                towers = [layer for layer in self.model.layers if isinstance(layer, tf.keras.Model)]
+                if not towers:
+                    raise ValueError("Could not find the embedding sub-network in the siamese model")
+                self._embedding_model = towers[0]
+        return self._embedding_model
+
+    def _remote(self):
+        # Models passed in directly always run locally
+        return get_model_server_client() if self._model is None else None
+
+    def embed_signatures(self, images, batch_size=64):
+        """Embed a stacked float32 batch of preprocessed signatures."""
+        images = np.asarray(images, dtype=np.float32)
+        model_server = self._remote()
+        if len(images) == 0:
+            return np.zeros((0, self.embedding_model.output_shape[-1]), dtype=np.float32)
+        with stage_timer("signature_inference"):
+            if model_server is not None:
+                return np.asarray(model_server.call("signature_embedding", images), dtype=np.float32)
+            return np.asarray(self.embedding_model.predict(images, batch_size=batch_size, verbose=0),
+                              dtype=np.float32)
+
+    def verify_against_embeddings(self, sig_path, reference_embeddings, threshold=0.5):
+        """Compare a probe signature with stored reference embeddings; only the probe is embedded.
+
+        The closest reference decides the result when the certificate has several signatures.
+        """
+        try:
+            with stage_timer("signature_preprocess"):
+                probe = self.preprocess_signature(sig_path)
+            probe = self.embed_signatures(np.expand_dims(probe, axis=0))[0]
+            references = np.atleast_2d(np.asarray(reference_embeddings, dtype=np.float32))
+            distance = np.abs(references - probe).sum(axis=1).min()
+
+            prediction = distance < threshold
+
+            confidence = abs(distance - threshold) / threshold
+            confidence = min(1.0, confidence)
+
+            return {
+                'distance': round(float(distance), 2),
+                'prediction': bool(prediction),
+                'confidence': round(float(confidence), 2),
+                'threshold': threshold
+            }
+
+        except Exception as e:
+            print(f"Error during verification: {e}")
+            return None
+
+    def batch_verify(self, signature_pairs, threshold=0.5, batch_size=64):
+        """Verify many pairs with one embedding pass per unique image.
+
+        Returns one result per input pair, in input order. Pairs whose images
+        could not be loaded get an 'error' entry instead of being dropped.
+        """
+        signature_pairs = [tuple(pair) for pair in signature_pairs]
+        unique_paths = list(dict.fromkeys(p for pair in signature_pairs for p in pair))
+
+        images, index, errors = [], {}, {}
+        for path in unique_paths:
+            try:
+                images.append(self.preprocess_signature(path))
+                index[path] = len(images) - 1
+            except Exception as e:
+                errors[path] = str(e)
+
+        embeddings = self.embed_signatures(np.stack(images) if images else [], batch_size=batch_size)
+
+        ok_pairs = [i for i, (a, b) in enumerate(signature_pairs) if a in index and b in index]
+        if ok_pairs:
+            emb_a = embeddings[[index[signature_pairs[i][0]] for i in ok_pairs]]
+            emb_b = embeddings[[index[signature_pairs[i][1]] for i in ok_pairs]]
+            # Same reduction as L1DistanceLayer, for every pair at once
+            distances = np.abs(emb_a - emb_b).sum(axis=1)
+            confidences = np.minimum(1.0, np.abs(distances - threshold) / threshold)
+        distance_by_pair = {i: (distances[n], confidences[n]) for n, i in enumerate(ok_pairs)}
+
         results = []
-        for sig1_path, sig2_path in signature_pairs:
-            result = self.verify_signatures(sig1_path, sig2_path, threshold)
-            if result:
-                result['pair'] = (sig1_path, sig2_path)
-                results.append(result)
-        return results
\ No newline at end of file
+        for i, (sig1_path, sig2_path) in enumerate(signature_pairs):
+            if i not in distance_by_pair:
+                results.append({
+                    'pair': (sig1_path, sig2_path),
+                    'error': errors.get(sig1_path) or errors.get(sig2_path)
+                })
+                continue
+            distance, confidence = distance_by_pair[i]
+            results.append({
+                'distance': round(float(distance), 2),
+                'prediction': bool(distance < threshold),
+                'confidence': round(float(confidence), 2),
+                'threshold': threshold,
+                'pair': (sig1_path, sig2_path),
+                'error': None
+            })
+        return results
+
+def verify_signature_files(model_path, sig1_path, sig2_path, threshold=0.5, deadline=None):
+    """Module-level entry point so signature checks can run in a process-pool lane."""
+    check_deadline(deadline)
+    verifier = SignatureVerifier(model_path=model_path)
+    return verifier.verify_signatures(sig1_path, sig2_path, threshold=threshold)
+
+
+def verify_signature_against_embeddings(model_path, sig_path, reference_embeddings, threshold=0.5):
+    """Module-level entry point for comparing a probe against stored reference embeddings."""
+    verifier = SignatureVerifier(model_path=model_path)
+    return verifier.verify_against_embeddings(sig_path, reference_embeddings, threshold=threshold)
@@ -0,0 +1,119 @@
+import builtins
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupProfile:
+    """Where process start-up time goes.
+
+    Records inclusive wall time of the first import of every top-level
+    package (while tracking is on), elapsed-time marks for start-up
+    milestones, and the outcome of the model warm-up. Package timings are
+    inclusive: a package that imports another one is charged for both.
+    """
+
+    def __init__(self):
+        self._t0 = time.perf_counter()
+        self._wall_t0 = time.time()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._original_import = None
+        self.imports = {}
+        self.marks = {}
+        self.warmup_status = "pending"
+        self.warmup_results = None
+
+    def elapsed(self):
+        return time.perf_counter() - self._t0
+
+    def mark(self, name):
+        with self._lock:
+            self.marks[name] = round(self.elapsed(), 3)
+
+    # ---------------- Import tracking ---------------- #
+    def track_imports(self):
+        if self._original_import is not None:
+            return
+        original = builtins.__import__
+
+        def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+            # Third-party packages are charged at top level; this app's modules individually
+            top = (name if name.startswith("src.") else name.partition(".")[0]) if level == 0 else None
+            active = getattr(self._local, "active", None)
+            if active is None:
+                active = self._local.active = set()
+            if not top or top.startswith("_") or top in self.imports or top in active or top in sys.modules:
+                return original(name, globals, locals, fromlist, level)
+            active.add(top)
+            start = time.perf_counter()
+            try:
+                module = original(name, globals, locals, fromlist, level)
+            finally:
+                active.discard(top)
+            # Only successful imports; optional-dependency probes that fail are not start-up cost
+            with self._lock:
+                self.imports.setdefault(top, {
+                    "seconds": round(time.perf_counter() - start, 3),
+                    "at": round(start - self._t0, 3),
+                    "thread": threading.current_thread().name,
+                })
+            return module
+
+        self._original_import = original
+        builtins.__import__ = timed_import
+
+    def stop_tracking_imports(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    @contextmanager
+    def timed(self, name):
+        """Mark `name` with the duration of the block instead of a point in time."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.marks[name] = {"at": round(start - self._t0, 3),
+                                    "seconds": round(time.perf_counter() - start, 3)}
+
+    # ---------------- Warm-up ---------------- #
+    def set_warmup(self, status, results=None):
+        with self._lock:
+            self.warmup_status = status
+            if results is not None:
+                self.warmup_results = results
+        self.mark(f"warmup_{status}")
+
+    @property
+    def warmed_up(self):
+        return self.warmup_status in ("done", "skipped")
+
+    def report(self, top_imports=25):
+        with self._lock:
+            imports = sorted(self.imports.items(), key=lambda item: item[1]["seconds"], reverse=True)
+            return {
+                "process_started_at": self._wall_t0,
+                "uptime_seconds": round(self.elapsed(), 3),
+                "marks": dict(self.marks),
+                "imports": dict(imports[:top_imports]),
+                "import_tracking": self._original_import is not None,
+                "warmup": {"status": self.warmup_status, "results": self.warmup_results},
+            }
+
+
+_profile = None
+_profile_lock = threading.Lock()
+
+
+def get_startup_profile():
+    """Process-wide profile; created by the first import, which should be early in main.py."""
+    global _profile
+    if _profile is None:
+        with _profile_lock:
+            if _profile is None:
+                _profile = StartupProfile()
+    return _profile
@@ -0,0 +1,188 @@
+import json
+import os
+import re
+import threading
+
+from dateutil import parser as date_parser
+
+FIELDS = ("student_name", "institute_name", "degree", "major", "date_of_issue", "certificate_id")
+REQUIRED_FIELDS = ("student_name", "institute_name", "degree", "date_of_issue")
+
+# Label/value rules that hold across most certificate layouts. Each pattern
+# captures the value in a group named `value`.
+GENERIC_FIELDS = {
+    "student_name": [
+        r"(?im)^\s*(?:student(?:'s)?\s+)?name\s*[:\-]\s*(?P<value>[A-Za-z][A-Za-z .'\-]{2,60}?)\s*$",
+        # Only the lead-in is case-insensitive: names must be capitalized words, and
+        # the verb that follows ("has", "is", ...) ends the name
+        r"(?i:certify\s+that)\s+(?:(?i:mr|ms|mrs)\.?\s+)?(?P<value>[A-Z][A-Za-z.'\-]+"
+        r"(?:[ \t]+(?!(?i:has|is|was|for)\b)[A-Z][A-Za-z.'\-]+){1,4})",
+    ],
+    "institute_name": [
+        r"(?im)^\s*(?:institute|university|college)\s*(?:name)?\s*[:\-]\s*(?P<value>.{3,100}?)\s*$",
+        r"(?m)^\s*(?P<value>[A-Z][A-Za-z&.,' \-]{2,80}\b(?:University|Institute|College|School|Academy)\b[A-Za-z&.,' \-]{0,60}?)\s*$",
+    ],
+    "degree": [
+        r"(?im)^\s*(?:degree|programme|program|course)\s*[:\-]\s*(?P<value>.{2,80}?)\s*$",
+        r"(?P<value>\b(?:Bachelor|Master|Doctor|Diploma)[ \t]+of[ \t]+[A-Z][A-Za-z]+(?:[ \t]+[A-Z][A-Za-z]+){0,3})",
+        r"(?P<value>\b(?:B\.?\s?Tech|M\.?\s?Tech|B\.?\s?Sc|M\.?\s?Sc|B\.?\s?E|M\.?\s?E|B\.?\s?Com|MBA|BBA|Ph\.?\s?D)\b\.?)",
+    ],
+    "major": [
+        r"(?im)^\s*(?:major|specialization|specialisation|branch|discipline)\s*[:\-]\s*(?P<value>.{2,80}?)\s*$",
+        r"(?i)\bin\s+(?P<value>[A-Z][A-Za-z&]+(?:[ \t]+(?:and|&|[A-Z][A-Za-z&]+)){0,5})[ \t]+(?:with|on|from|at)\b",
+    ],
+    "date_of_issue": [
+        r"(?im)^\s*(?:date\s+of\s+issue|issue\s+date|date\s+of\s+award|dated|date)\s*[:\-]?\s*(?P<value>[0-9A-Za-z ,./\-]{6,30}?)\s*$",
+    ],
+    "certificate_id": [
+        r"(?im)\b(?:certificate|registration|reg|serial|enrol(?:l)?ment)\s*(?:no|number|id|#)\.?\s*[:\-]?\s*(?P<value>[A-Z0-9][A-Z0-9/\-]{3,30})\b",
+    ],
+}
+
+_INSTITUTE_WORDS = re.compile(r"(?i)\b(university|institute|college|school|academy)\b")
+# Words of the surrounding sentence that a loose match can pull into a name
+_NAME_STOPWORDS = {"certify", "that", "has", "have", "is", "was", "for", "the", "of", "and", "in", "successfully",
+                   "completed", "awarded", "been", "this"}
+
+
+def _validate(field, value):
+    """Plausibility score in [0, 1] for an extracted value."""
+    if field == "date_of_issue":
+        try:
+            date_parser.parse(value, fuzzy=False)
+            return 1.0
+        except (ValueError, OverflowError):
+            return 0.0
+    if field == "student_name":
+        words = value.split()
+        plausible = 2 <= len(words) <= 5 and all(
+            re.match(r"^[A-Z][A-Za-z.'\-]*$", w) and w.lower() not in _NAME_STOPWORDS for w in words)
+        return 1.0 if plausible else 0.3
+    if field == "institute_name":
+        return 1.0 if _INSTITUTE_WORDS.search(value) else 0.6
+    return 1.0
+
+
+class CertificateTemplate:
+    """Compiled extraction rules for one certificate layout.
+
+    `match` patterns decide whether the template applies to a text (any
+    pattern matching is enough; an empty list applies to every text).
+    `fields` maps each output field to patterns tried in order.
+    """
+
+    def __init__(self, name, fields, match=(), required=REQUIRED_FIELDS, constants=None):
+        self.name = name
+        self.match = [re.compile(p) for p in match]
+        self.fields = {f: [re.compile(p) for p in patterns] for f, patterns in fields.items()}
+        self.required = tuple(required)
+        # Fixed values for the template, e.g. the institute name of a known layout
+        self.constants = dict(constants or {})
+
+    @classmethod
+    def from_dict(cls, spec):
+        return cls(spec["name"], spec.get("fields", {}), spec.get("match", ()),
+                   spec.get("required", REQUIRED_FIELDS), spec.get("constants"))
+
+    def matches(self, text):
+        return not self.match or any(p.search(text) for p in self.match)
+
+    def extract(self, text):
+        """Return (fields, confidence); confidence averages the required fields' scores."""
+        result = {field: None for field in FIELDS}
+        scores = {}
+        for field, value in self.constants.items():
+            result[field] = value
+            scores[field] = 1.0
+        for field, patterns in self.fields.items():
+            if field in self.constants:
+                continue
+            for pattern in patterns:
+                m = pattern.search(text)
+                if m:
+                    value = (m.groupdict().get("value") or m.group(m.lastindex or 0)).strip(" .,;:-")
+                    if value:
+                        result[field] = value
+                        scores[field] = _validate(field, value)
+                        break
+        confidence = sum(scores.get(f, 0.0) for f in self.required) / max(1, len(self.required))
+        return result, confidence
+
+
+class TemplateExtractor:
+    """Deterministic fast path in front of the LLM.
+
+    Institute templates are tried first, then the generic label/value rules
+    when TEMPLATE_GENERIC_ENABLED is on.
+    `extract` returns None when required fields are missing or confidence is
+    below `min_confidence`, in which case the caller falls back to the LLM.
+    """
+
+    def __init__(self, templates, min_confidence=0.85):
+        self.templates = list(templates)
+        self.min_confidence = min_confidence
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.fallbacks = 0
+        self.hits_by_template = {}
+
+    def extract(self, text):
+        for template in self.templates:
+            if not template.matches(text):
+                continue
+            result, confidence = template.extract(text)
+            if confidence >= self.min_confidence and all(result.get(f) for f in template.required):
+                with self._lock:
+                    self.hits += 1
+                    self.hits_by_template[template.name] = self.hits_by_template.get(template.name, 0) + 1
+                return result
+        with self._lock:
+            self.fallbacks += 1
+        return None
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.fallbacks
+            return {
+                "template_hits": self.hits,
+                "llm_fallbacks": self.fallbacks,
+                "llm_avoided_rate": round(self.hits / total, 3) if total else None,
+                "hits_by_template": dict(self.hits_by_template),
+            }
+
+
+def load_templates(path=None, include_generic=None):
+    """Institute templates from a JSON list (CERT_TEMPLATES_PATH), then the generic rules if enabled.
+
+    The generic rules are opt-in (TEMPLATE_GENERIC_ENABLED): they are not
+    tied to a layout, so by default only institute templates can skip the LLM.
+    """
+    templates = []
+    path = path or os.getenv("CERT_TEMPLATES_PATH")
+    if path and os.path.exists(path):
+        with open(path) as f:
+            templates = [CertificateTemplate.from_dict(spec) for spec in json.load(f)]
+    if include_generic is None:
+        include_generic = os.getenv("TEMPLATE_GENERIC_ENABLED", "false").lower() in ("1", "true", "yes")
+    if include_generic:
+        templates.append(CertificateTemplate("generic", GENERIC_FIELDS))
+    return templates
+
+
+_extractor = None
+_extractor_lock = threading.Lock()
+
+
+def get_template_extractor():
+    """Process-wide extractor, or None when TEMPLATE_EXTRACTION_ENABLED is off."""
+    global _extractor
+    if os.getenv("TEMPLATE_EXTRACTION_ENABLED", "true").lower() in ("0", "false", "no"):
+        return None
+    if _extractor is None:
+        with _extractor_lock:
+            if _extractor is None:
+                _extractor = TemplateExtractor(
+                    load_templates(),
+                    min_confidence=float(os.getenv("TEMPLATE_MIN_CONFIDENCE", "0.85")),
+                )
+    return _extractor
@@ -0,0 +1,186 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+# Leading bytes of the formats the API accepts
+MAGIC_BYTES = {
+    "pdf": (b"%PDF-",),
+    "jpeg": (b"\xff\xd8\xff",),
+    "png": (b"\x89PNG\r\n\x1a\n",),
+    "zip": (b"PK\x03\x04",),
+}
+IMAGE_KINDS = ("jpeg", "png")
+DOCUMENT_KINDS = IMAGE_KINDS + ("pdf",)
+ARCHIVE_KINDS = ("zip",)
+
+CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(64 * 1024)))
+SPOOL_THRESHOLD = int(os.getenv("UPLOAD_SPOOL_THRESHOLD", str(1024 * 1024)))
+
+
+class UploadRejected(Exception):
+    """The upload is too large or not one of the accepted formats."""
+
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def sniff_kind(head):
+    """Format name for the first bytes of a file, or None when unrecognised."""
+    for kind, signatures in MAGIC_BYTES.items():
+        if any(head.startswith(sig) for sig in signatures):
+            return kind
+    return None
+
+
+class IngestedUpload:
+    """A fully received upload with its size, SHA-256 and sniffed format.
+
+    The body lives in a `SpooledTemporaryFile`: small files stay in memory,
+    larger ones roll over to disk. `sha256` is computed while streaming, so
+    it can be used directly as a cache or dedup key.
+    """
+
+    def __init__(self, spool, size, sha256, kind, filename=None):
+        self._spool = spool
+        self.size = size
+        self.sha256 = sha256
+        self.kind = kind
+        self.filename = filename
+
+    def read(self):
+        self._spool.seek(0)
+        return self._spool.read()
+
+    def open(self):
+        """The underlying seekable file, rewound to the start."""
+        self._spool.seek(0)
+        return self._spool
+
+    def save(self, path):
+        """Copy the body to `path` without loading it into memory; returns the path."""
+        self._spool.seek(0)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(self._spool, f, CHUNK_SIZE)
+        return path
+
+    def close(self):
+        self._spool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+async def ingest_upload(upload, max_size, kinds=DOCUMENT_KINDS, chunk_size=CHUNK_SIZE,
+                        spool_threshold=SPOOL_THRESHOLD):
+    """Copy a FastAPI `UploadFile` into a spooled buffer, hashing and checking it.
+
+    Starlette has already received the whole multipart body by the time an
+    endpoint runs, so this check only keeps oversized parts (413) and
+    unexpected formats (415, from the leading magic bytes rather than the
+    client's filename or content type) out of the pipeline. The bytes that
+    reach the server are bounded earlier by `RequestSizeLimit`.
+    """
+    # Starlette records the part size; no need to copy a part that is already known to be too large
+    if getattr(upload, "size", None) is not None and upload.size > max_size:
+        raise UploadRejected(413, "File too large")
+
+    spool = tempfile.SpooledTemporaryFile(max_size=spool_threshold)
+    digest = hashlib.sha256()
+    size = 0
+    kind = None
+    try:
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                break
+            if size == 0:
+                kind = sniff_kind(chunk[:16])
+                if kind not in kinds:
+                    raise UploadRejected(415, "Unsupported file content")
+            size += len(chunk)
+            if size > max_size:
+                raise UploadRejected(413, "File too large")
+            digest.update(chunk)
+            spool.write(chunk)
+        if size == 0:
+            raise UploadRejected(400, "Empty file")
+    except BaseException:
+        spool.close()
+        raise
+    return IngestedUpload(spool, size, digest.hexdigest(), kind, upload.filename)
+
+
+class RequestSizeLimit:
+    """ASGI middleware that caps request bodies before any form parsing.
+
+    A Content-Length above the limit for the path is answered with 413
+    without reading the body. Bodies sent without one (chunked) are counted
+    as they stream in; once over the limit, reading stops and the response
+    becomes 413, whatever the app makes of the aborted body. `limits` maps
+    path prefixes to their own limit; other paths get `default_limit`.
+    """
+
+    def __init__(self, app, default_limit, limits=None):
+        self.app = app
+        self.default_limit = default_limit
+        # Longest prefix first so /certificates/batch wins over /certificates
+        self.limits = sorted((limits or {}).items(), key=lambda item: len(item[0]), reverse=True)
+
+    def limit_for(self, path):
+        for prefix, limit in self.limits:
+            if path.startswith(prefix):
+                return limit
+        return self.default_limit
+
+    @staticmethod
+    async def _reject(send, limit):
+        body = ('{"detail":"Request body larger than %d bytes"}' % limit).encode()
+        await send({"type": "http.response.start", "status": 413,
+                    "headers": [(b"content-type", b"application/json"),
+                                (b"content-length", str(len(body)).encode()),
+                                (b"connection", b"close")]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        limit = self.limit_for(scope["path"])
+        for name, value in scope.get("headers", ()):
+            if name == b"content-length":
+                if value.isdigit() and int(value) > limit:
+                    return await self._reject(send, limit)
+                break
+
+        state = {"received": 0, "exceeded": False, "started": False}
+
+        async def limited_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                state["received"] += len(message.get("body", b""))
+                if state["received"] > limit:
+                    state["exceeded"] = True
+                    raise UploadRejected(413, "Request body too large")
+            return message
+
+        async def guarded_send(message):
+            if state["exceeded"]:
+                # The app answered the aborted body (typically a 400 parse error); replace it once
+                if message["type"] == "http.response.start" and not state["started"]:
+                    state["started"] = True
+                    await self._reject(send, limit)
+                return
+            if message["type"] == "http.response.start":
+                state["started"] = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except UploadRejected:
+            if not state["started"]:
+                await self._reject(send, limit)